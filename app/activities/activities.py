@@ -11,9 +11,11 @@ from app.stubs.function_stubs import (
     order_shipped as stub_order_shipped,
     package_prepared as stub_package_prepared,
     carrier_dispatched as stub_carrier_dispatched,
+    orders_received as stub_orders_received,
+    orders_validated as stub_orders_validated,
 )
 # Import hedge coordination helpers
-from app.activities.hedge_state import reset_hedge_state, run_with_hedges
+from app.activities.hedge_state import run_with_hedges
 
 logging.basicConfig(
     level=logging.INFO,
@@ -31,6 +33,11 @@ FAST_RETRY_POLICY = RetryPolicy(
     maximum_attempts=10,
 )
 
+def attempt_scope() -> str:
+    # Retries of an activity share the workflow run, so they share election rows
+    return activity.info().workflow_run_id
+
+
 def log_event(db, order_id: str, event_type: str, payload: dict = None, ts=None) -> None:
     from datetime import datetime
     from ..db.models import Event
@@ -46,22 +53,21 @@ def log_event(db, order_id: str, event_type: str, payload: dict = None, ts=None)
 @activity.defn
 async def activity_order_received(order: "OrderData") -> dict:
     from datetime import datetime
-    from ..db.session import SessionLocal
+    from ..db.event_sink import event_sink
     from ..db.models import Order
 
     attempt = activity.info().attempt
     logger.info(f"[Activity] order_received attempt {attempt}: {order.order_id}")
 
-    reset_hedge_state()
     try:
-        result = await run_with_hedges(stub_order_received, order.order_id)
+        result = await run_with_hedges(stub_order_received, order.order_id, attempt_scope=attempt_scope())
     except Exception as e:
         logger.error(f"[Activity] order_received error: {order.order_id} — {e}")
         raise
 
     # Update address after hedge election
-    with SessionLocal() as db:
-        db_order = db.query(Order).filter(Order.id == order.order_id).first()
+    async def transition(db):
+        db_order = await db.get(Order, order.order_id)
         if db_order:
             db_order.address_json = {
                 "street": order.address.street,
@@ -74,8 +80,9 @@ async def activity_order_received(order: "OrderData") -> dict:
                 "address": db_order.address_json,
                 "items": [{"sku": item.sku, "qty": item.qty} for item in order.items],
             })
-            db.commit()
             logger.info(f"[Activity] address_set: {order.order_id}")
+
+    await event_sink.submit(transition)
     return result
 
 
@@ -84,25 +91,49 @@ async def activity_order_validated(order: dict) -> None:
     attempt = activity.info().attempt
     logger.info(f"[Activity] order_validated attempt {attempt}: {order['order_id']}")
 
-    reset_hedge_state()
     try:
-        await run_with_hedges(stub_order_validated, order)
+        await run_with_hedges(stub_order_validated, order, attempt_scope=attempt_scope())
         logger.info(f"[Activity] order_validated succeeded: {order['order_id']}")
     except Exception as e:
         logger.error(f"[Activity] order_validated error: {order['order_id']} — {e}")
         raise
 
 
+@activity.defn
+async def activity_orders_received(batch_id: str, orders: list[dict]) -> list[str]:
+    attempt = activity.info().attempt
+    logger.info(f"[Activity] orders_received attempt {attempt}: {batch_id} ({len(orders)} orders)")
+
+    try:
+        result = await run_with_hedges(stub_orders_received, batch_id, orders, attempt_scope=attempt_scope())
+        logger.info(f"[Activity] orders_received succeeded: {batch_id}")
+        return result
+    except Exception as e:
+        logger.error(f"[Activity] orders_received error: {batch_id} — {e}")
+        raise
+
+
+@activity.defn
+async def activity_orders_validated(batch_id: str, orders: list[dict]) -> dict:
+    attempt = activity.info().attempt
+    logger.info(f"[Activity] orders_validated attempt {attempt}: {batch_id} ({len(orders)} orders)")
+
+    try:
+        result = await run_with_hedges(stub_orders_validated, batch_id, orders, attempt_scope=attempt_scope())
+        logger.info(f"[Activity] orders_validated succeeded: {batch_id}")
+        return result
+    except Exception as e:
+        logger.error(f"[Activity] orders_validated error: {batch_id} — {e}")
+        raise
+
+
 @activity.defn
 async def activity_payment_charged(order: dict, payment_id: str) -> dict:
-    from ..db.session import SessionLocal
     attempt = activity.info().attempt
     logger.info(f"[Activity] payment_charged attempt {attempt}: {order['order_id']}")
 
-    reset_hedge_state()
     try:
-        with SessionLocal() as db:
-            result = await run_with_hedges(stub_payment_charged, order, payment_id, db)
+        result = await run_with_hedges(stub_payment_charged, order, payment_id, attempt_scope=attempt_scope())
         logger.info(f"[Activity] payment_charged succeeded: {order['order_id']}")
         return result
     except Exception as e:
@@ -115,9 +146,8 @@ async def activity_package_prepared(order: dict) -> str:
     attempt = activity.info().attempt
     logger.info(f"[Activity] package_prepared attempt {attempt}: {order['order_id']}")
 
-    reset_hedge_state()
     try:
-        result = await run_with_hedges(stub_package_prepared, order)
+        result = await run_with_hedges(stub_package_prepared, order, attempt_scope=attempt_scope())
         logger.info(f"[Activity] package_prepared succeeded: {order['order_id']}")
         return result
     except Exception as e:
@@ -130,9 +160,8 @@ async def activity_carrier_dispatched(order: dict) -> str:
     attempt = activity.info().attempt
     logger.info(f"[Activity] carrier_dispatched attempt {attempt}: {order['order_id']}")
 
-    reset_hedge_state()
     try:
-        result = await run_with_hedges(stub_carrier_dispatched, order)
+        result = await run_with_hedges(stub_carrier_dispatched, order, attempt_scope=attempt_scope())
         logger.info(f"[Activity] carrier_dispatched succeeded: {order['order_id']}")
         return result
     except Exception as e:
@@ -145,9 +174,8 @@ async def activity_order_shipped(order: dict) -> str:
     attempt = activity.info().attempt
     logger.info(f"[Activity] order_shipped attempt {attempt}: {order['order_id']}")
 
-    reset_hedge_state()
     try:
-        result = await run_with_hedges(stub_order_shipped, order)
+        result = await run_with_hedges(stub_order_shipped, order, attempt_scope=attempt_scope())
         logger.info(f"[Activity] order_shipped succeeded: {order['order_id']}")
         return result
     except Exception as e:
@@ -164,34 +192,45 @@ async def activity_manual_review(order: dict) -> None:
     await asyncio.sleep(2)
     logger.info(f"[Activity] manual_review completed: {order['order_id']}")
 
+@activity.defn
+async def activity_risk_score(features: dict) -> dict:
+    from app.activities.risk import risk_scorer
+    result = await risk_scorer.score(features)
+    logger.info(f"[Activity] risk_score {activity.info().workflow_id}: {result['score']} review={result['review']}")
+    return result
+
 @activity.defn
 async def activity_cancel_order(order: dict) -> str:
     from datetime import datetime
-    from ..db.session import SessionLocal
+    from ..db.event_sink import event_sink
     from ..db.models import Order
 
-    with SessionLocal() as db:
-        db_order = db.query(Order).filter(Order.id == order["order_id"]).first()
+    async def transition(db):
+        db_order = await db.get(Order, order["order_id"])
         if db_order:
             db_order.state = "canceled"
             db_order.updated_at = datetime.utcnow()
             log_event(db, order["order_id"], "ORDER_CANCELED")
-            db.commit()
-            logger.info(f"[Activity] cancel_order: {order['order_id']}")
-            return f"Order {order['order_id']} marked as canceled"
-        logger.warning(f"[Activity] cancel_order failed: {order['order_id']} not found")
-        return f"Order {order['order_id']} not found"
+            return True
+        return False
+
+    if await event_sink.submit(transition):
+        logger.info(f"[Activity] cancel_order: {order['order_id']}")
+        return f"Order {order['order_id']} marked as canceled"
+    logger.warning(f"[Activity] cancel_order failed: {order['order_id']} not found")
+    return f"Order {order['order_id']} not found"
 
 
 @activity.defn
 async def activity_refund_payment(order: dict, reason: str) -> str:
     from datetime import datetime
     import uuid
-    from ..db.session import SessionLocal
+    from sqlalchemy import select
+    from ..db.event_sink import event_sink
     from ..db.models import Payment, Order
 
-    with SessionLocal() as db:
-        db_order = db.query(Order).filter(Order.id == order["order_id"]).first()
+    async def transition(db):
+        db_order = await db.get(Order, order["order_id"])
         if not db_order:
             logger.warning(f"[Activity] refund_payment failed: Order {order['order_id']} not found")
             return f"Order {order['order_id']} not found"
@@ -201,10 +240,19 @@ async def activity_refund_payment(order: dict, reason: str) -> str:
                 logger.info(f"[Activity] refund_payment rejected: {order['order_id']} — updated too long ago")
                 return f"Return rejected for order {order['order_id']} — shipped too long ago"
 
-        original_payment = db.query(Payment).filter(Payment.order_id == order["order_id"]).first()
+        # Served by uq_payments_order_id_status, which also blocks a second refund
+        payments = {
+            p.status: p for p in (await db.execute(
+                select(Payment).where(Payment.order_id == order["order_id"])
+            )).scalars()
+        }
+        original_payment = payments.get("SUCCESSFUL")
         if not original_payment:
             logger.warning(f"[Activity] refund_payment failed: No payment found for {order['order_id']}")
             return f"No payment found for order {order['order_id']}"
+        if "REFUNDED" in payments:
+            logger.info(f"[Activity] refund_payment skipped: {order['order_id']} already refunded")
+            return f"Order {order['order_id']} already refunded"
 
         refund_payment = Payment(
             payment_id=str(uuid.uuid4()),
@@ -224,43 +272,63 @@ async def activity_refund_payment(order: dict, reason: str) -> str:
             "amount": -original_payment.amount,
             "reason": reason
         })
-        db.commit()
         logger.info(f"[Activity] refund_payment: {order['order_id']} — ${-original_payment.amount} due to {reason}")
         return f"Refund issued for order {order['order_id']} — amount ${original_payment.amount} due to {reason} . Run the DB dump check to view DB updates"
 
+    return await event_sink.submit(transition)
+
 
 @activity.defn
 async def activity_update_address(order: dict, new_address: dict) -> str:
     from datetime import datetime
-    from ..db.session import SessionLocal
+    from ..db.event_sink import event_sink
     from ..db.models import Order
 
-    with SessionLocal() as db:
-        db_order = db.query(Order).filter(Order.id == order["order_id"]).first()
+    async def transition(db):
+        db_order = await db.get(Order, order["order_id"])
         if db_order:
             db_order.address_json = new_address
             db_order.updated_at = datetime.utcnow()
             log_event(db, order["order_id"], "ADDRESS_UPDATED", {"new_address": new_address})
-            db.commit()
-            logger.info(f"[Activity] update_address: {order['order_id']}")
-            return f"Address updated for order {order['order_id']}"
-        logger.warning(f"[Activity] update_address failed: {order['order_id']} not found")
-        return f"Order {order['order_id']} not found"
+            return True
+        return False
+
+    if await event_sink.submit(transition):
+        logger.info(f"[Activity] update_address: {order['order_id']}")
+        return f"Address updated for order {order['order_id']}"
+    logger.warning(f"[Activity] update_address failed: {order['order_id']} not found")
+    return f"Order {order['order_id']} not found"
 
 
 @activity.defn
 async def activity_fetch_order(order_id: str) -> dict:
-    db = SessionLocal()
-    order = db.query(Order).filter(Order.id == order_id).first()
-    return order.to_dict() if order else {}
+    from ..db.session import AsyncSessionLocal
+    from ..db.models import Order
+    async with AsyncSessionLocal() as db:
+        order = await db.get(Order, order_id)
+        if not order:
+            return {}
+        return {
+            "order_id": order.id,
+            "state": order.state,
+            "address": order.address_json,
+            "created_at": order.created_at.isoformat() if order.created_at else None,
+            "updated_at": order.updated_at.isoformat() if order.updated_at else None,
+        }
 
 @activity.defn
 async def activity_get_order_state(order_id: str) -> dict:
-    from datetime import datetime
-    from ..db.session import SessionLocal
+    from ..db.session import AsyncSessionLocal
     from ..db.models import Order
-    with SessionLocal() as db:
-        order = db.query(Order).filter(Order.id == order_id).first()
-        if not order:
-            return {"state": "NOT_FOUND"}
-        return {"state": order.state}
+    from ..db.order_cache import order_cache
+
+    cached = order_cache.get(order_id)
+    if cached is not None:
+        return dict(cached)
+
+    generation = order_cache.generation(order_id)
+    async with AsyncSessionLocal() as db:
+        order = await db.get(Order, order_id)
+        result = {"state": order.state} if order else {"state": "NOT_FOUND"}
+    order_cache.put(order_id, result, generation)
+    return dict(result)
@@ -0,0 +1,32 @@
+import os
+from temporalio import workflow
+
+# Steps run as local activities: short DB or CPU work that isn't worth
+# a round trip through the task queue. Changing this set changes the commands a
+# workflow emits, so roll it out with no orders in flight (or as a new workflow version).
+LOCAL_ACTIVITY_STEPS = {
+    step.strip()
+    for step in os.getenv(
+        "LOCAL_ACTIVITY_STEPS",
+        "activity_cancel_order,activity_update_address,activity_get_order_state,activity_refund_payment,"
+        "activity_risk_score",
+    ).split(",")
+    if step.strip()
+}
+
+
+def runs_locally(activity_fn) -> bool:
+    return activity_fn.__name__ in LOCAL_ACTIVITY_STEPS
+
+
+async def execute_step(activity_fn, *, args=(), task_queue: str | None = None, local: bool = True, **options):
+    """
+    Run an activity from workflow code either as a normal activity on `task_queue`
+    or, if its step is in LOCAL_ACTIVITY_STEPS, as a local activity on this worker.
+    Timeouts and the retry policy are passed through unchanged, so retries behave
+    the same either way (the worker retries local activities itself).
+    local=False always runs a normal activity, for histories recorded before any step ran locally.
+    """
+    if local and runs_locally(activity_fn):
+        return await workflow.execute_local_activity(activity_fn, args=args, **options)
+    return await workflow.execute_activity(activity_fn, args=args, task_queue=task_queue, **options)
@@ -1,93 +1,416 @@
 import asyncio
+import bisect
+import contextvars
+import json
 import logging
+import os
+import socket
+import time
+from collections import deque
+from dataclasses import dataclass
 
 logger = logging.getLogger("hedge")
 
-# Shared primitives
-hedge_success = asyncio.Event()
-hedge_winner_id: int | None = None
-hedge_id_map: dict[asyncio.Task, int] = {}
 
-# Global lock to enforce atomic election
-_election_lock = asyncio.Lock()
+@dataclass(frozen=True)
+class HedgePolicy:
+    """
+    Per-stub hedging settings.
+    Extra hedges are launched one at a time, each after `hedge_delay` seconds
+    without a winner. When `hedge_delay` is None the delay is the stub's observed
+    `percentile` latency, falling back to `default_delay` until `min_samples`
+    completions have been recorded. hedge_delay=0 fires every hedge at once.
+    """
+    max_hedges: int = 7
+    percentile: float = 95.0
+    hedge_delay: float | None = None
+    default_delay: float = 0.05
+    min_samples: int = 20
+
+
+DEFAULT_HEDGE_POLICY = HedgePolicy()
+
 
+def hedge_policy(**settings):
+    """Attach a HedgePolicy to a stub; run_with_hedges picks it up automatically."""
+    def decorator(fn):
+        fn.hedge_policy = HedgePolicy(**settings)
+        return fn
+    return decorator
+
+
+class LatencyHistogram:
+    """
+    Rolling latency histogram over the last `window` samples.
+    Buckets are log-spaced from 1ms to ~70s, so percentiles cost O(buckets).
+    """
 
-def reset_hedge_state():
+    BOUNDS = [0.001 * 1.25 ** i for i in range(51)]
+
+    def __init__(self, window: int = 1000):
+        self._samples: deque[int] = deque(maxlen=window)
+        self._counts = [0] * (len(self.BOUNDS) + 1)
+
+    def observe(self, seconds: float) -> None:
+        if len(self._samples) == self._samples.maxlen:
+            self._counts[self._samples[0]] -= 1
+        bucket = bisect.bisect_left(self.BOUNDS, seconds)
+        self._samples.append(bucket)
+        self._counts[bucket] += 1
+
+    @property
+    def count(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> float | None:
+        if not self._samples:
+            return None
+        target = max(1, round(len(self._samples) * p / 100))
+        seen = 0
+        for bucket, n in enumerate(self._counts):
+            seen += n
+            if seen >= target:
+                return self.BOUNDS[min(bucket, len(self.BOUNDS) - 1)]
+        return self.BOUNDS[-1]
+
+
+class HedgeBudget:
+    """
+    Process-wide budget bounding hedge amplification.
+    An extra hedge is only granted while the hedges in the last `window` seconds
+    stay under `ratio` times the primaries in that window, so a slow downstream
+    can't make every call in the worker hedge at once. Within that cap a token
+    bucket smooths bursts: every primary call deposits `ratio` tokens, the bucket
+    also refills at `min_per_second`, and each extra hedge withdraws one token.
+    When either is exhausted calls run unhedged.
+    """
 
-    global hedge_winner_id
-    hedge_success.clear()
-    hedge_winner_id = None
-    hedge_id_map.clear()
+    def __init__(self, ratio: float = 0.1, burst: float = 20.0, min_per_second: float = 0.0, window: float = 60.0):
+        self.ratio = ratio
+        self.burst = burst
+        self.min_per_second = min_per_second
+        self.window = window
+        self.tokens = burst
+        self._refilled_at = time.monotonic()
+        self._primaries: deque[float] = deque()
+        self._hedges: deque[float] = deque()
+        self._denied: deque[float] = deque()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self._refilled_at) * self.min_per_second)
+        self._refilled_at = now
+        for events in (self._primaries, self._hedges, self._denied):
+            while events and now - events[0] > self.window:
+                events.popleft()
+
+    def record_primary(self) -> None:
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+        self._primaries.append(now)
+
+    def try_acquire(self) -> bool:
+        now = time.monotonic()
+        self._refill(now)
+        if self.tokens < 1 or len(self._hedges) >= self.ratio * len(self._primaries):
+            self._denied.append(now)
+            return False
+        self.tokens -= 1
+        self._hedges.append(now)
+        return True
+
+    def snapshot(self) -> dict:
+        self._refill(time.monotonic())
+        primaries = len(self._primaries)
+        return {
+            "tokens": round(self.tokens, 2),
+            "burst": self.burst,
+            "ratio": self.ratio,
+            "min_per_second": self.min_per_second,
+            "window_seconds": self.window,
+            "primary_calls": primaries,
+            "extra_hedges": len(self._hedges),
+            "denied_hedges": len(self._denied),
+            "hedge_ratio": round(len(self._hedges) / primaries, 3) if primaries else 0.0,
+        }
+
+
+hedge_budget = HedgeBudget(
+    ratio=float(os.getenv("HEDGE_BUDGET_RATIO", "0.1")),
+    burst=float(os.getenv("HEDGE_BUDGET_BURST", "20")),
+    min_per_second=float(os.getenv("HEDGE_BUDGET_MIN_PER_SECOND", "0")),
+    window=float(os.getenv("HEDGE_BUDGET_WINDOW_SECONDS", "60")),
+)
+
+HEDGE_STATUS_DIR = os.getenv("HEDGE_STATUS_DIR", "./.hedge_status")
+
+
+_histograms: dict[str, LatencyHistogram] = {}
+_hedge_counts: dict[str, dict[str, int]] = {}
+
+
+def latency_histogram(name: str) -> LatencyHistogram:
+    if name not in _histograms:
+        _histograms[name] = LatencyHistogram()
+    return _histograms[name]
+
+
+def hedge_delay_for(name: str, policy: HedgePolicy) -> float:
+    if policy.hedge_delay is not None:
+        return policy.hedge_delay
+    hist = latency_histogram(name)
+    if hist.count < policy.min_samples:
+        return policy.default_delay
+    return hist.percentile(policy.percentile)
+
+
+def hedge_stats() -> dict:
+    """Per-stub hedge counters and current latency percentiles."""
+    stats = {}
+    for name, counts in _hedge_counts.items():
+        hist = latency_histogram(name)
+        stats[name] = {
+            **counts,
+            "samples": hist.count,
+            "p50": hist.percentile(50),
+            "p90": hist.percentile(90),
+            "p95": hist.percentile(95),
+        }
+    return stats
+
+
+def write_hedge_status(worker_name: str, status_dir: str = HEDGE_STATUS_DIR, extra: dict | None = None) -> None:
+    """
+    Dump this process's budget and hedge counters for /hedge-budget to read.
+    `extra` maps section names to callables returning more worker metrics.
+    """
+    os.makedirs(status_dir, exist_ok=True)
+    path = os.path.join(status_dir, f"{worker_name}-{os.getpid()}.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({
+            "worker": worker_name,
+            "pid": os.getpid(),
+            "ts": time.time(),
+            "budget": hedge_budget.snapshot(),
+            "stubs": hedge_stats(),
+            **{name: collect() for name, collect in (extra or {}).items()},
+        }, f)
+    os.replace(tmp, path)
+
+
+def read_hedge_status(status_dir: str = HEDGE_STATUS_DIR, max_age: float = 30.0) -> list[dict]:
+    if not os.path.isdir(status_dir):
+        return []
+    statuses = []
+    for name in sorted(os.listdir(status_dir)):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(status_dir, name)) as f:
+                status = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if time.time() - status.get("ts", 0) <= max_age:
+            statuses.append(status)
+    return statuses
+
+
+async def publish_hedge_status(worker_name: str, interval: float = 5.0, extra: dict | None = None) -> None:
+    while True:
+        try:
+            write_hedge_status(worker_name, extra=extra)
+        except OSError as e:
+            logger.warning(f"[Hedge] failed to publish hedge status: {e}")
+        await asyncio.sleep(interval)
+
+
+class HedgeGroup:
+    """
+    Election state owned by a single run_with_hedges call.
+    Concurrent hedged activities in one worker each get their own group,
+    so one activity's election can never reset or steal another's.
+    """
+
+    def __init__(self, attempt_scope: str = "default"):
+        self.attempt_scope = attempt_scope
+        self.success = asyncio.Event()
+        self.winner_id: int | None = None
+        self.id_map: dict[asyncio.Task, int] = {}
+        self.launched = 0
+        self._election_lock = asyncio.Lock()
+
+    async def elect(self, hedge_id: int, order_id: str, logger) -> bool:
+        async with self._election_lock:
+            if self.winner_id is None:
+                self.winner_id = hedge_id
+                self.success.set()
+                logger.info(f"[Hedge] hedge {hedge_id} elected as winner for order {order_id}")
+
+        # Double‑check before DB commit
+        if self.winner_id != hedge_id:
+            logger.info(f"[Hedge] hedge {hedge_id} canceled before DB commit for order {order_id}")
+            return False
+
+        return True
+
+
+# Set inside each hedge task; tasks copy the context on creation so every
+# hedge sees only the group and id of the run_with_hedges call that spawned it.
+_current_group: contextvars.ContextVar[HedgeGroup | None] = contextvars.ContextVar("hedge_group", default=None)
+_current_hedge_id: contextvars.ContextVar[int | None] = contextvars.ContextVar("hedge_id", default=None)
+
+
+def current_hedge_group() -> HedgeGroup | None:
+    return _current_group.get()
+
+
+def current_hedge_id() -> int | None:
+    return _current_hedge_id.get()
 
 
 async def elect_hedge_winner(hedge_id: int, order_id: str, logger) -> bool:
+    group = _current_group.get()
+    if group is None:
+        # Called outside run_with_hedges: a single attempt always wins
+        return True
+    return await group.elect(hedge_id, order_id, logger)
+
 
-    global hedge_winner_id
+async def claim_election(db, order_id: str, step: str, result) -> tuple[bool, object]:
+    """
+    Insert-or-ignore the (order_id, step, attempt_scope) election row inside the
+    caller's AsyncSession transaction, so the stub commits its state change
+    together with it. Returns (True, result) when this attempt won, or (False, stored result) when
+    another worker process or an earlier retry of the activity already committed
+    the step.
+    """
+    from app.db.models import HedgeElection
 
-    async with _election_lock:
-        if hedge_winner_id is None:
-            hedge_winner_id = hedge_id
-            hedge_success.set()
-            logger.info(f"[Hedge] hedge {hedge_id} elected as winner for order {order_id}")
+    group = _current_group.get()
+    scope = group.attempt_scope if group else "default"
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
 
-    # Double‑check before DB commit
-    if hedge_winner_id != hedge_id:
-        logger.info(f"[Hedge] hedge {hedge_id} canceled before DB commit for order {order_id}")
-        return False
+    stmt = insert(HedgeElection).values(
+        order_id=order_id,
+        step=step,
+        attempt_scope=scope,
+        winner=f"{socket.gethostname()}:{os.getpid()}:{_current_hedge_id.get()}",
+        result_json=result,
+    ).on_conflict_do_nothing()
+    if (await db.execute(stmt)).rowcount == 1:
+        return True, result
 
-    return True
+    existing = await db.get(HedgeElection, (order_id, step, scope))
+    logger.info(f"[Hedge] {step} for order {order_id} already committed by {existing.winner}")
+    return False, existing.result_json
 
 
-async def run_with_hedges(fn, *args, hedges: int = 7, **kwargs):
+async def run_with_hedges(
+    fn,
+    *args,
+    policy: HedgePolicy | None = None,
+    budget: HedgeBudget | None = None,
+    attempt_scope: str = "default",
+    **kwargs,
+):
     """
-    Launch multiple hedges, return first real success, cancel losers immediately.
-    Each hedge task registers its hedge_id in hedge_id_map.
+    Start one attempt, then launch extra hedges one at a time whenever the
+    stub's hedge delay passes without a winner (or an attempt fails), up to
+    policy.max_hedges and while the worker's hedge budget has tokens.
+    Return the elected winner's result and cancel the rest.
+    Each call owns a fresh HedgeGroup that the hedges reach through a contextvar;
+    attempt_scope keys the group's database election rows (see claim_election).
     """
-    tasks: list[asyncio.Task] = []
+    name = fn.__name__
+    policy = policy or getattr(fn, "hedge_policy", DEFAULT_HEDGE_POLICY)
+    budget = budget or hedge_budget
+    delay = hedge_delay_for(name, policy)
+    group = HedgeGroup(attempt_scope)
+    started: dict[asyncio.Task, float] = {}
 
-    # Bind hedge_id explicitly to avoid late binding bug
-    for i in range(hedges):
-        async def wrapped_fn(*args, hedge_id=i, **kwargs):
-            task = asyncio.current_task()
-            hedge_id_map[task] = hedge_id
-            return await fn(*args, **kwargs)
+    async def wrapped_fn(hedge_id: int):
+        _current_group.set(group)
+        _current_hedge_id.set(hedge_id)
+        return await fn(*args, **kwargs)
 
-        t = asyncio.create_task(wrapped_fn(*args, **kwargs))
-        hedge_id_map[t] = i  # ensure lookup works later
-        tasks.append(t)
+    def launch() -> asyncio.Task:
+        t = asyncio.create_task(wrapped_fn(group.launched))
+        group.id_map[t] = group.launched
+        started[t] = time.perf_counter()
+        group.launched += 1
+        return t
 
+    budget.record_primary()
+    pending = {launch()}
     winner_result = None
     last_error = None
+    budget_exhausted = False
 
-    for fut in asyncio.as_completed(tasks):
-        try:
-            result = await fut
-            hedge_id = hedge_id_map.get(fut, "?")
+    def can_hedge() -> bool:
+        return group.launched < policy.max_hedges and not budget_exhausted
+
+    def try_hedge() -> bool:
+        nonlocal budget_exhausted
+        if not budget.try_acquire():
+            budget_exhausted = True
+            logger.warning(f"[Hedge] {name} hedge budget exhausted, continuing unhedged")
+            return False
+        pending.add(launch())
+        return True
 
-            # Skip loser sentinel values (None or empty string)
-            if result is None or result == "":
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=delay if can_hedge() else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                try_hedge()
                 continue
 
-            winner_result = result
-
-            for t in tasks:
-                if t is not fut and not t.done():
-                    t.cancel()
-                    loser_id = hedge_id_map.get(t, "?")
-            break
-        except Exception as e:
-            hedge_id = hedge_id_map.get(fut, "?")
-            logger.error(f"[Hedge] hedge {hedge_id} failed: {e}")
-            last_error = e
-
-    # Drain canceled tasks
-    for t in tasks:
-        if t.done():
-            try:
-                await t
-            except Exception:
-                pass
+            failed = False
+            for t in done:
+                hedge_id = group.id_map[t]
+                try:
+                    result = t.result()
+                except Exception as e:
+                    logger.error(f"[Hedge] hedge {hedge_id} failed: {e}")
+                    last_error = e
+                    failed = True
+                    continue
+
+                # Skip loser sentinel values (None or empty string) and any
+                # result from a hedge that lost the election
+                if result is None or result == "":
+                    continue
+                if group.winner_id is not None and group.winner_id != hedge_id:
+                    continue
+
+                latency_histogram(name).observe(time.perf_counter() - started[t])
+                winner_result = result
+                break
+
+            if winner_result is not None:
+                break
+            if failed and can_hedge():
+                try_hedge()
+    finally:
+        # Drain canceled tasks
+        for t in started:
+            if not t.done():
+                t.cancel()
+        await asyncio.gather(*started, return_exceptions=True)
+
+        counts = _hedge_counts.setdefault(name, {"calls": 0, "hedges_launched": 0})
+        counts["calls"] += 1
+        counts["hedges_launched"] += group.launched
+        logger.info(f"[Hedge] {name} launched {group.launched} hedge(s), delay {delay * 1000:.1f}ms")
 
     if winner_result is not None:
         return winner_result
-    raise last_error
+    raise last_error or RuntimeError(f"All {group.launched} hedges of {name} lost or returned no result")
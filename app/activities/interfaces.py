@@ -0,0 +1,72 @@
+"""
+Activity interfaces for workflow code.
+
+Each function here carries the name, signature and return type of the
+activity of the same name in app.activities.activities, which is all a
+workflow needs to schedule it. Importing this module pulls in nothing
+but temporalio and the order types, so workflow sandboxes don't re-import
+the stubs, SQLAlchemy models or sessions on every run. Workers register
+the implementations from app.activities.activities.
+"""
+from temporalio import activity
+from app.types.order_types import OrderData
+
+
+@activity.defn
+async def activity_order_received(order: "OrderData") -> dict: ...
+
+
+@activity.defn
+async def activity_order_validated(order: dict) -> None: ...
+
+
+@activity.defn
+async def activity_orders_received(batch_id: str, orders: list[dict]) -> list[str]: ...
+
+
+@activity.defn
+async def activity_orders_validated(batch_id: str, orders: list[dict]) -> dict: ...
+
+
+@activity.defn
+async def activity_payment_charged(order: dict, payment_id: str) -> dict: ...
+
+
+@activity.defn
+async def activity_package_prepared(order: dict) -> str: ...
+
+
+@activity.defn
+async def activity_carrier_dispatched(order: dict) -> str: ...
+
+
+@activity.defn
+async def activity_order_shipped(order: dict) -> str: ...
+
+
+@activity.defn
+async def activity_manual_review(order: dict) -> None: ...
+
+
+@activity.defn
+async def activity_risk_score(features: dict) -> dict: ...
+
+
+@activity.defn
+async def activity_cancel_order(order: dict) -> str: ...
+
+
+@activity.defn
+async def activity_refund_payment(order: dict, reason: str) -> str: ...
+
+
+@activity.defn
+async def activity_update_address(order: dict, new_address: dict) -> str: ...
+
+
+@activity.defn
+async def activity_fetch_order(order_id: str) -> dict: ...
+
+
+@activity.defn
+async def activity_get_order_state(order_id: str) -> dict: ...
@@ -0,0 +1,13 @@
+# Kept free of numpy so workflow code can build features inside the sandbox
+
+FEATURES = ("item_count", "total_qty", "max_qty", "address_changes")
+
+
+def order_features(items: list, address_changes: int = 0) -> dict:
+    quantities = [item["qty"] if isinstance(item, dict) else item.qty for item in items] or [0]
+    return {
+        "item_count": len(items),
+        "total_qty": sum(quantities),
+        "max_qty": max(quantities),
+        "address_changes": address_changes,
+    }
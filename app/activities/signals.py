@@ -3,7 +3,8 @@ from datetime import timedelta
 from dataclasses import asdict
 from temporalio import workflow
 from temporalio.common import RetryPolicy
-from app.activities.activities import (
+from app.activities.execution import execute_step
+from app.activities.interfaces import (
     activity_cancel_order,
     activity_refund_payment,
     activity_update_address,
@@ -16,62 +17,203 @@ FAST_RETRY_POLICY = RetryPolicy(
     maximum_interval=timedelta(milliseconds=100),
 )
 
+# Stages in which each request can still take effect; shared by the signal path and the Update validators
+CANCEL_BEFORE_PAYMENT_STAGES = ["received", "validated", "reviewed"]
+CANCEL_AFTER_PAYMENT_STAGES = ["charged", "package_prepared", "dispatched"]
+ADDRESS_UPDATE_STAGES = ["received", "validated", "reviewed", "charged", "package_prepared"]
+
 class SignalManager:
-    def __init__(self, workflow_instance, logger):
+    def __init__(self, workflow_instance, logger, task_queue: str = "order-tq"):
+        self.workflow = workflow_instance
         self.logger = logger
+        # The owning workflow's queue, whose worker registers the cancel/refund/address activities
+        self.task_queue = task_queue
+        # At most one pending update_address (the latest) and one cancel, in arrival order
         self.signal_queue = []
         self.new_address = None
+        self.address_updates = 0
+        # Undo steps registered by completed stages, run newest first when a cancel is accepted
+        self.compensations = []
+        # Set only once a cancel takes effect; from then on cancels are duplicates and updates are dropped
+        self.cancel_result = None
+        self.cancel_handled = False
+        # What the last rejected cancel reported, and how many queued cancels have been handled either way
+        self.cancel_rejection = None
+        self.cancels_processed = 0
+        self.counts = {"received": 0, "coalesced": 0, "duplicate_cancels": 0, "dropped_after_cancel": 0}
+        # Workflows replaying a history from before the stage graph: every queued signal is applied,
+        # in order, each as a regular activity, exactly as when that history was recorded
+        self.serial = False
 
     def queue_cancel(self):
+        self.counts["received"] += 1
+        if self.serial:
+            self.signal_queue.append(("cancel", None))
+            return
+        if self.cancel_pending() or self.cancel_result is not None:
+            # Client retries resend cancel; one is enough
+            self.counts["duplicate_cancels"] += 1
+            return
         self.signal_queue.append(("cancel", None))
 
     def queue_update_address(self, new_address: dict):
-        self.signal_queue.append(("update_address", new_address))
+        self.counts["received"] += 1
+        if self.serial:
+            self.new_address = new_address
+            self.signal_queue.append(("update_address", new_address))
+            return
+        if self.cancel_pending() or self.cancel_result is not None:
+            self.counts["dropped_after_cancel"] += 1
+            return
         self.new_address = new_address
+        for i, (signal_type, _) in enumerate(self.signal_queue):
+            if signal_type == "update_address":
+                # Only the latest address is applied, so it replaces the pending one in place
+                self.signal_queue[i] = ("update_address", new_address)
+                self.counts["coalesced"] += 1
+                return
+        self.signal_queue.append(("update_address", new_address))
+
+    def snapshot(self) -> dict:
+        # Everything a continued-as-new run needs to pick up where this one stopped
+        return {
+            "queue": [[signal_type, payload] for signal_type, payload in self.signal_queue],
+            "address_updates": self.address_updates,
+            "counts": dict(self.counts),
+            "compensations": [name for name, _ in self.compensations],
+        }
+
+    def restore(self, snapshot: dict, order) -> None:
+        self.signal_queue = [(signal_type, payload) for signal_type, payload in snapshot["queue"]]
+        self.address_updates = snapshot["address_updates"]
+        self.counts.update(snapshot["counts"])
+        for name in snapshot["compensations"]:
+            if name == "refund_payment":
+                self.add_refund_compensation(order)
+            else:
+                self.logger.warning(f"[SignalManager] compensation '{name}' can't be carried over, dropped")
 
     def has_pending(self) -> bool:
         return bool(self.signal_queue)
 
+    def pending(self) -> list[str]:
+        return [signal_type for signal_type, _ in self.signal_queue]
+
+    def cancel_pending(self) -> bool:
+        return any(signal_type == "cancel" for signal_type, _ in self.signal_queue)
+
+    def take_cancel(self) -> bool:
+        """Remove a queued cancel that the workflow hands to another workflow instead of handling here."""
+        pending = self.cancel_pending()
+        self.signal_queue = [entry for entry in self.signal_queue if entry[0] != "cancel"]
+        return pending
+
+    def settle_cancel(self, result) -> None:
+        # Outcome of a handed-off cancel, recorded as if it had been handled here
+        self.cancels_processed += 1
+        if isinstance(result, str):
+            self.cancel_handled = True
+            self.cancel_result = result
+            self.compensations.clear()  # whoever took the cancel also compensated
+        else:
+            self.cancel_rejection = result
+
+    def add_compensation(self, name: str, step) -> None:
+        if name not in [registered for registered, _ in self.compensations]:
+            self.compensations.append((name, step))
+
+    def add_refund_compensation(self, order) -> None:
+        # Refunding an order that was never charged is a no-op, so this is safe to register early
+        self.add_compensation("refund_payment", lambda: execute_step(
+            activity_refund_payment,
+            args=(asdict(order), "cancel"),
+            start_to_close_timeout=timedelta(seconds=2),
+            retry_policy=FAST_RETRY_POLICY,
+            task_queue=self.task_queue,
+            local=not self.serial,
+        ))
+
+    async def _compensate(self) -> list[str]:
+        ran = []
+        while self.compensations:
+            name, step = self.compensations.pop()
+            await step()
+            ran.append(name)
+        return ran
+
+    def _set_stage(self, stage: str) -> None:
+        # Keep the owning workflow's stage in step with what the signal did
+        self.workflow.advance(stage)
+
     async def process_signals(self, order, current_stage: str) -> str | None:
         result = None
-        for signal_type, payload in self.signal_queue:
+        queue, self.signal_queue = self.signal_queue, []
+        for signal_type, payload in queue:
             if signal_type == "cancel":
                 result = await self._handle_cancel(order, current_stage)
+                self.cancels_processed += 1
+                if isinstance(result, str):
+                    self.cancel_handled = True
+                    self.cancel_result = result
+                else:
+                    self.cancel_rejection = result
+                if not self.serial:
+                    break
             elif signal_type == "update_address":
                 await self._handle_address_update(order, payload, current_stage)
-        self.signal_queue.clear()
         return result
 
+    def cancel_outcome(self, order_id: str) -> dict:
+        # What a cancel Update reports once the queued cancel has been handled
+        if self.cancel_result is not None:
+            return {"applied": True, "status": self.cancel_result}
+        if isinstance(self.cancel_rejection, dict):
+            return {"applied": False, **self.cancel_rejection}
+        return {"applied": False, "status": f"[{order_id}] Cancel rejected, order in stage '{self.workflow.stage}'"}
+
+    async def apply_address_update(self, order, new_address: dict, stage: str) -> dict:
+        """Apply an address change right away (Update path) and report whether it took effect."""
+        self.counts["received"] += 1
+        if any(signal_type == "update_address" for signal_type, _ in self.signal_queue):
+            # An update signalled earlier is older than this one, so it is dropped
+            self.signal_queue = [entry for entry in self.signal_queue if entry[0] != "update_address"]
+            self.counts["coalesced"] += 1
+        rejected = await self._handle_address_update(order, new_address, stage)
+        if rejected:
+            return {"applied": False, **rejected}
+        return {"applied": True, "status": f"[{order.order_id}] Address updated"}
+
     async def _handle_cancel(self, order, stage: str) -> str | None:
         order_id = order.order_id
 
-        if stage in ["received", "validated", "reviewed"]:
-            await workflow.execute_activity(
+        if stage in CANCEL_BEFORE_PAYMENT_STAGES:
+            await execute_step(
                 activity_cancel_order,
-                asdict(order),
+                args=[asdict(order)],
                 start_to_close_timeout=timedelta(seconds=2),
                 retry_policy=FAST_RETRY_POLICY,
-                task_queue="order-tq"
+                task_queue=self.task_queue,
+                local=not self.serial,
             )
+            await self._compensate()
+            self._set_stage("canceled")
             self.logger.info(f"[SignalManager] cancel success: {order_id} canceled before payment")
             return f"Order {order_id} canceled before payment."
 
-        elif stage in ["charged", "package_prepared", "dispatched"]:
-            await workflow.execute_activity(
+        elif stage in CANCEL_AFTER_PAYMENT_STAGES:
+            await execute_step(
                 activity_cancel_order,
-                asdict(order),
-                start_to_close_timeout=timedelta(seconds=2),
-                retry_policy=FAST_RETRY_POLICY,
-                task_queue="order-tq"
-            )
-            await workflow.execute_activity(
-                activity_refund_payment,
-                args=(asdict(order), "cancel"),
+                args=[asdict(order)],
                 start_to_close_timeout=timedelta(seconds=2),
                 retry_policy=FAST_RETRY_POLICY,
-                task_queue="order-tq"
+                task_queue=self.task_queue,
+                local=not self.serial,
             )
-            self.logger.info(f"[SignalManager] cancel success: {order_id} canceled after payment, refund issued")
+            # The payment stage registers the refund; registering again here covers a stage read from the DB
+            self.add_refund_compensation(order)
+            compensated = await self._compensate()
+            self._set_stage("refunded")
+            self.logger.info(f"[SignalManager] cancel success: {order_id} canceled after payment, compensated {compensated}")
             return f"Order {order_id} canceled after payment. Refund issued."
 
         elif stage in ["shipping", "shipped"]:
@@ -84,15 +226,17 @@ class SignalManager:
     async def _handle_address_update(self, order, new_address: dict, stage: str):
         order_id = order.order_id
 
-        if stage in ["received", "validated", "reviewed", "charged", "package_prepared"]:
+        if stage in ADDRESS_UPDATE_STAGES:
             order.address = new_address
-            await workflow.execute_activity(
+            await execute_step(
                 activity_update_address,
                 args=(asdict(order), new_address),
                 start_to_close_timeout=timedelta(seconds=2),
                 retry_policy=FAST_RETRY_POLICY,
-                task_queue="order-tq"
+                task_queue=self.task_queue,
+                local=not self.serial,
             )
+            self.address_updates += 1
             self.logger.info(f"[SignalManager] address update success: {order_id} updated to {new_address}")
         elif stage in ["dispatched", "shipping", "shipped"]:
             self.logger.info(f"[SignalManager] address update rejected: {order_id} already in stage '{stage}'")
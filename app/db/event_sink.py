@@ -0,0 +1,157 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from .models import Event
+from .order_cache import order_cache  # noqa: F401, registers the commit hooks that keep it coherent
+from .session import AsyncSessionLocal
+
+logger = logging.getLogger("event-sink")
+
+EVENT_SINK_FLUSH_MS = float(os.getenv("EVENT_SINK_FLUSH_MS", "5"))
+EVENT_SINK_MAX_BATCH = int(os.getenv("EVENT_SINK_MAX_BATCH", "100"))
+
+
+@dataclass
+class _Pending:
+    unit: object
+    context: contextvars.Context
+    future: asyncio.Future
+    queued_at: float = field(default_factory=time.perf_counter)
+
+
+class EventSink:
+    """
+    Group-commit writer shared by every activity and stub in a worker.
+
+    Callers submit a unit, an `async def unit(db)` that stages one lifecycle
+    transition (election row, state change, Event rows) on the session it is
+    given. Units queued within `flush_ms`, up to `max_batch`, run on one session
+    and are committed together, so their events go out as one multi-row insert
+    and one commit. submit() only returns once that commit is durable.
+
+    If any unit in a batch raises, the batch is rolled back and each unit is
+    replayed in its own transaction, so only the failing caller sees the error.
+    Units run in the submitter's contextvars context (hedge group, scope).
+    If the flush task is cancelled, every caller still waiting gets an error.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal, flush_ms: float = EVENT_SINK_FLUSH_MS,
+                 max_batch: int = EVENT_SINK_MAX_BATCH):
+        self.session_factory = session_factory
+        self.flush_interval = flush_ms / 1000
+        self.max_batch = max_batch
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._batch_sizes: deque[int] = deque(maxlen=1000)
+        self._flush_latencies: deque[float] = deque(maxlen=1000)
+        self._ack_latencies: deque[float] = deque(maxlen=1000)
+        self.flushes = 0
+        self.units = 0
+        self.fallbacks = 0
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+
+    async def submit(self, unit):
+        """Run `unit(db)` in the next group commit and return its result once durable."""
+        self._ensure_started()
+        pending = _Pending(unit, contextvars.copy_context(), self._loop.create_future())
+        await self._queue.put(pending)
+        return await pending.future
+
+    async def log(self, order_id: str, event_type: str, payload: dict = None) -> None:
+        """Durably append a single event."""
+        from datetime import datetime
+
+        async def unit(db):
+            db.add(Event(order_id=order_id, type=event_type, payload_json=payload or {}, ts=datetime.utcnow()))
+
+        await self.submit(unit)
+
+    async def _run(self) -> None:
+        queue = self._queue
+        batch: list[_Pending] = []
+        try:
+            while True:
+                batch = [await queue.get()]
+                deadline = self._loop.time() + self.flush_interval
+                while len(batch) < self.max_batch:
+                    timeout = deadline - self._loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                await self._flush(batch)
+        finally:
+            # Cancelled (worker shutdown) or crashed: nothing will flush the batch in hand or the queue,
+            # so fail their callers instead of leaving them waiting; the next submit starts a new task
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(RuntimeError("Event sink stopped before the unit was committed"))
+
+    async def _apply(self, batch: list[_Pending]) -> list:
+        async with self.session_factory() as db:
+            results = []
+            for pending in batch:
+                results.append(await asyncio.create_task(pending.unit(db), context=pending.context))
+            await db.commit()
+            return results
+
+    async def _flush(self, batch: list[_Pending]) -> None:
+        start = time.perf_counter()
+        try:
+            results = await self._apply(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                if not batch[0].future.done():
+                    batch[0].future.set_exception(e)
+                return
+            # Replay one by one so a bad unit doesn't fail its batch mates
+            self.fallbacks += 1
+            logger.warning(f"[EventSink] batch of {len(batch)} failed ({e}), replaying individually")
+            for pending in batch:
+                await self._flush([pending])
+            return
+
+        done = time.perf_counter()
+        self.flushes += 1
+        self.units += len(batch)
+        self._batch_sizes.append(len(batch))
+        self._flush_latencies.append(done - start)
+        for pending, result in zip(batch, results):
+            self._ack_latencies.append(done - pending.queued_at)
+            if not pending.future.done():
+                pending.future.set_result(result)
+
+    def stats(self) -> dict:
+        def pct(values, p):
+            ordered = sorted(values)
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000, 3) if ordered else None
+
+        sizes = list(self._batch_sizes)
+        return {
+            "flushes": self.flushes,
+            "units": self.units,
+            "fallbacks": self.fallbacks,
+            "batch_size_mean": round(sum(sizes) / len(sizes), 2) if sizes else None,
+            "batch_size_max": max(sizes) if sizes else None,
+            "flush_ms_p50": pct(self._flush_latencies, 0.5),
+            "flush_ms_p95": pct(self._flush_latencies, 0.95),
+            "ack_ms_p95": pct(self._ack_latencies, 0.95),
+        }
+
+
+event_sink = EventSink()
@@ -0,0 +1,117 @@
+import csv
+import io
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from sqlalchemy import select
+from .models import Order, Payment, Event
+from .session import AsyncSessionLocal
+
+EXPORT_PAGE_SIZE = 1000
+
+
+@dataclass(frozen=True)
+class ExportTable:
+    model: type
+    key: str           # unique, indexed column used for keyset pagination
+    order_column: str  # column the order_id range applies to
+    time_column: str   # column the since/until range applies to
+    columns: tuple
+
+
+EXPORT_TABLES = {
+    "orders": ExportTable(Order, "id", "id", "created_at",
+                          ("id", "state", "address_json", "created_at", "updated_at")),
+    "payments": ExportTable(Payment, "payment_id", "order_id", "created_at",
+                            ("payment_id", "order_id", "status", "amount", "created_at")),
+    "events": ExportTable(Event, "id", "order_id", "ts",
+                          ("id", "order_id", "type", "payload_json", "ts")),
+}
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+async def iter_rows(table: str, order_id_from: str = None, order_id_to: str = None,
+                    since: datetime = None, until: datetime = None,
+                    page_size: int = EXPORT_PAGE_SIZE, session_factory=AsyncSessionLocal):
+    """
+    Yield one dict per row of `table`, ordered by its key.
+
+    Pages are fetched with keyset pagination (key > last key seen, LIMIT page_size),
+    each in its own short transaction and streamed off a server-side cursor, so
+    memory stays at one page however large the table is and writers are never
+    held up behind a long-running read. order_id bounds are inclusive and compare
+    as strings; since is inclusive, until is exclusive.
+    """
+    spec = EXPORT_TABLES[table]
+    model = spec.model
+    key = getattr(model, spec.key)
+    columns = [getattr(model, name) for name in spec.columns]
+
+    filters = []
+    if order_id_from is not None:
+        filters.append(getattr(model, spec.order_column) >= order_id_from)
+    if order_id_to is not None:
+        filters.append(getattr(model, spec.order_column) <= order_id_to)
+    if since is not None:
+        filters.append(getattr(model, spec.time_column) >= since)
+    if until is not None:
+        filters.append(getattr(model, spec.time_column) < until)
+
+    last_key = None
+    while True:
+        stmt = select(*columns).where(*filters).order_by(key).limit(page_size)
+        if last_key is not None:
+            stmt = stmt.where(key > last_key)
+
+        fetched = 0
+        async with session_factory() as db:
+            result = await db.stream(stmt.execution_options(yield_per=page_size))
+            async for row in result:
+                fetched += 1
+                last_key = getattr(row, spec.key)
+                yield {name: _plain(value) for name, value in row._mapping.items()}
+
+        if fetched < page_size:
+            return
+
+
+async def export_ndjson(table: str, **filters):
+    """NDJSON chunks, one page of rows per chunk."""
+    page_size = filters.get("page_size", EXPORT_PAGE_SIZE)
+    lines = []
+    async for row in iter_rows(table, **filters):
+        lines.append(json.dumps(row, default=str))
+        if len(lines) >= page_size:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+async def export_csv(table: str, **filters):
+    """CSV chunks with a header row; JSON columns are written as JSON strings."""
+    page_size = filters.get("page_size", EXPORT_PAGE_SIZE)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_TABLES[table].columns)
+    rows = 0
+    async for row in iter_rows(table, **filters):
+        writer.writerow(json.dumps(v) if isinstance(v, (dict, list)) else v for v in row.values())
+        rows += 1
+        if rows % page_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+EXPORT_FORMATS = {
+    "ndjson": (export_ndjson, "application/x-ndjson"),
+    "csv": (export_csv, "text/csv"),
+}
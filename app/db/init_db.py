@@ -1,8 +1,33 @@
-from .session import engine
-from .models import Base
+import os
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+from .session import DATABASE_URL, build_engine
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
+ALEMBIC_INI = os.path.join(os.path.dirname(__file__), "..", "..", "alembic.ini")
+
+# Last revision whose schema matches what Base.metadata.create_all used to build
+PRE_MIGRATIONS_REVISION = "0001"
+
+
+def alembic_config(database_url: str = DATABASE_URL) -> Config:
+    config = Config(os.path.abspath(ALEMBIC_INI))
+    config.attributes["database_url"] = database_url
+    return config
+
+
+def init_db(database_url: str = DATABASE_URL, revision: str = "head"):
+    config = alembic_config(database_url)
+
+    engine = build_engine(database_url)
+    tables = inspect(engine).get_table_names()
+    engine.dispose()
+
+    # Databases created by the old create_all have tables but no version row
+    if "orders" in tables and "alembic_version" not in tables:
+        command.stamp(config, PRE_MIGRATIONS_REVISION)
+
+    command.upgrade(config, revision)
 
 if __name__ == "__main__":
     init_db()
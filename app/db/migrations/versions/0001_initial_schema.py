@@ -0,0 +1,47 @@
+"""initial schema: orders, payments, events
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "orders",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("state", sa.String()),
+        sa.Column("address_json", sa.JSON()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+    op.create_table(
+        "payments",
+        sa.Column("payment_id", sa.String(), primary_key=True),
+        sa.Column("order_id", sa.String(), sa.ForeignKey("orders.id")),
+        sa.Column("status", sa.String()),
+        sa.Column("amount", sa.Float()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_table(
+        "events",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("order_id", sa.String()),
+        sa.Column("type", sa.String()),
+        sa.Column("payload_json", sa.JSON()),
+        sa.Column("ts", sa.DateTime()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("events")
+    op.drop_table("payments")
+    op.drop_table("orders")
@@ -0,0 +1,33 @@
+"""hedge election ledger
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Databases initialised with create_all before migrations may already have it
+    if sa.inspect(op.get_bind()).has_table("hedge_elections"):
+        return
+    op.create_table(
+        "hedge_elections",
+        sa.Column("order_id", sa.String(), primary_key=True),
+        sa.Column("step", sa.String(), primary_key=True),
+        sa.Column("attempt_scope", sa.String(), primary_key=True),
+        sa.Column("winner", sa.String()),
+        sa.Column("result_json", sa.JSON()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("hedge_elections")
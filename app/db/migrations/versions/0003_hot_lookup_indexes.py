@@ -0,0 +1,25 @@
+"""indexes for hot lookup columns
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_events_order_id_ts", "events", ["order_id", "ts"])
+    op.create_index("uq_payments_order_id_status", "payments", ["order_id", "status"], unique=True)
+    op.create_index("ix_orders_state_updated_at", "orders", ["state", "updated_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_orders_state_updated_at", table_name="orders")
+    op.drop_index("uq_payments_order_id_status", table_name="payments")
+    op.drop_index("ix_events_order_id_ts", table_name="events")
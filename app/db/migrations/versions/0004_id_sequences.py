@@ -0,0 +1,34 @@
+"""id sequence table for the order id allocator
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    id_sequences = op.create_table(
+        "id_sequences",
+        sa.Column("name", sa.String(), primary_key=True),
+        sa.Column("next_value", sa.Integer(), nullable=False),
+    )
+
+    # Continue after the highest "order-N" handed out by the old COUNT(*) scheme
+    highest = 0
+    for (order_id,) in op.get_bind().execute(sa.text("SELECT id FROM orders WHERE id LIKE 'order-%'")):
+        suffix = order_id[len("order-"):]
+        if suffix.isdigit():
+            highest = max(highest, int(suffix))
+    op.bulk_insert(id_sequences, [{"name": "orders", "next_value": highest + 1}])
+
+
+def downgrade() -> None:
+    op.drop_table("id_sequences")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
@@ -16,6 +16,10 @@ class Order(Base):
     created_at = Column(DateTime, default=utcnow)
     updated_at = Column(DateTime, default=utcnow)
 
+    __table_args__ = (
+        Index("ix_orders_state_updated_at", "state", "updated_at"),
+    )
+
 class Payment(Base):
     __tablename__ = "payments"
 
@@ -25,6 +29,11 @@ class Payment(Base):
     amount = Column(Float)
     created_at = Column(DateTime, default=utcnow)
 
+    # One SUCCESSFUL charge and at most one REFUNDED row per order
+    __table_args__ = (
+        Index("uq_payments_order_id_status", "order_id", "status", unique=True),
+    )
+
 class Event(Base):
     __tablename__ = "events"
 
@@ -33,3 +42,23 @@ class Event(Base):
     type = Column(String)
     payload_json = Column(JSON)
     ts = Column(DateTime, default=utcnow)
+
+    __table_args__ = (
+        Index("ix_events_order_id_ts", "order_id", "ts"),
+    )
+
+class HedgeElection(Base):
+    __tablename__ = "hedge_elections"
+
+    order_id = Column(String, primary_key=True)
+    step = Column(String, primary_key=True)
+    attempt_scope = Column(String, primary_key=True)
+    winner = Column(String)
+    result_json = Column(JSON)
+    created_at = Column(DateTime, default=utcnow)
+
+class IdSequence(Base):
+    __tablename__ = "id_sequences"
+
+    name = Column(String, primary_key=True)
+    next_value = Column(Integer, nullable=False)
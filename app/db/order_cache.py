@@ -0,0 +1,276 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from sqlalchemy import event
+from .models import Order
+from .session import AppSession
+
+logger = logging.getLogger("order-cache")
+
+ORDER_CACHE_SIZE = int(os.getenv("ORDER_CACHE_SIZE", "10000"))
+ORDER_CACHE_TTL = float(os.getenv("ORDER_CACHE_TTL", "30"))
+ORDER_CACHE_POLL_MS = float(os.getenv("ORDER_CACHE_POLL_MS", "50"))
+ORDER_CACHE_CHANNEL = os.getenv("ORDER_CACHE_CHANNEL", "./.hedge_status/order-invalidations.log")
+# Past this size the next writer truncates the channel; readers then drop their whole cache
+ORDER_CACHE_CHANNEL_MAX_BYTES = int(os.getenv("ORDER_CACHE_CHANNEL_MAX_BYTES", str(4 * 1024 * 1024)))
+
+MISSING = -1
+
+
+class InvalidationChannel:
+    """
+    Cross-process invalidations over an append-only file shared by every worker
+    and the API. Each committed order change appends "<ts> <pid> <order_id>";
+    readers tail the file from their last offset and drop those keys. If the
+    file shrinks, is replaced or has unreadable lines, readers can't know what
+    they missed and clear everything instead.
+    """
+
+    def __init__(self, path: str = ORDER_CACHE_CHANNEL, max_bytes: int = ORDER_CACHE_CHANNEL_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._inode = None
+        self._offset = 0
+        self._partial = ""
+
+    def publish(self, order_ids) -> None:
+        lines = "".join(f"{time.time():.6f} {os.getpid()} {order_id}\n" for order_id in order_ids)
+        if not lines:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                open(self.path, "w").close()
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, lines.encode())
+            finally:
+                os.close(fd)
+        except OSError as e:
+            logger.warning(f"[OrderCache] failed to publish invalidations: {e}")
+
+    def poll(self):
+        """Return (reset, [(ts, order_id), ...]) for entries written by other processes since the last poll."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            # Not created yet reads as empty; deleted after we started reading is a reset
+            reset = self._inode not in (None, MISSING)
+            self._inode, self._offset, self._partial = MISSING, 0, ""
+            return reset, []
+
+        reset = False
+        if self._inode is None:
+            # First poll: nothing cached yet, so history is irrelevant
+            self._inode, self._offset = stat.st_ino, stat.st_size
+            return False, []
+        if self._inode == MISSING:
+            self._inode = stat.st_ino
+        elif stat.st_ino != self._inode or stat.st_size < self._offset:
+            self._inode, self._offset, self._partial = stat.st_ino, 0, ""
+            reset = True
+        if stat.st_size == self._offset:
+            return reset, []
+
+        with open(self.path, "r", errors="replace") as f:
+            f.seek(self._offset)
+            data = self._partial + f.read()
+            self._offset = f.tell()
+
+        lines = data.split("\n")
+        self._partial = lines.pop()
+        pid = str(os.getpid())
+        entries = []
+        bad = 0
+        for line in lines:
+            try:
+                ts, writer, order_id = line.split(" ", 2)
+                entry = (float(ts), order_id)
+            except ValueError:
+                bad += 1
+                continue
+            if writer != pid:
+                entries.append(entry)
+        if bad:
+            # Torn or garbled lines (e.g. read while another process truncated the file):
+            # keys may have been missed, so resync at the current end and clear everything
+            logger.warning(f"[OrderCache] {bad} unreadable invalidation line(s) in {self.path}, resetting")
+            self._partial = ""
+            reset = True
+        return reset, entries
+
+
+class OrderStateCache:
+    """
+    In-process LRU/TTL cache of order state for activity_get_order_state.
+
+    Commits that touch an Order write the new state through (see the session
+    hooks below) and publish the id on the invalidation channel so other
+    processes drop it. TTL bounds staleness if an invalidation is ever missed.
+    A per-key generation stops a slow read from caching a value older than a
+    write that landed while it was in flight.
+    """
+
+    def __init__(self, max_size: int = ORDER_CACHE_SIZE, ttl: float = ORDER_CACHE_TTL,
+                 channel: InvalidationChannel | None = None, poll_interval: float = ORDER_CACHE_POLL_MS / 1000):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.channel = channel or InvalidationChannel()
+        self.poll_interval = poll_interval
+        self._entries: OrderedDict[str, tuple[dict, float]] = OrderedDict()
+        # Last-write stamps, bounded; evicted keys report the newest stamp evicted
+        self._generations: OrderedDict[str, int] = OrderedDict()
+        self._stamp = 0
+        self._evicted_stamp = 0
+        self._last_poll = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.local_updates = 0
+        self.remote_invalidations = 0
+        self.resets = 0
+        self._hit_ages: deque[float] = deque(maxlen=1000)
+        self._remote_lags: deque[float] = deque(maxlen=1000)
+        self._unpublished: set[str] = set()
+        self._publish_scheduled = False
+
+    def _sync(self) -> None:
+        now = time.monotonic()
+        if now - self._last_poll < self.poll_interval:
+            return
+        self._last_poll = now
+        reset, entries = self.channel.poll()
+        if reset:
+            self.resets += 1
+            self.clear()
+        received = time.time()
+        for ts, order_id in entries:
+            self._drop(order_id)
+            self.remote_invalidations += 1
+            self._remote_lags.append(max(0.0, received - ts))
+
+    def _drop(self, order_id: str) -> None:
+        self._entries.pop(order_id, None)
+        self._stamp += 1
+        self._generations[order_id] = self._stamp
+        self._generations.move_to_end(order_id)
+        while len(self._generations) > 2 * self.max_size:
+            _, stamp = self._generations.popitem(last=False)
+            self._evicted_stamp = max(self._evicted_stamp, stamp)
+
+    def generation(self, order_id: str) -> int:
+        return self._generations.get(order_id, self._evicted_stamp)
+
+    def get(self, order_id: str) -> dict | None:
+        self._sync()
+        entry = self._entries.get(order_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, cached_at = entry
+        age = time.monotonic() - cached_at
+        if age > self.ttl:
+            del self._entries[order_id]
+            self.expired += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(order_id)
+        self.hits += 1
+        self._hit_ages.append(age)
+        return value
+
+    def put(self, order_id: str, value: dict, generation: int | None = None) -> None:
+        """Cache a value read from the database, unless the key changed since `generation` was taken."""
+        if generation is not None and generation != self.generation(order_id):
+            return
+        self._entries[order_id] = (value, time.monotonic())
+        self._entries.move_to_end(order_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def apply_commit(self, states: dict[str, dict | None]) -> None:
+        """Write committed states through locally and tell other processes to drop them."""
+        self._sync()
+        for order_id, value in states.items():
+            self._drop(order_id)
+            if value is not None:
+                self.put(order_id, value)
+            self.local_updates += 1
+        self._publish(states)
+
+    def _publish(self, order_ids) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.channel.publish(order_ids)  # sync sessions (scripts, migrations) write inline
+            return
+        # On the event loop: every commit in this loop iteration (a sink flush, hedged writers)
+        # goes out as one append, written from a thread so the loop never waits on the file
+        self._unpublished.update(order_ids)
+        if not self._publish_scheduled:
+            self._publish_scheduled = True
+            loop.call_soon(self._flush_publish, loop)
+
+    def _flush_publish(self, loop) -> None:
+        order_ids, self._unpublished = list(self._unpublished), set()
+        self._publish_scheduled = False
+        loop.run_in_executor(None, self.channel.publish, order_ids)
+
+    def clear(self) -> None:
+        # Also invalidates reads in flight for keys that were never cached
+        self._entries.clear()
+        self._generations.clear()
+        self._stamp += 1
+        self._evicted_stamp = self._stamp
+
+    def stats(self) -> dict:
+        def pct(values, p):
+            ordered = sorted(values)
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000, 3) if ordered else None
+
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "expired": self.expired,
+            "local_updates": self.local_updates,
+            "remote_invalidations": self.remote_invalidations,
+            "resets": self.resets,
+            # How old served entries were, and how long other processes' writes took to reach us
+            "hit_age_ms_p95": pct(self._hit_ages, 0.95),
+            "remote_lag_ms_p50": pct(self._remote_lags, 0.5),
+            "remote_lag_ms_p95": pct(self._remote_lags, 0.95),
+        }
+
+
+order_cache = OrderStateCache()
+
+
+# Sessions from SessionLocal and AsyncSessionLocal report the orders they flushed; the cache is
+# only touched once the transaction has actually committed. Other sessions (tests, Alembic, one-off
+# engines) leave the cache and the shared channel alone.
+@event.listens_for(AppSession, "after_flush")
+def _collect_order_changes(session, flush_context) -> None:
+    changed = session.info.setdefault("order_states", {})
+    for obj in session.new | session.dirty:
+        if isinstance(obj, Order):
+            changed[obj.id] = {"state": obj.state}
+    for obj in session.deleted:
+        if isinstance(obj, Order):
+            changed[obj.id] = None
+
+
+@event.listens_for(AppSession, "after_commit")
+def _apply_order_changes(session) -> None:
+    changed = session.info.pop("order_states", None)
+    if changed:
+        order_cache.apply_commit(changed)
+
+
+@event.listens_for(AppSession, "after_rollback")
+def _discard_order_changes(session) -> None:
+    session.info.pop("order_states", None)
@@ -1,15 +1,126 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import os
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
 
-DATABASE_URL = "sqlite:///./orders.db"
+load_dotenv()
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False}
-)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./orders.db")
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# Negative cache_size is in KiB, so the default is a 64 MiB page cache per connection
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+# SQLite takes one writer at a time: aiosqlite connections beyond a writer and a WAL reader only
+# queue on its lock, each from its own thread, which costs more than waiting for the pool
+SQLITE_ASYNC_POOL_SIZE = int(os.getenv("SQLITE_ASYNC_POOL_SIZE", "2"))
+
+
+# Backend -> (sync driver, async driver). The URL's own driver, if any, is replaced, so either
+# engine gets a driver it can use whatever form DATABASE_URL was written in.
+DRIVERS = {
+    "sqlite": ("sqlite+pysqlite", "sqlite+aiosqlite"),
+    "postgresql": ("postgresql+psycopg2", "postgresql+asyncpg"),
+    "postgres": ("postgresql+psycopg2", "postgresql+asyncpg"),
+}
+
+
+def _with_driver(url: str, asynchronous: bool) -> str:
+    parsed = make_url(url)
+    drivers = DRIVERS.get(parsed.get_backend_name())
+    if drivers is None:
+        return url
+    # Swap only the scheme; re-rendering the parsed URL would escape names such as :memory:
+    return drivers[asynchronous] + url[len(parsed.drivername):]
+
+
+def to_sync_url(url: str) -> str:
+    """Map a URL onto its sync driver: pysqlite for SQLite, psycopg2 for Postgres."""
+    return _with_driver(url, asynchronous=False)
+
+
+def to_async_url(url: str) -> str:
+    """Map a URL onto its async driver: aiosqlite for SQLite, asyncpg for Postgres."""
+    return _with_driver(url, asynchronous=True)
+
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    # WAL lets readers run alongside the single writer, busy_timeout makes
+    # hedged writers queue on the lock instead of failing "database is locked"
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+    cursor.close()
+
+
+def engine_options(url: str) -> dict:
+    """Pool profile per backend: SQLite file pools plus pragmas (a small fixed pool for aiosqlite), Postgres with pre-ping."""
+    options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+    if is_sqlite(url):
+        if ":memory:" in url:
+            return {}
+        if make_url(url).get_driver_name() == "aiosqlite":
+            return {**options, "pool_size": SQLITE_ASYNC_POOL_SIZE, "max_overflow": 0}
+        return options
+    return {**options, "pool_pre_ping": True}
+
+
+def build_engine(url: str = DATABASE_URL):
+    url = to_sync_url(url)
+    connect_args = {"check_same_thread": False} if is_sqlite(url) else {}
+    engine = create_engine(url, connect_args=connect_args, **engine_options(url))
+    if is_sqlite(url):
+        event.listen(engine, "connect", apply_sqlite_pragmas)
+    return engine
+
+
+def build_async_engine(url: str = DATABASE_URL):
+    async_url = to_async_url(url)
+    engine = create_async_engine(async_url, **engine_options(async_url))
+    if is_sqlite(async_url):
+        event.listen(engine.sync_engine, "connect", apply_sqlite_pragmas)
+    return engine
+
+
+class AppSession(Session):
+    """Session class behind SessionLocal and AsyncSessionLocal; the order cache's commit hooks listen on it only."""
+
+
+ASYNC_DATABASE_URL = to_async_url(DATABASE_URL)
+
+engine = build_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(
     autocommit=False,
     autoflush=False,
-    bind=engine
+    bind=engine,
+    class_=AppSession,
+)
+
+# Activities and stubs run on the worker event loop and must use the async
+# factory; the sync one is for scripts and the API's dump endpoints.
+async_engine = build_async_engine(DATABASE_URL)
+
+AsyncSessionLocal = async_sessionmaker(
+    autoflush=False,
+    expire_on_commit=False,
+    bind=async_engine,
+    sync_session_class=AppSession,
 )
@@ -1,27 +1,26 @@
 import logging
 logger = logging.getLogger("main")
-from datetime import timedelta
-from fastapi import FastAPI, HTTPException, Depends, Body
-from sqlalchemy.orm import Session
-from temporalio.client import Client , WorkflowExecutionStatus
-import subprocess, asyncio, socket, os, random
+from datetime import datetime, timedelta
+from fastapi import FastAPI, HTTPException, Body, Query, Request
+from fastapi.responses import StreamingResponse
+from temporalio.client import (
+    Client, WorkflowExecutionStatus, WorkflowQueryFailedError, WorkflowQueryRejectedError, WorkflowUpdateFailedError,
+)
+from temporalio.common import QueryRejectCondition
+from temporalio.service import RPCError
+import subprocess, asyncio, socket, os, random, json, shutil, sys
 from pydantic import BaseModel
-from typing import List
-from app.workflows import OrderWorkflow, ReturnWorkflow
-from app.db.session import SessionLocal
-from app.db.models import Order, Payment, Event
-from tabulate import tabulate
+from typing import List, Literal, Optional
+from app.types.converter import data_converter
+from app.workflows import BulkOrderWorkflow, OrderWorkflow, ReturnWorkflow, ShippingWorkflow
+from app.db.id_allocator import build_order_id_allocator
+from app.db.export import EXPORT_FORMATS, EXPORT_PAGE_SIZE
+from app.db.order_cache import order_cache
 from app.activities.activities import activity_get_order_state
-from app.activities.signals import SignalManager
+from app.activities.hedge_state import read_hedge_status
 app = FastAPI()
 app.state.client = None
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+app.state.workers = None
 
 async def wait_for_temporal(host="localhost", port=7233, timeout=30):
     for i in range(timeout):
@@ -36,13 +35,16 @@ async def wait_for_temporal(host="localhost", port=7233, timeout=30):
 @app.post("/start-server", tags=["System"])
 async def start_temporal_and_workers():
     try:
-        temporal_path = os.path.expanduser("~\\.temporal\\temporal.exe")
-
         logger.info("Launching Temporal server...")
-        subprocess.Popen([
-            "powershell", "-Command",
-            f"Start-Process -FilePath \"{temporal_path}\" -ArgumentList 'server start-dev' -WindowStyle Normal"
-        ])
+        if os.name == "nt":
+            temporal_path = os.path.expanduser("~\\.temporal\\temporal.exe")
+            subprocess.Popen([
+                "powershell", "-Command",
+                f"Start-Process -FilePath \"{temporal_path}\" -ArgumentList 'server start-dev' -WindowStyle Normal"
+            ])
+        else:
+            temporal_path = shutil.which("temporal") or os.path.expanduser("~/.temporalio/bin/temporal")
+            subprocess.Popen([temporal_path, "server", "start-dev"], start_new_session=True)
 
         logger.info("Waiting for Temporal server to be ready...")
         ready = await wait_for_temporal()
@@ -50,16 +52,21 @@ async def start_temporal_and_workers():
             raise HTTPException(status_code=503, detail="Temporal server did not start in time")
 
         logger.info("Connecting Temporal client...")
-        app.state.client = await Client.connect("localhost:7233")
+        app.state.client = await Client.connect("localhost:7233", data_converter=data_converter())
         logger.info("Temporal client connected.")
 
         logger.info("Launching workers...")
-        for worker_script in ["order_worker", "shipping_worker", "returns_worker"]:
-            subprocess.Popen([
-                "powershell", "-Command",
-                f"Start-Process powershell -WindowStyle Normal -ArgumentList 'cd \"{os.getcwd()}\"; .\\.venv\\Scripts\\Activate.ps1; python -m app.workers.{worker_script}; Read-Host'"
-            ])
-            logger.info(f"{worker_script} launched")
+        if os.name == "nt":
+            for worker_script in ["order_worker", "shipping_worker", "returns_worker"]:
+                subprocess.Popen([
+                    "powershell", "-Command",
+                    f"Start-Process powershell -WindowStyle Normal -ArgumentList 'cd \"{os.getcwd()}\"; .\\.venv\\Scripts\\Activate.ps1; python -m app.workers.{worker_script}; Read-Host'"
+                ])
+                logger.info(f"{worker_script} launched")
+        elif app.state.workers is None or app.state.workers.poll() is not None:
+            # One supervisor forks WORKER_PROCESSES workers per queue and restarts them if they crash
+            app.state.workers = subprocess.Popen([sys.executable, "-m", "app.workers"], cwd=os.getcwd())
+            logger.info(f"worker supervisor launched (pid {app.state.workers.pid})")
 
         return {"status": "Temporal server and workers started"}
     except Exception as e:
@@ -85,16 +92,14 @@ class OrderInput(BaseModel):
     address: AddressInput
     items: List[ItemInput]
 
-def generate_order_id(db: Session):
-    count = db.query(Order).count()
-    return f"order-{count + 1}"
+order_ids = build_order_id_allocator()
 
 @app.post("/start-order", tags=["Workflow"])
-async def start_order(order: OrderInput, db: Session = Depends(get_db)):
+async def start_order(order: OrderInput):
     client = require_temporal()
-    order_id = generate_order_id(db)
-    address_dict = order.address.dict()
-    items_list = [item.dict() for item in order.items]
+    order_id = await order_ids.next_id()
+    address_dict = order.address.model_dump()
+    items_list = [item.model_dump() for item in order.items]
 
     handle = await client.start_workflow(
         OrderWorkflow.run,
@@ -105,75 +110,101 @@ async def start_order(order: OrderInput, db: Session = Depends(get_db)):
     logger.info(f"[{order_id}] Workflow started")
     return {"workflow_id": order_id}
 
-from fastapi import Body
-from temporalio.client import WorkflowExecutionStatus
-import logging
-
-logger = logging.getLogger(__name__)
-
-@app.post("/update-address", tags=["Workflow"])
-async def update_address(order_id: str = Body(...), new_address: AddressInput = Body(...)):
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "500"))
+# BulkOrderWorkflow starts in flight while the body is still being read
+BULK_START_CONCURRENCY = int(os.getenv("BULK_START_CONCURRENCY", "8"))
+
+async def iter_ndjson_lines(chunks):
+    # Body chunks split at arbitrary bytes; yield (line number, text) for each non-empty line
+    buffer, line_no = b"", 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_no += 1
+            if line.strip():
+                yield line_no, line
+    if buffer.strip():
+        yield line_no + 1, buffer
+
+async def start_orders_from_stream(client, chunks, batch_size: int = BULK_BATCH_SIZE, wait: bool = True) -> dict:
+    limit = asyncio.Semaphore(BULK_START_CONCURRENCY)
+    starts, rejected = [], []
+    batch: list[dict] = []
+
+    async def start_batch(orders: list[dict]) -> dict:
+        batch_id = f"bulk-{orders[0]['order_id']}"
+        summary = {"workflow_id": batch_id, "orders": len(orders),
+                   "first_order_id": orders[0]["order_id"], "last_order_id": orders[-1]["order_id"]}
+        try:
+            async with limit:
+                handle = await client.start_workflow(
+                    BulkOrderWorkflow.run,
+                    id=batch_id,
+                    task_queue="order-tq",
+                    args=[batch_id, orders],
+                )
+            if wait:
+                # Outside the start limit: the batch's received/validated writes run while later batches start
+                result = await handle.result()
+                summary["skipped_order_ids"] = result["skipped_order_ids"]
+                summary["invalid_order_ids"] = result["invalid_order_ids"]
+        except Exception as e:
+            logger.error(f"[{batch_id}] Bulk start failed: {str(e)}")
+            summary["error"] = str(e)
+        return summary
+
+    async for line_no, line in iter_ndjson_lines(chunks):
+        try:
+            order = OrderInput(**json.loads(line))
+        except (ValueError, TypeError) as e:
+            rejected.append({"line": line_no, "error": str(e)[:200]})
+            continue
+        batch.append({"order_id": await order_ids.next_id(), "address": order.address.model_dump(),
+                      "items": [item.model_dump() for item in order.items]})
+        if len(batch) == batch_size:
+            starts.append(asyncio.create_task(start_batch(batch)))
+            batch = []
+    if batch:
+        starts.append(asyncio.create_task(start_batch(batch)))
+
+    batches = await asyncio.gather(*starts)
+    result = {"orders": sum(b["orders"] for b in batches if "error" not in b), "batches": batches, "rejected": rejected}
+    if wait:
+        # Orders whose id already existed were left alone rather than received again
+        result["skipped_order_ids"] = [order_id for b in batches for order_id in b.get("skipped_order_ids", [])]
+    return result
+
+@app.post("/start-orders/bulk", tags=["Workflow"])
+async def start_orders_bulk(request: Request, wait: bool = True):
+    # NDJSON body, one start-order payload per line; received and validated are written per batch.
+    # wait=false returns once every batch is started, without the skipped/invalid order ids.
     client = require_temporal()
-    handle = client.get_workflow_handle(order_id)
+    result = await start_orders_from_stream(client, request.stream(), wait=wait)
+    logger.info(f"[bulk] {result['orders']} orders in {len(result['batches'])} batches, {len(result['rejected'])} lines rejected")
+    return result
 
-    # Check if workflow exists
-    try:
-        desc = await handle.describe()
-    except Exception:
-        logger.info(f"[{order_id}] Address update rejected — workflow not found")
-        return {"status": f"[{order_id}] Address update rejected, order workflow completed or doesn't exist"}
-
-    # If workflow exists but is finished
-    if desc.status in [
-        WorkflowExecutionStatus.COMPLETED,
-        WorkflowExecutionStatus.FAILED,
-        WorkflowExecutionStatus.TIMED_OUT,
-        WorkflowExecutionStatus.TERMINATED,
-    ]:
-        logger.info(f"[{order_id}] Address update rejected — workflow already finished")
-        return {"status": f"[{order_id}] Address update rejected, order workflow completed or doesn't exist"}
-
-    # Try sending signal
+async def execute_order_update(order_id: str, update, *args) -> dict:
+    # One round trip: the validator rejects by stage, otherwise the handler's outcome comes back
+    client = require_temporal()
     try:
-        await handle.signal("update_address", new_address.dict())
-        logger.info(f"[{order_id}] Address update signal sent")
-        return {"status": f"[{order_id}] Address update signal sent"}
-    except Exception as e:
-        logger.warning(f"[{order_id}] Address update failed: {str(e)}")
-        return {"status": f"[{order_id}] Address update rejected, order workflow completed or doesn't exist"}
+        return await client.get_workflow_handle(order_id).execute_update(update, *args)
+    except WorkflowUpdateFailedError as e:
+        reason = getattr(e.cause, "message", None) or str(e.cause)
+        logger.info(f"[{order_id}] {update.__name__} rejected — {reason}")
+        return {"applied": False, "status": f"[{order_id}] {reason}"}
+    except RPCError as e:
+        logger.info(f"[{order_id}] {update.__name__} rejected — {e.message}")
+        return {"applied": False, "status": f"[{order_id}] Rejected, order workflow completed or doesn't exist"}
 
+@app.post("/update-address", tags=["Workflow"])
+async def update_address(order_id: str = Body(...), new_address: AddressInput = Body(...)):
+    return await execute_order_update(order_id, OrderWorkflow.change_address, new_address.model_dump())
 
 
 @app.post("/cancel-order", tags=["Workflow"])
 async def cancel_order(order_id: str = Body(...)):
-    client = require_temporal()
-    handle = client.get_workflow_handle(order_id)
-
-    # Check if workflow exists
-    try:
-        desc = await handle.describe()
-    except Exception:
-        logger.info(f"[{order_id}] Cancel rejected — workflow not found")
-        return {"status": f"[{order_id}] Cancel rejected, order workflow completed or doesn't exist"}
-
-    # If workflow exists but is finished
-    if desc.status in [
-        WorkflowExecutionStatus.COMPLETED,
-        WorkflowExecutionStatus.FAILED,
-        WorkflowExecutionStatus.TIMED_OUT,
-        WorkflowExecutionStatus.TERMINATED,
-    ]:
-        logger.info(f"[{order_id}] Cancel rejected — workflow already finished")
-        return {"status": f"[{order_id}] Cancel rejected, order workflow completed or doesn't exist"}
-
-    # Try sending cancel signal
-    try:
-        await handle.signal("cancel")
-        logger.info(f"[{order_id}] Cancel signal sent")
-        return {"status": f"[{order_id}] Cancel signal sent"}
-    except Exception as e:
-        logger.warning(f"[{order_id}] Cancel failed: {str(e)}")
-        return {"status": f"[{order_id}] Cancel rejected, order workflow completed or doesn't exist"}
+    return await execute_order_update(order_id, OrderWorkflow.cancel_order)
 
 
 
@@ -188,39 +219,75 @@ async def start_return(order_id: str):
     )
     return {"return_workflow_id": handle.id}
 
+STAGE_QUERY_TIMEOUT = timedelta(seconds=2)
+STAGE_QUERY_CONCURRENCY = 50
+# Stages only the shipping child reaches. It is started early at "validated" and waits there for the charge,
+# so until it reaches one of these the order's own stage is the current one.
+SHIPPING_CHILD_STAGES = ("package_prepared", "dispatched", "shipped")
+
+async def query_status(client, workflow_id: str, query) -> Optional[dict]:
+    # None when the workflow is closed, unknown or unreachable; the caller falls back to the DB
+    try:
+        return await client.get_workflow_handle(workflow_id).query(
+            query, reject_condition=QueryRejectCondition.NOT_OPEN, rpc_timeout=STAGE_QUERY_TIMEOUT
+        )
+    except (WorkflowQueryRejectedError, WorkflowQueryFailedError, RPCError):
+        return None
+
+async def read_order_stage(order_id: str) -> dict:
+    client = app.state.client
+    status = await query_status(client, order_id, OrderWorkflow.status) if client else None
+    if status:
+        stage = status["stage"]
+        if status.get("shipping_workflow_id"):
+            shipping = await query_status(client, status["shipping_workflow_id"], ShippingWorkflow.status)
+            status["shipping"] = shipping
+            if shipping and shipping["stage"] in SHIPPING_CHILD_STAGES:
+                stage = shipping["stage"]
+        return {**status, "order_id": order_id, "stage": stage, "source": "workflow"}
+
+    result = await activity_get_order_state(order_id)  # closed orders: direct function call
+    return {"order_id": order_id, "stage": result["state"], "source": "db"}
+
 @app.get("/get-order-stage", tags=["Workflow"])
 async def get_stage(order_id: str):
     try:
-        result = await activity_get_order_state(order_id)  # direct function call
-        return {"order_id": order_id, "stage": result["state"]}
+        return await read_order_stage(order_id)
     except Exception as e:
         logger.error(f"[{order_id}] Failed to get stage: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to get stage for order {order_id}")
 
-
-@app.get("/db-dump", tags=["Database"])
-async def db_dump(db: Session = Depends(get_db)):
-    orders = db.query(Order).all()
-    payments = db.query(Payment).all()
-    events = db.query(Event).all()
-
-    def print_table(title, rows, headers):
-        print(f"\n🔹 {title}")
-        print(tabulate(rows, headers=headers, tablefmt="grid"))
-
-    print_table("Events", [
-        [e.id, e.order_id, e.type, str(e.payload_json), e.ts.isoformat()] for e in events
-    ], ["ID", "Order ID", "Type", "Payload", "Timestamp"])
-
-    print_table("Payments", [
-        [p.payment_id, p.order_id, p.status, p.amount, p.created_at.isoformat()] for p in payments
-    ], ["Payment ID", "Order ID", "Status", "Amount", "Created At"])
-
-    print_table("Orders", [
-        [o.id, o.state, str(o.address_json), o.created_at.isoformat(), o.updated_at.isoformat()] for o in orders
-    ], ["Order ID", "State", "Address", "Created At", "Updated At"])
-
-    return {"status": "DB dump printed to terminal"}
+@app.post("/get-order-stages", tags=["Workflow"])
+async def get_stages(order_ids: List[str] = Body(..., embed=True)):
+    limit = asyncio.Semaphore(STAGE_QUERY_CONCURRENCY)
+
+    async def read(order_id: str) -> dict:
+        async with limit:
+            try:
+                return await read_order_stage(order_id)
+            except Exception as e:
+                logger.error(f"[{order_id}] Failed to get stage: {str(e)}")
+                return {"order_id": order_id, "stage": None, "error": str(e)}
+
+    return {"orders": await asyncio.gather(*[read(order_id) for order_id in order_ids])}
+
+
+@app.get("/export", tags=["Database"])
+async def export_table(
+    table: Literal["orders", "payments", "events"],
+    format: Literal["ndjson", "csv"] = "ndjson",
+    order_id_from: Optional[str] = None,
+    order_id_to: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    page_size: int = Query(EXPORT_PAGE_SIZE, ge=1, le=10000),
+):
+    # Streams page by page off a keyset cursor, so memory stays flat at any table size
+    exporter, media_type = EXPORT_FORMATS[format]
+    rows = exporter(table, order_id_from=order_id_from, order_id_to=order_id_to,
+                    since=since, until=until, page_size=page_size)
+    return StreamingResponse(rows, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{table}.{format}"'})
 
 @app.post("/test-cancel-order", tags=["Test"])
 async def test_cancel_order():
@@ -263,6 +330,21 @@ async def delayed_signal_update(handle, new_address: dict, delay: int):
     await asyncio.sleep(delay)
     await handle.signal(OrderWorkflow.update_address, new_address)
 
+@app.get("/hedge-budget", tags=["System"])
+async def hedge_budget_status():
+    workers = read_hedge_status()
+    return {
+        "workers": workers,
+        "primary_calls": sum(w["budget"]["primary_calls"] for w in workers),
+        "extra_hedges": sum(w["budget"]["extra_hedges"] for w in workers),
+        "denied_hedges": sum(w["budget"]["denied_hedges"] for w in workers),
+    }
+
+@app.get("/worker-stats", tags=["System"])
+async def worker_stats():
+    # Full per-worker snapshots: hedge budget, per-stub hedges, event sink batching, order cache
+    return {"workers": read_hedge_status(), "api": {"order_cache": order_cache.stats()}}
+
 @app.get("/", tags=["System"])
 async def root():
     return {"status": "ok"}
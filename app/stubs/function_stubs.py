@@ -1,8 +1,8 @@
 import logging
 import asyncio
-from typing import Dict, Any
+from typing import Dict, Any, List
 from ..db.models import Order, Payment, Event
-from ..db.session import SessionLocal
+from ..db.event_sink import event_sink
 
 logging.basicConfig(
     level=logging.INFO,
@@ -13,6 +13,9 @@ logging.getLogger("temporalio.activity").setLevel(logging.ERROR)
 logging.getLogger("temporalio.worker._workflow_instance").setLevel(logging.ERROR)
 logger = logging.getLogger("stub")
 
+# States only the shipping stages write, all later than "charged"
+SHIPPING_STATES = ("package_prepared", "dispatched", "shipped")
+
 
 
 async def flaky_call() -> None:
@@ -27,10 +30,11 @@ async def flaky_call() -> None:
 
 import asyncio
 from typing import Dict, Any
-from app.activities.hedge_state import hedge_id_map, elect_hedge_winner
+from app.activities.hedge_state import claim_election, current_hedge_id, elect_hedge_winner, hedge_policy
 
+@hedge_policy(max_hedges=7, percentile=95)
 async def order_received(order_id: str) -> Dict[str, Any]:
-    hedge_id = hedge_id_map.get(asyncio.current_task())
+    hedge_id = current_hedge_id()
     try:
         
         await flaky_call()
@@ -38,10 +42,11 @@ async def order_received(order_id: str) -> Dict[str, Any]:
             return {"order_id": order_id, "items": []}
 
         from datetime import datetime
-        with SessionLocal() as db:
-            existing = db.query(Order).filter(Order.id == order_id).first()
-            if existing:
-                raise ValueError("Order already exists")
+
+        async def transition(db):
+            won, result = await claim_election(db, order_id, "order_received", {"order_id": order_id, "items": [{"sku": "ABC", "qty": 1}]})
+            if not won:
+                return result
 
             new_order = Order(
                 id=order_id,
@@ -57,10 +62,12 @@ async def order_received(order_id: str) -> Dict[str, Any]:
                 payload_json={"address": new_order.address_json},
                 ts=datetime.utcnow()
             ))
-            db.commit()
+            return result
+
+        result = await event_sink.submit(transition)
 
         logger.info(f"[Stub] order_received hedge {hedge_id} succeeded for {order_id}")
-        return {"order_id": order_id, "items": [{"sku": "ABC", "qty": 1}]}
+        return result
     except asyncio.CancelledError:
         logger.info(f"[Hedge] hedge {hedge_id} canceled during execution for order {order_id}")
         raise
@@ -69,8 +76,9 @@ async def order_received(order_id: str) -> Dict[str, Any]:
         raise
 
 
+@hedge_policy(max_hedges=7, percentile=90)
 async def order_validated(order: Dict[str, Any]) -> bool:
-    hedge_id = hedge_id_map.get(asyncio.current_task())
+    hedge_id = current_hedge_id()
     try:
         logger.info(f"[Stub] order_validated hedge {hedge_id}: flaky_call starting")
         await flaky_call()
@@ -79,12 +87,20 @@ async def order_validated(order: Dict[str, Any]) -> bool:
         if not await elect_hedge_winner(hedge_id, order["order_id"], logger):
             return False
 
+        if not order.get("items"):
+            raise ValueError("No items to validate")
+
         from datetime import datetime
-        with SessionLocal() as db:
-            db_order = db.query(Order).filter(Order.id == order["order_id"]).first()
+
+        async def transition(db):
+            db_order = await db.get(Order, order["order_id"])
             if not db_order:
                 raise ValueError("Order not found")
 
+            won, result = await claim_election(db, order["order_id"], "order_validated", True)
+            if not won:
+                return result
+
             db_order.state = "validated"
             db_order.updated_at = datetime.utcnow()
             db.add(Event(
@@ -93,13 +109,12 @@ async def order_validated(order: Dict[str, Any]) -> bool:
                 payload_json={"items": order.get("items", [])},
                 ts=datetime.utcnow()
             ))
-            db.commit()
+            return result
 
-        if not order.get("items"):
-            raise ValueError("No items to validate")
+        result = await event_sink.submit(transition)
 
         logger.info(f"[Stub] order_validated hedge {hedge_id} succeeded: {order['order_id']}")
-        return True
+        return result
     except asyncio.CancelledError:
         logger.info(f"[Hedge] hedge {hedge_id} canceled during execution for order {order['order_id']}")
         raise
@@ -108,8 +123,112 @@ async def order_validated(order: Dict[str, Any]) -> bool:
         raise
 
 
-async def payment_charged(order: Dict[str, Any], payment_id: str, db) -> Dict[str, Any]:
-    hedge_id = hedge_id_map.get(asyncio.current_task())
+async def load_orders(db, order_ids: List[str]) -> Dict[str, Order]:
+    from sqlalchemy import select
+    return {o.id: o for o in (await db.execute(select(Order).where(Order.id.in_(order_ids)))).scalars()}
+
+
+def add_received_orders(db, orders: List[Dict[str, Any]]) -> None:
+    from datetime import datetime
+    now = datetime.utcnow()
+    for order in orders:
+        db.add(Order(id=order["order_id"], state="received", address_json=order["address"], created_at=now, updated_at=now))
+        db.add(Event(
+            order_id=order["order_id"],
+            type="ORDER_RECEIVED",
+            payload_json={"address": order["address"], "items": order["items"]},
+            ts=now
+        ))
+
+
+def split_valid_orders(orders: List[Dict[str, Any]], db_orders: Dict[str, Order]) -> Dict[str, List[str]]:
+    result = {"validated": [], "invalid": []}
+    for order in orders:
+        if order["order_id"] in db_orders:
+            result["validated" if order.get("items") else "invalid"].append(order["order_id"])
+    return result
+
+
+def apply_validation(db, orders: List[Dict[str, Any]], db_orders: Dict[str, Order], result: Dict[str, List[str]]) -> None:
+    # Orders without items can't go on, so they are canceled here instead of failing the batch
+    from datetime import datetime
+    now = datetime.utcnow()
+    items = {order["order_id"]: order.get("items", []) for order in orders}
+    for order_id in result["validated"]:
+        db_orders[order_id].state = "validated"
+        db_orders[order_id].updated_at = now
+        db.add(Event(order_id=order_id, type="ORDER_VALIDATED", payload_json={"items": items[order_id]}, ts=now))
+    for order_id in result["invalid"]:
+        db_orders[order_id].state = "canceled"
+        db_orders[order_id].updated_at = now
+        db.add(Event(order_id=order_id, type="ORDER_INVALID", payload_json={"reason": "No items to validate"}, ts=now))
+
+
+@hedge_policy(max_hedges=7, percentile=95)
+async def orders_received(batch_id: str, orders: List[Dict[str, Any]]) -> List[str]:
+    # One flaky call, one election (keyed by the batch id) and one transaction for the whole batch
+    hedge_id = current_hedge_id()
+    try:
+        await flaky_call()
+        if not await elect_hedge_winner(hedge_id, batch_id, logger):
+            return []
+
+        async def transition(db):
+            existing = await load_orders(db, [order["order_id"] for order in orders])
+            fresh = [order for order in orders if order["order_id"] not in existing]
+            if existing:
+                # Left as they are; the workflow reports them back as skipped
+                logger.warning(f"[Stub] orders_received {batch_id}: {len(existing)} orders already exist, skipped {sorted(existing)}")
+            won, result = await claim_election(db, batch_id, "orders_received", [order["order_id"] for order in fresh])
+            if not won:
+                return result
+            add_received_orders(db, fresh)
+            return result
+
+        result = await event_sink.submit(transition)
+
+        logger.info(f"[Stub] orders_received hedge {hedge_id} succeeded for {batch_id}: {len(result)} orders")
+        return result
+    except asyncio.CancelledError:
+        logger.info(f"[Hedge] hedge {hedge_id} canceled during execution for batch {batch_id}")
+        raise
+    except Exception as e:
+        logger.error(f"[Stub] orders_received hedge {hedge_id} error: {batch_id} — {str(e)}")
+        raise
+
+
+@hedge_policy(max_hedges=7, percentile=90)
+async def orders_validated(batch_id: str, orders: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+    hedge_id = current_hedge_id()
+    try:
+        await flaky_call()
+        if not await elect_hedge_winner(hedge_id, batch_id, logger):
+            return {"validated": [], "invalid": []}
+
+        async def transition(db):
+            db_orders = await load_orders(db, [order["order_id"] for order in orders])
+            won, result = await claim_election(db, batch_id, "orders_validated", split_valid_orders(orders, db_orders))
+            if not won:
+                return result
+            apply_validation(db, orders, db_orders, result)
+            return result
+
+        result = await event_sink.submit(transition)
+
+        logger.info(f"[Stub] orders_validated hedge {hedge_id} succeeded for {batch_id}: "
+                    f"{len(result['validated'])} valid, {len(result['invalid'])} invalid")
+        return result
+    except asyncio.CancelledError:
+        logger.info(f"[Hedge] hedge {hedge_id} canceled during execution for batch {batch_id}")
+        raise
+    except Exception as e:
+        logger.error(f"[Stub] orders_validated hedge {hedge_id} error: {batch_id} — {str(e)}")
+        raise
+
+
+@hedge_policy(max_hedges=7, percentile=95)
+async def payment_charged(order: Dict[str, Any], payment_id: str) -> Dict[str, Any]:
+    hedge_id = current_hedge_id()
     try:
         logger.info(f"[Stub] payment_charged hedge {hedge_id}: flaky_call starting")
         await flaky_call()
@@ -120,35 +239,40 @@ async def payment_charged(order: Dict[str, Any], payment_id: str, db) -> Dict[st
 
         from datetime import datetime
         import random
-        existing_payments = db.query(Payment).filter(Payment.order_id == order["order_id"]).all()
-        if existing_payments:
-            raise ValueError("Payment already exists")
-
         amount = random.randint(1, 9999)
-        new_payment = Payment(
-            payment_id=payment_id,
-            order_id=order["order_id"],
-            status="SUCCESSFUL",
-            amount=amount,
-            created_at=datetime.utcnow()
-        )
-        db.add(new_payment)
-
-        db_order = db.query(Order).filter(Order.id == order["order_id"]).first()
-        if db_order:
-            db_order.state = "charged"
-            db_order.updated_at = datetime.utcnow()
 
-        db.add(Event(
-            order_id=order["order_id"],
-            type="PAYMENT_CHARGED",
-            payload_json={"payment_id": payment_id, "amount": amount},
-            ts=datetime.utcnow()
-        ))
-        db.commit()
+        async def transition(db):
+            won, result = await claim_election(db, order["order_id"], "payment_charged", {"status": "charged", "amount": amount})
+            if not won:
+                return result
+
+            new_payment = Payment(
+                payment_id=payment_id,
+                order_id=order["order_id"],
+                status="SUCCESSFUL",
+                amount=amount,
+                created_at=datetime.utcnow()
+            )
+            db.add(new_payment)
+
+            db_order = await db.get(Order, order["order_id"])
+            # Shipping starts with the charge, so packing may already have moved the order on; never move it back
+            if db_order and db_order.state not in SHIPPING_STATES:
+                db_order.state = "charged"
+                db_order.updated_at = datetime.utcnow()
+
+            db.add(Event(
+                order_id=order["order_id"],
+                type="PAYMENT_CHARGED",
+                payload_json={"payment_id": payment_id, "amount": amount},
+                ts=datetime.utcnow()
+            ))
+            return result
+
+        result = await event_sink.submit(transition)
 
         logger.info(f"[Stub] payment_charged hedge {hedge_id} succeeded: {order['order_id']} — ${amount}")
-        return {"status": "charged", "amount": amount}
+        return result
     except asyncio.CancelledError:
         logger.info(f"[Hedge] hedge {hedge_id} canceled during execution for order {order['order_id']}")
         raise
@@ -156,8 +280,9 @@ async def payment_charged(order: Dict[str, Any], payment_id: str, db) -> Dict[st
         logger.error(f"[Stub] payment_charged hedge {hedge_id} error: {order['order_id']} — {str(e)}")
         raise
 
+@hedge_policy(max_hedges=7, percentile=90)
 async def order_shipped(order: Dict[str, Any]) -> str:
-    hedge_id = hedge_id_map.get(asyncio.current_task())
+    hedge_id = current_hedge_id()
     try:
         logger.info(f"[Stub] order_shipped hedge {hedge_id}: flaky_call starting")
         await flaky_call()
@@ -168,11 +293,16 @@ async def order_shipped(order: Dict[str, Any]) -> str:
             return ""  
 
         from datetime import datetime
-        with SessionLocal() as db:
-            db_order = db.query(Order).filter(Order.id == order["order_id"]).first()
+
+        async def transition(db):
+            db_order = await db.get(Order, order["order_id"])
             if not db_order:
                 raise ValueError("Order not found")
 
+            won, result = await claim_election(db, order["order_id"], "order_shipped", "Shipped")
+            if not won:
+                return result
+
             db_order.state = "shipped"
             db_order.updated_at = datetime.utcnow()
             db.add(Event(
@@ -181,10 +311,12 @@ async def order_shipped(order: Dict[str, Any]) -> str:
                 payload_json={},
                 ts=datetime.utcnow()
             ))
-            db.commit()
+            return result
+
+        result = await event_sink.submit(transition)
 
         logger.info(f"[Stub] order_shipped hedge {hedge_id} succeeded: {order['order_id']}")
-        return "Shipped"
+        return result
     except asyncio.CancelledError:
         logger.info(f"[Hedge] hedge {hedge_id} canceled during execution for order {order['order_id']}")
         raise
@@ -193,8 +325,9 @@ async def order_shipped(order: Dict[str, Any]) -> str:
         raise
 
 
+@hedge_policy(max_hedges=7, percentile=90)
 async def package_prepared(order: Dict[str, Any]) -> str:
-    hedge_id = hedge_id_map.get(asyncio.current_task())
+    hedge_id = current_hedge_id()
     try:
         logger.info(f"[Stub] package_prepared hedge {hedge_id}: flaky_call starting")
         await flaky_call()
@@ -204,11 +337,16 @@ async def package_prepared(order: Dict[str, Any]) -> str:
             return ""  
 
         from datetime import datetime
-        with SessionLocal() as db:
-            db_order = db.query(Order).filter(Order.id == order["order_id"]).first()
+
+        async def transition(db):
+            db_order = await db.get(Order, order["order_id"])
             if not db_order:
                 raise ValueError("Order not found")
 
+            won, result = await claim_election(db, order["order_id"], "package_prepared", "Package ready")
+            if not won:
+                return result
+
             db_order.state = "package_prepared"
             db_order.updated_at = datetime.utcnow()
             db.add(Event(
@@ -217,10 +355,12 @@ async def package_prepared(order: Dict[str, Any]) -> str:
                 payload_json={},
                 ts=datetime.utcnow()
             ))
-            db.commit()
+            return result
+
+        result = await event_sink.submit(transition)
 
         logger.info(f"[Stub] package_prepared hedge {hedge_id} succeeded: {order['order_id']}")
-        return "Package ready"
+        return result
     except asyncio.CancelledError:
         logger.info(f"[Hedge] hedge {hedge_id} canceled during execution for order {order['order_id']}")
         raise
@@ -229,8 +369,9 @@ async def package_prepared(order: Dict[str, Any]) -> str:
         raise
 
 
+@hedge_policy(max_hedges=7, percentile=90)
 async def carrier_dispatched(order: Dict[str, Any]) -> str:
-    hedge_id = hedge_id_map.get(asyncio.current_task())
+    hedge_id = current_hedge_id()
     try:
         logger.info(f"[Stub] carrier_dispatched hedge {hedge_id}: flaky_call starting")
         await flaky_call()
@@ -240,11 +381,16 @@ async def carrier_dispatched(order: Dict[str, Any]) -> str:
             return ""  
 
         from datetime import datetime
-        with SessionLocal() as db:
-            db_order = db.query(Order).filter(Order.id == order["order_id"]).first()
+
+        async def transition(db):
+            db_order = await db.get(Order, order["order_id"])
             if not db_order:
                 raise ValueError("Order not found")
 
+            won, result = await claim_election(db, order["order_id"], "carrier_dispatched", "Dispatched")
+            if not won:
+                return result
+
             db_order.state = "dispatched"
             db_order.updated_at = datetime.utcnow()
             db.add(Event(
@@ -253,10 +399,12 @@ async def carrier_dispatched(order: Dict[str, Any]) -> str:
                 payload_json={},
                 ts=datetime.utcnow()
             ))
-            db.commit()
+            return result
+
+        result = await event_sink.submit(transition)
 
         logger.info(f"[Stub] carrier_dispatched hedge {hedge_id} succeeded: {order['order_id']}")
-        return "Dispatched"
+        return result
     except asyncio.CancelledError:
         logger.info(f"[Hedge] hedge {hedge_id} canceled during execution for order {order['order_id']}")
         raise
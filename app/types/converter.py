@@ -0,0 +1,144 @@
+"""
+Temporal data converter for the order workflows.
+
+Payloads are encoded with msgpack instead of JSON: same values in, same
+values out (dataclasses go over as dicts and are rebuilt from type hints,
+exactly as with the default JSON converter), in fewer bytes and less CPU.
+A codec then compresses any payload larger than PAYLOAD_COMPRESS_MIN_BYTES.
+
+Payloads are decoded by their encoding metadata, so histories written with
+plain JSON still replay. PAYLOAD_ENCODING=json or PAYLOAD_COMPRESSION=none
+turns either part off for new payloads while still reading old ones.
+Clients and workers must use data_converter(); workers take it from their
+client.
+"""
+import collections.abc
+import dataclasses
+import os
+import uuid
+import zlib
+from datetime import datetime
+from typing import Any, Sequence
+
+import msgpack
+from temporalio.api.common.v1 import Payload
+from temporalio.converter import (
+    CompositePayloadConverter,
+    DataConverter,
+    DefaultPayloadConverter,
+    EncodingPayloadConverter,
+    JSONPlainPayloadConverter,
+    PayloadCodec,
+    value_to_type,
+)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# "msgpack" or "json" (the SDK default)
+PAYLOAD_ENCODING = os.getenv("PAYLOAD_ENCODING", "msgpack")
+# "zlib", "zstd" (needs the zstandard package) or "none"
+PAYLOAD_COMPRESSION = os.getenv("PAYLOAD_COMPRESSION", "zlib")
+# Payloads smaller than this are sent as they are; compression doesn't pay for itself on a few hundred bytes
+PAYLOAD_COMPRESS_MIN_BYTES = int(os.getenv("PAYLOAD_COMPRESS_MIN_BYTES", "1024"))
+PAYLOAD_ZLIB_LEVEL = int(os.getenv("PAYLOAD_ZLIB_LEVEL", "6"))
+
+
+def _to_msgpack(value: Any) -> Any:
+    # The types AdvancedJSONEncoder handles, converted the same way
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, collections.abc.Iterable):
+        return list(value)
+    raise TypeError(f"can't encode {type(value).__name__} as msgpack")
+
+
+class MsgpackPayloadConverter(EncodingPayloadConverter):
+    encoding = "binary/msgpack"
+
+    def to_payload(self, value: Any) -> Payload | None:
+        try:
+            data = msgpack.packb(value, default=_to_msgpack, use_bin_type=True)
+        except TypeError:
+            return None  # left to the JSON converter after this one
+        return Payload(metadata={"encoding": self.encoding.encode()}, data=data)
+
+    def from_payload(self, payload: Payload, type_hint: type | None = None) -> Any:
+        try:
+            value = msgpack.unpackb(payload.data, raw=False, strict_map_key=False)
+        except (ValueError, msgpack.UnpackException) as err:
+            raise RuntimeError("Failed parsing") from err
+        if type_hint:
+            value = value_to_type(type_hint, value)
+        return value
+
+
+class OrderPayloadConverter(CompositePayloadConverter):
+    """
+    The SDK's default converters plus msgpack. Encoding tries them in order, so msgpack goes ahead of JSON,
+    which is kept as the fallback and to read JSON payloads. With PAYLOAD_ENCODING=json it goes last, where
+    it only ever decodes.
+    """
+
+    def __init__(self) -> None:
+        converters = list(DefaultPayloadConverter.default_encoding_payload_converters)
+        json_at = next(i for i, c in enumerate(converters) if isinstance(c, JSONPlainPayloadConverter))
+        converters.insert(json_at if PAYLOAD_ENCODING == "msgpack" else len(converters), MsgpackPayloadConverter())
+        super().__init__(*converters)
+
+
+class CompressionCodec(PayloadCodec):
+    """Compresses each payload above a size threshold; smaller ones and unknown encodings pass through."""
+
+    def __init__(self, compression: str | None = None, min_bytes: int | None = None):
+        compression = compression or PAYLOAD_COMPRESSION
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("PAYLOAD_COMPRESSION=zstd needs the zstandard package")
+        if compression not in ("zlib", "zstd", "none"):
+            raise ValueError(f"unknown PAYLOAD_COMPRESSION '{compression}', expected zlib, zstd or none")
+        self.compression = compression
+        self.min_bytes = PAYLOAD_COMPRESS_MIN_BYTES if min_bytes is None else min_bytes
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.compression == "zstd":
+            return zstandard.ZstdCompressor().compress(data)
+        return zlib.compress(data, PAYLOAD_ZLIB_LEVEL)
+
+    async def encode(self, payloads: Sequence[Payload]) -> list[Payload]:
+        encoded = []
+        for payload in payloads:
+            if self.compression == "none" or payload.ByteSize() < self.min_bytes:
+                encoded.append(payload)
+                continue
+            data = self._compress(payload.SerializeToString())
+            if len(data) >= payload.ByteSize():
+                encoded.append(payload)
+                continue
+            encoding = f"binary/{self.compression}"
+            encoded.append(Payload(metadata={"encoding": encoding.encode()}, data=data))
+        return encoded
+
+    async def decode(self, payloads: Sequence[Payload]) -> list[Payload]:
+        decoded = []
+        for payload in payloads:
+            encoding = payload.metadata.get("encoding", b"").decode()
+            if encoding == "binary/zlib":
+                decoded.append(Payload.FromString(zlib.decompress(payload.data)))
+            elif encoding == "binary/zstd":
+                if zstandard is None:
+                    raise RuntimeError("received a zstd-compressed payload but the zstandard package is not installed")
+                decoded.append(Payload.FromString(zstandard.ZstdDecompressor().decompress(payload.data)))
+            else:
+                decoded.append(payload)
+        return decoded
+
+
+def data_converter() -> DataConverter:
+    # The codec stays on with compression off, so payloads compressed earlier can still be read
+    return DataConverter(payload_converter_class=OrderPayloadConverter, payload_codec=CompressionCodec())
@@ -0,0 +1,20 @@
+import argparse
+import logging
+from app.workers.supervisor import WORKER_PROCESSES, WorkerSupervisor, parse_process_counts
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m app.workers",
+                                     description="Run order, shipping and returns workers, N processes per task queue")
+    parser.add_argument("--processes", default=WORKER_PROCESSES,
+                        help="per-queue process counts, e.g. order-tq=4,shipping-tq=2 (default: WORKER_PROCESSES, else 1 each)")
+    args = parser.parse_args()
+    try:
+        counts = parse_process_counts(args.processes)
+    except ValueError as e:
+        parser.error(str(e))
+    WorkerSupervisor(counts).run()
@@ -0,0 +1,43 @@
+import importlib
+
+ACTIVITY_MODULE = "app.activities.activities"
+
+# Task queue -> the activities its workers register. Every workflow schedules its activities on
+# its own task queue, or runs them as local activities on its own worker, so each list is exactly
+# what that queue's workflows use and a poller never receives a task its worker can't run.
+QUEUE_ACTIVITIES = {
+    "order-tq": [
+        # OrderWorkflow stages and BulkOrderWorkflow
+        "activity_order_received",
+        "activity_order_validated",
+        "activity_orders_received",
+        "activity_orders_validated",
+        "activity_risk_score",
+        "activity_manual_review",
+        "activity_payment_charged",
+        # SignalManager and verify_stage
+        "activity_cancel_order",
+        "activity_refund_payment",
+        "activity_update_address",
+        "activity_get_order_state",
+    ],
+    "shipping-tq": [
+        "activity_package_prepared",
+        "activity_carrier_dispatched",
+        "activity_order_shipped",
+        "activity_cancel_order",
+        "activity_refund_payment",
+        "activity_update_address",
+        "activity_get_order_state",
+    ],
+    "returns-tq": [
+        "activity_get_order_state",
+        "activity_refund_payment",
+    ],
+}
+
+
+def load_activities(queue: str) -> list:
+    """The queue's activity implementations, imported when its worker is built rather than when it is imported."""
+    module = importlib.import_module(ACTIVITY_MODULE)
+    return [getattr(module, name) for name in QUEUE_ACTIVITIES[queue]]
@@ -8,26 +8,48 @@ logger = logging.getLogger("returns-worker")
 logging.getLogger("temporalio.activity").setLevel(logging.ERROR)
 logging.getLogger("temporalio.worker._workflow_instance").setLevel(logging.ERROR)
 import asyncio
+import contextlib
 from temporalio.client import Client
 from temporalio.worker import Worker
+from app.types.converter import data_converter
+from app.workers.registry import load_activities
+from app.workers.sandbox import workflow_runner
+from app.workers.tuning import tuning_stats, worker_tuning_options
 from app.workflows.return_workflow import ReturnWorkflow
-from app.activities.activities import activity_refund_payment
-from app.activities.activities import activity_get_order_state
+
+WORKER_NAME = "returns-worker"
+TASK_QUEUE = "returns-tq"
+
+def status_extra() -> dict:
+    return {"tuning": tuning_stats}
+
+def build_worker(client: Client, **options) -> Worker:
+    # Shared by main() and the app.workers supervisor; options override Worker settings
+    return Worker(
+        client,
+        task_queue=TASK_QUEUE,
+        workflows=[ReturnWorkflow],
+        activities=load_activities(TASK_QUEUE),
+        # Sandbox passthrough (app/workers/sandbox.py); concurrency, pollers and rate limits from app/workers/tuning.py
+        **{"workflow_runner": workflow_runner(), **worker_tuning_options(TASK_QUEUE), **options},
+    )
 
 async def main():
+    from app.activities.hedge_state import publish_hedge_status
+    status_task = asyncio.create_task(publish_hedge_status(WORKER_NAME, extra=status_extra()))
     try:
         logger.info("Connecting to Temporal...")
-        client = await Client.connect("localhost:7233")
-        worker = Worker(
-            client,
-            task_queue="returns-tq",
-            workflows=[ReturnWorkflow],
-            activities=[activity_refund_payment, activity_get_order_state],
-        )
+        client = await Client.connect("localhost:7233", data_converter=data_converter())
+        worker = build_worker(client)
         logger.info("Returns worker running on task queue: returns-tq")
         await worker.run()
     except Exception as e:
         logger.error(f"Returns worker crashed: {str(e)}")
+    finally:
+        # The status publisher lives exactly as long as the worker
+        status_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await status_task
 
 if __name__ == "__main__":
     asyncio.run(main())
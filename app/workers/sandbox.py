@@ -0,0 +1,23 @@
+from temporalio.worker.workflow_sandbox import SandboxedWorkflowRunner, SandboxRestrictions
+
+# Modules imported once per worker process and shared by every workflow run, instead of being
+# re-imported into each run's sandbox. Only modules whose globals workflow code never mutates
+# belong here; the workflow modules themselves stay sandboxed.
+WORKFLOW_PASSTHROUGH_MODULES = (
+    "app.types",
+    "app.activities.interfaces",
+    "app.activities.execution",
+    "app.activities.risk_features",
+    "app.activities.signals",
+    "app.workflows.stage_graph",
+    "app.workflows.history_guard",
+    # Never imported by workflow code; if an import slips in, load it once rather than per run
+    "sqlalchemy",
+    "numpy",
+)
+
+
+def workflow_runner() -> SandboxedWorkflowRunner:
+    return SandboxedWorkflowRunner(
+        restrictions=SandboxRestrictions.default.with_passthrough_modules(*WORKFLOW_PASSTHROUGH_MODULES)
+    )
@@ -12,51 +12,51 @@ logging.getLogger("temporalio.worker._workflow_instance").setLevel(logging.ERROR
 
 
 import asyncio
+import contextlib
 from temporalio.client import Client
 from temporalio.worker import Worker
+from app.types.converter import data_converter
+from app.workers.registry import load_activities
+from app.workers.sandbox import workflow_runner
+from app.workers.tuning import tuning_stats, worker_tuning_options
 from app.workflows.shipping_workflow import ShippingWorkflow
-from app.activities.activities import (
-    activity_order_received,
-    activity_order_validated,
-    activity_manual_review,
-    activity_payment_charged,
-    activity_order_shipped,
-    activity_package_prepared,
-    activity_carrier_dispatched,
-    activity_cancel_order,
-    activity_refund_payment,
-    activity_update_address,
-    activity_get_order_state,
-)
+
+WORKER_NAME = "shipping-worker"
+TASK_QUEUE = "shipping-tq"
+
+def status_extra() -> dict:
+    # Imported on first use, with the activities, so importing this module stays free of SQLAlchemy
+    from app.db.event_sink import event_sink
+    from app.db.order_cache import order_cache
+    return {"event_sink": event_sink.stats, "order_cache": order_cache.stats, "tuning": tuning_stats}
+
+def build_worker(client: Client, **options) -> Worker:
+    # Shared by main() and the app.workers supervisor; options override Worker settings
+    return Worker(
+        client,
+        task_queue=TASK_QUEUE,
+        workflows=[ShippingWorkflow],
+        activities=load_activities(TASK_QUEUE),
+        # Sandbox passthrough (app/workers/sandbox.py); concurrency, pollers and rate limits from app/workers/tuning.py
+        **{"workflow_runner": workflow_runner(), **worker_tuning_options(TASK_QUEUE), **options},
+    )
 
 async def main():
+    from app.activities.hedge_state import publish_hedge_status
+    status_task = asyncio.create_task(publish_hedge_status(WORKER_NAME, extra=status_extra()))
     try:
         logger.info("Connecting to Temporal...")
-        client = await Client.connect("localhost:7233")
-        worker = Worker(
-            client,
-            task_queue="shipping-tq",
-            workflows=[ShippingWorkflow],
-            activities=[
-                activity_order_received,
-                activity_order_validated,
-                activity_manual_review,
-                activity_payment_charged,
-                activity_order_shipped,
-                activity_package_prepared,
-                activity_carrier_dispatched,
-                activity_cancel_order,
-                activity_refund_payment,
-                activity_update_address,
-                activity_get_order_state,
-            ],
-            max_concurrent_activities=100,
-            max_concurrent_workflow_tasks=10,
-        )
+        client = await Client.connect("localhost:7233", data_converter=data_converter())
+        worker = build_worker(client)
         logger.info("Shipping worker running on task queue: shipping-tq")
         await worker.run()
     except Exception as e:
         logger.error(f"Shipping worker crashed: {str(e)}")
+    finally:
+        # The status publisher lives exactly as long as the worker
+        status_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await status_task
 
 if __name__ == "__main__":
     asyncio.run(main())
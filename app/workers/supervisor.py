@@ -0,0 +1,200 @@
+import asyncio
+import importlib
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from datetime import timedelta
+from multiprocessing.connection import wait
+
+logger = logging.getLogger("worker-supervisor")
+
+TEMPORAL_ADDRESS = os.getenv("TEMPORAL_ADDRESS", "localhost:7233")
+# Worker processes per task queue, e.g. "order-tq=4,shipping-tq=2,returns-tq=1"; queues left out get one
+WORKER_PROCESSES = os.getenv("WORKER_PROCESSES", "")
+# How long a worker may finish in-flight tasks after SIGTERM before they are cancelled
+WORKER_DRAIN_SECONDS = float(os.getenv("WORKER_DRAIN_SECONDS", "30"))
+# A child that crashes is restarted after this delay, doubling per crash in a row up to WORKER_RESTART_MAX_S
+WORKER_RESTART_BACKOFF_S = float(os.getenv("WORKER_RESTART_BACKOFF_S", "1"))
+WORKER_RESTART_MAX_S = float(os.getenv("WORKER_RESTART_MAX_S", "30"))
+# A child that stayed up this long is considered healthy again
+WORKER_STABLE_S = 60.0
+WORKER_START_METHOD = os.getenv("WORKER_START_METHOD", "fork")
+
+# Task queue -> module exposing WORKER_NAME, status_extra() and build_worker(client, **options)
+WORKER_MODULES = {
+    "order-tq": "app.workers.order_worker",
+    "shipping-tq": "app.workers.shipping_worker",
+    "returns-tq": "app.workers.returns_worker",
+}
+
+
+def parse_process_counts(spec: str, queues=WORKER_MODULES) -> dict[str, int]:
+    counts = {queue: 1 for queue in queues}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        queue, _, n = part.partition("=")
+        queue = queue.strip()
+        if queue not in queues:
+            raise ValueError(f"unknown task queue '{queue}', expected one of {sorted(queues)}")
+        if not n.strip().isdigit():
+            raise ValueError(f"process count for '{queue}' must be a non-negative integer, got '{n}'")
+        counts[queue] = int(n)
+    return counts
+
+
+async def serve(module_path: str, index: int, parent_pid: int, drain_seconds: float) -> None:
+    """One worker process: a single Temporal client shared by the queue's worker and its status publisher."""
+    from temporalio.client import Client
+    from app.types.converter import data_converter
+    from app.activities.hedge_state import publish_hedge_status
+
+    module = importlib.import_module(module_path)
+    stop = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+
+    async def watch_parent():
+        # Exit rather than linger as an orphan if the supervisor is killed outright
+        while os.getppid() == parent_pid:
+            await asyncio.sleep(1.0)
+        stop.set()
+
+    client = await Client.connect(TEMPORAL_ADDRESS, data_converter=data_converter())
+    worker = module.build_worker(client, graceful_shutdown_timeout=timedelta(seconds=drain_seconds))
+    name = f"{module.WORKER_NAME}-{index}"
+    background = [asyncio.create_task(watch_parent())]
+    extra = module.status_extra()
+    if extra is not None:
+        background.append(asyncio.create_task(publish_hedge_status(name, extra=extra)))
+
+    running = asyncio.create_task(worker.run())
+    logger.info(f"[Supervisor] {name} (pid {os.getpid()}) running on task queue: {worker.task_queue}")
+    stopping = asyncio.create_task(stop.wait())
+    await asyncio.wait([running, stopping], return_when=asyncio.FIRST_COMPLETED)
+    if running.done():
+        stopping.cancel()
+        running.result()  # a worker that stops on its own is a crash; let the supervisor restart it
+        raise RuntimeError(f"{name} stopped without being asked to")
+
+    logger.info(f"[Supervisor] {name} draining (up to {drain_seconds}s)")
+    await worker.shutdown()
+    await running
+    for task in background:
+        task.cancel()
+    logger.info(f"[Supervisor] {name} drained")
+
+
+def run_worker_process(module_path: str, index: int, parent_pid: int, drain_seconds: float) -> None:
+    asyncio.run(serve(module_path, index, parent_pid, drain_seconds))
+
+
+def _child_main(target, module_path: str, index: int, parent_pid: int, drain_seconds: float) -> None:
+    # Ctrl-C reaches the whole process group; only the supervisor reacts, then drains the children with SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    target(module_path, index, parent_pid, drain_seconds)
+
+
+class _Slot:
+    def __init__(self, queue: str, index: int):
+        self.queue = queue
+        self.index = index
+        self.process = None
+        self.started_at = 0.0
+        self.crashes = 0
+        self.restart_at: float | None = None
+
+
+class WorkerSupervisor:
+    """
+    Keeps N worker processes running per task queue.
+    Crashed children are restarted with backoff; stop() sends SIGTERM so each
+    worker finishes its in-flight tasks before exiting.
+    """
+
+    def __init__(self, processes: dict[str, int], modules: dict[str, str] = WORKER_MODULES,
+                 target=run_worker_process, drain_seconds: float = WORKER_DRAIN_SECONDS,
+                 restart_backoff: float = WORKER_RESTART_BACKOFF_S, restart_max: float = WORKER_RESTART_MAX_S,
+                 start_method: str = WORKER_START_METHOD):
+        self.modules = modules
+        self.target = target
+        self.drain_seconds = drain_seconds
+        self.restart_backoff = restart_backoff
+        self.restart_max = restart_max
+        self._context = multiprocessing.get_context(start_method)
+        self._slots = [_Slot(queue, i) for queue, n in processes.items() for i in range(n)]
+        self._stopping = False
+        self.restarts = 0
+
+    def _spawn(self, slot: _Slot) -> None:
+        slot.process = self._context.Process(
+            target=_child_main,
+            args=(self.target, self.modules[slot.queue], slot.index, os.getpid(), self.drain_seconds),
+            name=f"{slot.queue}-{slot.index}",
+        )
+        slot.process.start()
+        slot.started_at = time.monotonic()
+        slot.restart_at = None
+        logger.info(f"[Supervisor] started {slot.process.name} (pid {slot.process.pid})")
+
+    def start(self) -> None:
+        for slot in self._slots:
+            self._spawn(slot)
+
+    def poll(self, timeout: float = 0.5) -> None:
+        """Wait up to `timeout` for a child to exit, then restart any whose backoff has passed."""
+        alive = [slot.process.sentinel for slot in self._slots if slot.process and slot.restart_at is None]
+        if alive:
+            wait(alive, timeout)
+        else:
+            time.sleep(timeout)
+        now = time.monotonic()
+        for slot in self._slots:
+            if self._stopping:
+                return
+            if slot.restart_at is None and not slot.process.is_alive():
+                code = slot.process.exitcode
+                slot.crashes = 1 if now - slot.started_at >= WORKER_STABLE_S else slot.crashes + 1
+                delay = min(self.restart_backoff * 2 ** (slot.crashes - 1), self.restart_max)
+                slot.restart_at = now + delay
+                logger.warning(f"[Supervisor] {slot.process.name} exited with code {code}, restarting in {delay:.1f}s")
+            if slot.restart_at is not None and now >= slot.restart_at:
+                self.restarts += 1
+                self._spawn(slot)
+
+    def stop(self) -> None:
+        self._stopping = True
+        running = [slot.process for slot in self._slots if slot.process and slot.process.is_alive()]
+        logger.info(f"[Supervisor] draining {len(running)} workers")
+        for process in running:
+            process.terminate()
+        deadline = time.monotonic() + self.drain_seconds + 5
+        for process in running:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"[Supervisor] {process.name} did not drain in time, killing it")
+                process.kill()
+                process.join()
+        logger.info("[Supervisor] all workers stopped")
+
+    def status(self) -> list[dict]:
+        return [{
+            "queue": slot.queue,
+            "index": slot.index,
+            "pid": slot.process.pid if slot.process else None,
+            "alive": bool(slot.process and slot.process.is_alive()),
+            "crashes": slot.crashes,
+        } for slot in self._slots]
+
+    def _request_stop(self, signum, frame) -> None:
+        logger.info(f"[Supervisor] received {signal.Signals(signum).name}")
+        self._stopping = True
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        self.start()
+        while not self._stopping:
+            self.poll()
+        self.stop()
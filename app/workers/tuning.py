@@ -0,0 +1,324 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, fields, replace
+from temporalio import activity
+from temporalio.worker import (
+    ActivityInboundInterceptor,
+    CustomSlotSupplier,
+    FixedSizeSlotSupplier,
+    Interceptor,
+    PollerBehaviorSimpleMaximum,
+    SlotPermit,
+    WorkerTuner,
+)
+
+logger = logging.getLogger("worker-tuning")
+
+# Optional JSON file mapping task queue -> settings, e.g. {"order-tq": {"activity_slots": 200}}.
+# <QUEUE>_<SETTING> environment variables (ORDER_TQ_ACTIVITY_SLOTS=200) override it.
+WORKER_TUNING_FILE = os.getenv("WORKER_TUNING_FILE", "")
+
+# Auto-tuner: every TUNER_INTERVAL_S, shrink activity slots when the event loop lags past TUNER_LAG_HIGH_MS,
+# grow them when tasks wait past TUNER_SCHEDULE_TO_START_HIGH_MS while the slots are (nearly) all in use
+TUNER_INTERVAL_S = float(os.getenv("TUNER_INTERVAL_S", "10"))
+TUNER_LAG_HIGH_MS = float(os.getenv("TUNER_LAG_HIGH_MS", "50"))
+TUNER_SCHEDULE_TO_START_HIGH_MS = float(os.getenv("TUNER_SCHEDULE_TO_START_HIGH_MS", "200"))
+TUNER_SATURATION = 0.8
+TUNER_STEP = 0.25
+LOOP_LAG_PROBE_S = 0.1
+
+
+@dataclass(frozen=True)
+class QueueTuning:
+    workflow_slots: int = 100
+    activity_slots: int = 100
+    local_activity_slots: int = 100
+    workflow_pollers: int = 5
+    activity_pollers: int = 5
+    # Per worker process, and across every worker on the queue (enforced by the server)
+    activities_per_second: float | None = None
+    queue_activities_per_second: float | None = None
+    autotune: bool = False
+    min_activity_slots: int = 10
+    max_activity_slots: int = 500
+
+    def worker_options(self, supplier: CustomSlotSupplier | None = None) -> dict:
+        options = {
+            "workflow_task_poller_behavior": PollerBehaviorSimpleMaximum(self.workflow_pollers),
+            "activity_task_poller_behavior": PollerBehaviorSimpleMaximum(self.activity_pollers),
+            "max_activities_per_second": self.activities_per_second,
+            "max_task_queue_activities_per_second": self.queue_activities_per_second,
+        }
+        if supplier is None:
+            options.update(
+                max_concurrent_workflow_tasks=self.workflow_slots,
+                max_concurrent_activities=self.activity_slots,
+                max_concurrent_local_activities=self.local_activity_slots,
+            )
+        else:
+            # A tuner replaces the max_concurrent_* settings; only the activity slots move
+            options["tuner"] = WorkerTuner.create_composite(
+                workflow_supplier=FixedSizeSlotSupplier(self.workflow_slots),
+                activity_supplier=supplier,
+                local_activity_supplier=FixedSizeSlotSupplier(self.local_activity_slots),
+                nexus_supplier=FixedSizeSlotSupplier(1),
+            )
+        return options
+
+
+# What each worker ran with before this file existed
+QUEUE_DEFAULTS = {
+    "order-tq": QueueTuning(),
+    "shipping-tq": QueueTuning(workflow_slots=10),
+    "returns-tq": QueueTuning(),
+}
+
+
+def _parse(name: str, default, raw):
+    try:
+        if isinstance(default, bool):
+            if isinstance(raw, bool):
+                return raw
+            if str(raw).lower() in ("1", "true", "yes", "on"):
+                return True
+            if str(raw).lower() in ("0", "false", "no", "off", ""):
+                return False
+            raise ValueError(raw)
+        if isinstance(default, int):
+            value = int(raw)
+            if value < 1:
+                raise ValueError(raw)
+            return value
+        return None if raw in (None, "") else float(raw)
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid value {raw!r} for {name}") from None
+
+
+def load_tuning(queue: str, env=os.environ, path: str = WORKER_TUNING_FILE) -> QueueTuning:
+    """Defaults for the queue, then its section of WORKER_TUNING_FILE, then <QUEUE>_<SETTING> variables."""
+    tuning = QUEUE_DEFAULTS.get(queue, QueueTuning())
+    names = {f.name for f in fields(QueueTuning)}
+    overrides = {}
+    if path:
+        with open(path) as f:
+            section = json.load(f).get(queue, {})
+        unknown = set(section) - names
+        if unknown:
+            raise ValueError(f"{path}: unknown settings for {queue}: {sorted(unknown)}")
+        overrides.update(section)
+    prefix = queue.upper().replace("-", "_") + "_"
+    for name in names:
+        if prefix + name.upper() in env:
+            overrides[name] = env[prefix + name.upper()]
+    tuning = replace(tuning, **{name: _parse(name, getattr(tuning, name), raw) for name, raw in overrides.items()})
+    if tuning.autotune and not tuning.min_activity_slots <= tuning.activity_slots <= tuning.max_activity_slots:
+        raise ValueError(f"{queue}: activity_slots {tuning.activity_slots} outside "
+                         f"[{tuning.min_activity_slots}, {tuning.max_activity_slots}]")
+    return tuning
+
+
+def pct(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+class AdjustableSlotSupplier(CustomSlotSupplier):
+    """Activity slots with a limit the auto-tuner can move while the worker runs."""
+
+    def __init__(self, limit: int, on_first_reserve=None):
+        self.limit = limit
+        self.reserved = 0
+        self.used = 0
+        self.peak_used = 0
+        self._lock = threading.Lock()
+        self._freed: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._on_first_reserve = on_first_reserve
+
+    def _wake(self) -> None:
+        # The SDK may release slots from outside the loop's thread
+        if self._loop is not None and self._freed is not None:
+            self._loop.call_soon_threadsafe(self._freed.set)
+
+    def _take(self) -> bool:
+        with self._lock:
+            if self.reserved >= self.limit:
+                return False
+            self.reserved += 1
+            return True
+
+    async def reserve_slot(self, ctx) -> SlotPermit:
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            self._freed = asyncio.Event()
+            if self._on_first_reserve:
+                self._on_first_reserve()
+        while not self._take():
+            self._freed.clear()
+            await self._freed.wait()
+        return SlotPermit()
+
+    def try_reserve_slot(self, ctx) -> SlotPermit | None:
+        return SlotPermit() if self._take() else None
+
+    def mark_slot_used(self, ctx) -> None:
+        with self._lock:
+            self.used += 1
+            self.peak_used = max(self.peak_used, self.used)
+
+    def release_slot(self, ctx) -> None:
+        with self._lock:
+            self.reserved -= 1
+            if ctx.slot_info is not None:
+                self.used -= 1
+        self._wake()
+
+    def set_limit(self, limit: int) -> None:
+        with self._lock:
+            self.limit = limit
+        self._wake()
+
+    def take_peak(self) -> int:
+        with self._lock:
+            peak, self.peak_used = self.peak_used, self.used
+        return peak
+
+
+class _ScheduleToStart(ActivityInboundInterceptor):
+    def __init__(self, next, tuner):
+        super().__init__(next)
+        self.tuner = tuner
+
+    async def execute_activity(self, input):
+        info = activity.info()
+        if not info.is_local:
+            self.tuner.observe_schedule_to_start((info.started_time - info.current_attempt_scheduled_time).total_seconds())
+        return await super().execute_activity(input)
+
+
+class SlotAutoTuner(Interceptor):
+    """
+    Moves one queue's activity slot limit from what the worker observes:
+    schedule-to-start latency of its activities (tasks waiting for a free slot)
+    and lag of the event loop they all share (too many running at once).
+    Decisions are taken every `interval` seconds and every one is logged.
+    """
+
+    def __init__(self, queue: str, tuning: QueueTuning, interval: float = TUNER_INTERVAL_S,
+                 lag_high_ms: float = TUNER_LAG_HIGH_MS, schedule_to_start_high_ms: float = TUNER_SCHEDULE_TO_START_HIGH_MS):
+        self.queue = queue
+        self.tuning = tuning
+        self.interval = interval
+        self.lag_high = lag_high_ms / 1000
+        self.schedule_to_start_high = schedule_to_start_high_ms / 1000
+        self.supplier = AdjustableSlotSupplier(tuning.activity_slots, on_first_reserve=self._ensure_started)
+        self._schedule_to_start: list[float] = []
+        self._lags: list[float] = []
+        self.decisions: deque[dict] = deque(maxlen=50)
+        self._task: asyncio.Task | None = None
+
+    def intercept_activity(self, next):
+        return _ScheduleToStart(next, self)
+
+    def observe_schedule_to_start(self, seconds: float) -> None:
+        self._schedule_to_start.append(max(0.0, seconds))
+
+    def observe_loop_lag(self, seconds: float) -> None:
+        self._lags.append(max(0.0, seconds))
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_decision = loop.time() + self.interval
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LOOP_LAG_PROBE_S)
+            now = loop.time()
+            self.observe_loop_lag(now - start - LOOP_LAG_PROBE_S)
+            if now >= next_decision:
+                self.decide()
+                next_decision = now + self.interval
+
+    def decide(self) -> dict:
+        limit = self.supplier.limit
+        peak = self.supplier.take_peak()
+        s2s_p90, lag_p90 = pct(self._schedule_to_start, 0.9), pct(self._lags, 0.9)
+        activities = len(self._schedule_to_start)
+        self._schedule_to_start, self._lags = [], []
+        step = max(1, int(limit * TUNER_STEP))
+
+        new_limit = limit
+        if lag_p90 is not None and lag_p90 > self.lag_high:
+            new_limit = max(self.tuning.min_activity_slots, limit - step)
+            reason = f"loop lag p90 {lag_p90 * 1000:.0f}ms > {self.lag_high * 1000:.0f}ms"
+            if new_limit == limit:
+                reason += ", already at min_activity_slots"
+        elif s2s_p90 is not None and s2s_p90 > self.schedule_to_start_high:
+            reason = f"schedule-to-start p90 {s2s_p90 * 1000:.0f}ms > {self.schedule_to_start_high * 1000:.0f}ms"
+            if peak >= TUNER_SATURATION * limit:
+                new_limit = min(self.tuning.max_activity_slots, limit + step)
+                reason += f" with {peak}/{limit} slots in use"
+                if new_limit == limit:
+                    reason += ", already at max_activity_slots"
+            else:
+                # Tasks are waiting on pollers or the server, not on slots
+                reason += f" but only {peak}/{limit} slots in use"
+        else:
+            reason = "within targets" if activities else "idle"
+
+        decision = {
+            "ts": time.time(),
+            "action": "grow" if new_limit > limit else "shrink" if new_limit < limit else "hold",
+            "from": limit,
+            "to": new_limit,
+            "reason": reason,
+            "activities": activities,
+            "schedule_to_start_p90_ms": round(s2s_p90 * 1000, 1) if s2s_p90 is not None else None,
+            "loop_lag_p90_ms": round(lag_p90 * 1000, 1) if lag_p90 is not None else None,
+            "peak_in_use": peak,
+        }
+        self.decisions.append(decision)
+        if new_limit != limit:
+            self.supplier.set_limit(new_limit)
+        logger.info(f"[Tuner] {self.queue} activity slots {decision['action']} {limit} -> {new_limit}: {reason}")
+        return decision
+
+    def stats(self) -> dict:
+        return {
+            "activity_slots": self.supplier.limit,
+            "in_use": self.supplier.used,
+            "decisions": list(self.decisions)[-10:],
+        }
+
+
+# Task queue -> auto-tuner for the workers built in this process
+slot_tuners: dict[str, SlotAutoTuner] = {}
+_loaded: dict[str, QueueTuning] = {}
+
+
+def worker_tuning_options(queue: str) -> dict:
+    """Worker keyword arguments for the queue's concurrency, pollers and rate limits."""
+    tuning = load_tuning(queue)
+    _loaded[queue] = tuning
+    logger.info(f"[Tuner] {queue} settings: {asdict(tuning)}")
+    if not tuning.autotune:
+        return tuning.worker_options()
+    tuner = slot_tuners[queue] = SlotAutoTuner(queue, tuning)
+    return {**tuning.worker_options(tuner.supplier), "interceptors": [tuner]}
+
+
+def tuning_stats() -> dict:
+    return {
+        queue: {"settings": asdict(tuning), **({"autotune": slot_tuners[queue].stats()} if queue in slot_tuners else {})}
+        for queue, tuning in _loaded.items()
+    }
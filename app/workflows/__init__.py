@@ -1,5 +1,6 @@
+from .bulk_order_workflow import BulkOrderWorkflow
 from .order_workflow import OrderWorkflow
 from .return_workflow import ReturnWorkflow
 from .shipping_workflow import ShippingWorkflow
 
-__all__ = ["OrderWorkflow", "ReturnWorkflow", "ShippingWorkflow"]
+__all__ = ["BulkOrderWorkflow", "OrderWorkflow", "ReturnWorkflow", "ShippingWorkflow"]
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+from datetime import timedelta
+from temporalio import workflow
+from temporalio.common import RetryPolicy
+from temporalio.exceptions import WorkflowAlreadyStartedError
+from app.activities.interfaces import (
+    activity_orders_received,
+    activity_orders_validated,
+)
+from app.workflows.order_workflow import OrderWorkflow
+
+logger = logging.getLogger("bulk-order-workflow")
+
+FAST_RETRY_POLICY = RetryPolicy(
+    initial_interval=timedelta(milliseconds=100),
+    backoff_coefficient=1.0,
+    maximum_interval=timedelta(milliseconds=100),
+    maximum_attempts=300,
+)
+
+# Child starts in flight at once; each is one command in this workflow's history
+CHILD_START_CONCURRENCY = 100
+
+
+@workflow.defn
+class BulkOrderWorkflow:
+    """
+    Receives and validates a batch of orders with one activity each, then starts
+    a per-order OrderWorkflow (workflow id = order id, as for /start-order) that
+    picks up at risk scoring. The children are abandoned, so this workflow
+    completes as soon as they are started and each order lives on in its own history.
+    """
+
+    def __init__(self):
+        self.batch_id: str | None = None
+        self.stage = "started"
+        self.counts = {"orders": 0, "received": 0, "skipped": 0, "validated": 0, "invalid": 0, "started": 0,
+                       "already_started": 0}
+        # Orders whose id was already in the orders table; they are neither received again nor started
+        self.skipped_order_ids: list[str] = []
+
+    @workflow.query
+    def status(self) -> dict:
+        return {"batch_id": self.batch_id, "stage": self.stage, **self.counts, "skipped_order_ids": self.skipped_order_ids}
+
+    async def _start_order(self, order: dict) -> None:
+        try:
+            await workflow.start_child_workflow(
+                OrderWorkflow.run,
+                args=[order["order_id"], order["address"], order["items"], False, True],
+                id=order["order_id"],
+                task_queue="order-tq",
+                parent_close_policy=workflow.ParentClosePolicy.ABANDON,
+            )
+            self.counts["started"] += 1
+        except WorkflowAlreadyStartedError:
+            self.counts["already_started"] += 1
+
+    @workflow.run
+    async def run(self, batch_id: str, orders: list[dict]) -> dict:
+        self.batch_id = batch_id
+        self.counts["orders"] = len(orders)
+
+        received = set(await workflow.execute_activity(
+            activity_orders_received,
+            args=[batch_id, orders],
+            start_to_close_timeout=timedelta(seconds=30),
+            retry_policy=FAST_RETRY_POLICY,
+        ))
+        self.counts["received"] = len(received)
+        self.skipped_order_ids = [order["order_id"] for order in orders if order["order_id"] not in received]
+        self.counts["skipped"] = len(self.skipped_order_ids)
+        self.stage = "received"
+
+        result = await workflow.execute_activity(
+            activity_orders_validated,
+            args=[batch_id, [order for order in orders if order["order_id"] in received]],
+            start_to_close_timeout=timedelta(seconds=30),
+            retry_policy=FAST_RETRY_POLICY,
+        )
+        validated = set(result["validated"])
+        self.counts["validated"] = len(validated)
+        self.counts["invalid"] = len(result["invalid"])
+        self.stage = "validated"
+
+        to_start = [order for order in orders if order["order_id"] in validated]
+        for i in range(0, len(to_start), CHILD_START_CONCURRENCY):
+            await asyncio.gather(*[self._start_order(order) for order in to_start[i:i + CHILD_START_CONCURRENCY]])
+        self.stage = "handed_off"
+
+        logger.info(f"[BulkOrderWorkflow] COMPLETED — {batch_id}: {self.counts}")
+        return {"batch_id": batch_id, **self.counts, "invalid_order_ids": result["invalid"],
+                "skipped_order_ids": self.skipped_order_ids}
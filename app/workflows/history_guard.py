@@ -0,0 +1,30 @@
+import os
+from temporalio import workflow
+
+# Continue-as-new once a run's history passes either limit (or the server suggests it),
+# so a replay after a worker restart stays short however many signals an order gets
+HISTORY_MAX_EVENTS = int(os.getenv("HISTORY_MAX_EVENTS", "2000"))
+HISTORY_MAX_BYTES = int(os.getenv("HISTORY_MAX_BYTES", str(2 * 1024 * 1024)))
+
+
+def history_usage() -> dict:
+    info = workflow.info()
+    return {
+        "events": info.get_current_history_length(),
+        "bytes": info.get_current_history_size(),
+        "suggested": info.is_continue_as_new_suggested(),
+    }
+
+
+def history_limit_reason(max_events: int | None = None, max_bytes: int | None = None) -> str | None:
+    """Why this run should continue-as-new, or None while its history is within limits."""
+    max_events = max_events or HISTORY_MAX_EVENTS
+    max_bytes = max_bytes or HISTORY_MAX_BYTES
+    usage = history_usage()
+    if usage["events"] >= max_events:
+        return f"{usage['events']} events >= {max_events}"
+    if usage["bytes"] >= max_bytes:
+        return f"{usage['bytes']} bytes >= {max_bytes}"
+    if usage["suggested"]:
+        return "suggested by server"
+    return None
@@ -1,26 +1,31 @@
 import logging
+from dataclasses import asdict
 from datetime import datetime, timedelta
 from typing import Optional
 from app.types.order_types import Address, Item, OrderData
 from temporalio import workflow
 from temporalio.common import RetryPolicy
-from app.activities.activities import (
+from temporalio.exceptions import ApplicationError
+from app.activities.interfaces import (
     activity_order_received,
     activity_order_validated,
     activity_manual_review,
     activity_payment_charged,
     activity_get_order_state,
+    activity_risk_score,
 )
 from app.workflows.shipping_workflow import ShippingWorkflow
-from app.activities.signals import SignalManager
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+from app.activities.signals import (
+    SignalManager,
+    ADDRESS_UPDATE_STAGES,
+    CANCEL_AFTER_PAYMENT_STAGES,
+    CANCEL_BEFORE_PAYMENT_STAGES,
 )
-logging.getLogger("temporalio").setLevel(logging.INFO)
-logging.getLogger("temporalio.activity").setLevel(logging.ERROR)
-logging.getLogger("temporalio.worker._workflow_instance").setLevel(logging.ERROR)
+from app.activities.execution import execute_step
+from app.activities.risk_features import order_features
+from app.workflows.stage_graph import Stage, StageGraph
+from app.workflows.history_guard import history_limit_reason
+
 logger = logging.getLogger("order-worker")
 
 FAST_RETRY_POLICY = RetryPolicy(
@@ -37,81 +42,181 @@ class OrderWorkflow:
         self.order: Optional[OrderData] = None
         self._signal_flag = False
         self._signal_result: Optional[str] = None
+        # Last stage this workflow completed; mirrors orders.state without asking the DB
+        self.stage = "started"
+        self.stage_times: dict[str, str] = {}
+        self.verify_stage = False
+        self.risk: Optional[dict] = None
+        self._graph: Optional[StageGraph] = None
+        self._payment_settled: Optional[bool] = None
+        # The shipping child's handle, whether payment_settled has reached it, and whether it was sent a cancel
+        self._shipping = None
+        self._settled_sent = False
+        self._cancel_forwarded = False
+        # Reported by the child's shipping_done signal, which a run that continued as new mid-shipping waits on
+        self._shipping_result: Optional[str] = None
+        self._ingested = False
+        # Earlier runs of this order that continued as new
+        self._runs = 0
+        self._serial: Optional[bool] = None
+
+    def _serial_path(self) -> bool:
+        # Orders started before the stage graph carry no "stage-graph" marker and replay the serial path.
+        # Decided on the first signal or at the start of run, whichever comes first, since signals
+        # delivered with the start are queued before run does anything.
+        if self._serial is None:
+            self._serial = not workflow.patched("stage-graph")
+            self._signals.serial = self._serial
+        return self._serial
 
     @workflow.signal
     async def cancel(self):
+        self._serial_path()
         self._signals.queue_cancel()
         self._signal_flag = True
+        self._wake_for_shipping()
 
     @workflow.signal
     async def update_address(self, new_address: dict):
+        self._serial_path()
         self._signals.queue_update_address(new_address)
         self._signal_flag = True
+        self._wake_for_shipping()
 
-    async def check_signal_result(self) -> Optional[str]:
-        if not self._signal_flag:
-            return None
-        self._signal_flag = False
-
-        try:
-            state_info = await workflow.execute_activity(
-                activity_get_order_state,
-                self.order.order_id,
-                start_to_close_timeout=timedelta(seconds=5),
-                retry_policy=FAST_RETRY_POLICY,
-                task_queue="order-tq"
-            )
-        except Exception as e:
-            logger.error(f"[OrderWorkflow] SIGNAL CHECK FAILED — {self.order.order_id}: {e}")
-            return f"Signal check failed for order {self.order.order_id}"
+    @workflow.signal
+    async def shipping_done(self, result: str):
+        self._shipping_result = result
 
-        if state_info["state"] == "NOT_FOUND":
-            return f"Order {self.order.order_id} not found"
+    # Updates: same effects as the signals, but the caller waits for the outcome.
+    # Validators reject by stage before anything is written to history.
+    @workflow.update
+    async def change_address(self, new_address: dict) -> dict:
+        await workflow.wait_condition(lambda: self.stage != "started")
+        return await self._signals.apply_address_update(self.order, new_address, self._signal_stage())
 
-        return await self._signals.process_signals(self.order, state_info["state"])
+    @change_address.validator
+    def validate_change_address(self, new_address: dict) -> None:
+        stage = self._signal_stage()
+        if self._signals.cancel_pending() or self._signals.cancel_result is not None:
+            raise ApplicationError("Address update rejected, order is being canceled", type="UpdateRejected")
+        if stage != "started" and stage not in ADDRESS_UPDATE_STAGES:
+            raise ApplicationError(f"Address update rejected, order already {stage}", type="UpdateRejected")
 
-    @workflow.run
-    async def run(self, order_id: str, address: dict, items: list) -> str:
-        self.order = OrderData(
-            order_id=order_id,
-            address=Address(**address),
-            items=[Item(**item) for item in items]
+    @workflow.update
+    async def cancel_order(self) -> dict:
+        self._serial_path()
+        handled = self._signals.cancels_processed
+        self._signals.queue_cancel()
+        self._signal_flag = True
+        self._wake_for_shipping()
+        # Handled at the next signal check, once stages in flight have drained
+        await workflow.wait_condition(
+            lambda: self._signals.cancel_handled or self._signals.cancels_processed > handled
         )
-        
-        self._start_time: Optional[datetime] = workflow.now()
+        return self._signals.cancel_outcome(self.order.order_id)
 
-        await workflow.sleep(0.001)
+    @cancel_order.validator
+    def validate_cancel_order(self) -> None:
+        if self._signals.cancel_handled or self._signals.cancel_pending():
+            return  # a retried cancel gets the first one's outcome
+        if self.stage not in ["started", *CANCEL_BEFORE_PAYMENT_STAGES, *CANCEL_AFTER_PAYMENT_STAGES]:
+            raise ApplicationError(f"Cancel rejected, order already {self.stage}", type="UpdateRejected")
 
-        try:
-            await workflow.execute_activity(
-                activity_order_received,
-                args=[self.order],
-                start_to_close_timeout=timedelta(seconds=2),
-                retry_policy=FAST_RETRY_POLICY,
-            )
-        except Exception as e:
-            logger.error(f"[OrderWorkflow] RECEIVED ERROR {order_id} — {e}")
-            raise
+    def advance(self, stage: str) -> None:
+        self.stage = stage
+        self.stage_times[stage] = workflow.now().isoformat()
 
-        if result := await self.check_signal_result():
-            return result
+    def _with_shipping(self) -> bool:
+        # Paid and handed to the shipping child, which owns the order until it returns; the stage stays "charged"
+        return bool(self._payment_settled) and self._graph is not None and self._graph.in_flight("shipping")
 
-        try:
-            await workflow.execute_activity(
-                activity_order_validated,
-                args=[self.order],
-                start_to_close_timeout=timedelta(seconds=2),
-                retry_policy=FAST_RETRY_POLICY,
-            )
-        except Exception as e:
-            logger.error(f"[OrderWorkflow] VALIDATED ERROR {order_id} — {e}")
-            raise
+    def _signal_stage(self) -> str:
+        # The stage signals and Updates are judged against: while the child ships, address changes are
+        # rejected as for a shipping order and cancels are forwarded to it (see _between_stages)
+        return "shipping" if self._with_shipping() else self.stage
 
-        if result := await self.check_signal_result():
-            return result
+    def _wake_for_shipping(self) -> None:
+        # Nothing else wakes the graph while only the child is in flight: a cancel to forward, or a
+        # signal storm pushing history past the limit before the child returns
+        if self._with_shipping() and (self._signals.cancel_pending() or history_limit_reason()):
+            self._graph.wake()
 
-        await workflow.sleep(0.001)
+    @workflow.query
+    def status(self) -> dict:
+        # Served from workflow memory; the API adds the ShippingWorkflow status while shipping
+        return {
+            "order_id": self.order.order_id if self.order else None,
+            "stage": self.stage,
+            "stage_times": self.stage_times,
+            "pending_signals": self._signals.pending(),
+            "signals": self._signals.counts,
+            "risk": self.risk,
+            "shipping_workflow_id": f"shipping-{self.order.order_id}" if self._signal_stage() == "shipping" else None,
+            "critical_path": self._graph.critical_path() if self._graph else {},
+            "continued_as_new": self._runs,
+        }
 
+    async def check_signal_result(self) -> Optional[str]:
+        if not self._signal_flag:
+            return None
+        self._signal_flag = False
+
+        stage = self._signal_stage()
+        if self.verify_stage or self._signals.serial:
+            # Optional consistency check against the DB, which wins on mismatch
+            try:
+                state_info = await execute_step(
+                    activity_get_order_state,
+                    args=[self.order.order_id],
+                    start_to_close_timeout=timedelta(seconds=5),
+                    retry_policy=FAST_RETRY_POLICY,
+                    task_queue="order-tq",
+                    local=not self._signals.serial,
+                )
+            except Exception as e:
+                logger.error(f"[OrderWorkflow] SIGNAL CHECK FAILED — {self.order.order_id}: {e}")
+                return f"Signal check failed for order {self.order.order_id}"
+
+            if state_info["state"] == "NOT_FOUND":
+                return f"Order {self.order.order_id} not found"
+            if state_info["state"] != stage:
+                logger.warning(f"[OrderWorkflow] STAGE MISMATCH — {self.order.order_id}: workflow '{stage}', db '{state_info['state']}'")
+                stage = state_info["state"]
+
+        return await self._signals.process_signals(self.order, stage)
+
+    def _activity_stage(self, activity_fn, label: str, *args):
+        async def run_stage():
+            try:
+                return await workflow.execute_activity(
+                    activity_fn,
+                    args=[self.order, *args],
+                    start_to_close_timeout=timedelta(seconds=2),
+                    retry_policy=FAST_RETRY_POLICY,
+                )
+            except Exception as e:
+                logger.error(f"[OrderWorkflow] {label} ERROR {self.order.order_id} — {e}")
+                raise
+        return run_stage
+
+    async def _already_done(self) -> None:
+        return None
+
+    async def _score_risk(self) -> dict:
+        self.risk = await execute_step(
+            activity_risk_score,
+            args=[order_features(self.order.items, self._signals.address_updates)],
+            start_to_close_timeout=timedelta(seconds=5),
+            retry_policy=FAST_RETRY_POLICY,
+            task_queue="order-tq",
+        )
+        return self.risk
+
+    async def _review(self) -> None:
+        # Only orders the risk scorer flags wait for manual review
+        if not self.risk["review"]:
+            logger.info(f"[OrderWorkflow] REVIEW SKIPPED — {self.order.order_id} (risk {self.risk['score']})")
+            return
         await workflow.execute_activity(
             activity_manual_review,
             args=[self.order],
@@ -119,37 +224,233 @@ class OrderWorkflow:
             retry_policy=FAST_RETRY_POLICY,
         )
 
-        if result := await self.check_signal_result():
-            return result
+    async def _ship(self) -> str:
+        # Started alongside the charge so packing overlaps it; dispatch waits for payment_settled
+        handle = await workflow.start_child_workflow(
+            ShippingWorkflow.run,
+            args=[self.order, self.verify_stage, True],
+            id=f"shipping-{self.order.order_id}",
+            task_queue="shipping-tq",
+            # Keeps shipping if this run continues as new before it returns; see _continue_if_history_large
+            parent_close_policy=workflow.ParentClosePolicy.ABANDON,
+        )
+        self._shipping = handle
+        await workflow.wait_condition(lambda: self._payment_settled is not None)
+        address = self.order.address if self._signals.address_updates else None
+        await handle.signal(ShippingWorkflow.payment_settled, args=[self._payment_settled, address])
+        self._settled_sent = True
+        return await handle
 
-        try:
-            await workflow.execute_activity(
-                activity_payment_charged,
-                args=[self.order, f"payment-{order_id}"],
-                start_to_close_timeout=timedelta(seconds=2),
-                retry_policy=FAST_RETRY_POLICY,
-            )
-        except Exception as e:
-            logger.error(f"[OrderWorkflow] PAYMENT ERROR {order_id} — {e}")
-            raise
+    async def _rejoin_shipping(self) -> str:
+        # The child an earlier run started is still shipping; it reports back by signal instead
+        self._shipping = workflow.get_external_workflow_handle_for(ShippingWorkflow.run, f"shipping-{self.order.order_id}")
+        await workflow.wait_condition(lambda: self._shipping_result is not None)
+        return self._shipping_result
 
-        if result := await self.check_signal_result():
-            return result
+    async def _forward_cancel(self) -> None:
+        self._signals.take_cancel()
+        if self._cancel_forwarded:
+            return  # the child already has one
+        self._cancel_forwarded = True
+        # Signals reach the child in order, so it sees the charge before the cancel
+        await workflow.wait_condition(lambda: self._settled_sent)
+        await self._shipping.signal(ShippingWorkflow.cancel)
+
+    def _stage_done(self, name: str, result) -> None:
+        if name in ("received", "validated"):
+            self.advance(name)
+        elif name == "payment":
+            self.advance("charged")
+            self._signals.add_refund_compensation(self.order)
+        elif name == "shipping":
+            order_id = self.order.order_id
+            if result == f"Shipping complete for order {order_id}":
+                self.advance("shipped")
+            if self._cancel_forwarded:
+                # The child answers a cancel it took with its cancel message; otherwise it had already shipped
+                canceled = isinstance(result, str) and result.startswith(f"Order {order_id} canceled")
+                self._signals.settle_cancel(
+                    result if canceled else {"status": f"[{order_id}] Cancel rejected, order already {self.stage}"}
+                )
+                if canceled:
+                    self.advance("refunded")
+
+    async def _between_stages(self) -> bool:
+        if self._signals.cancel_pending():
+            if self._with_shipping():
+                # Paid and shipping: the child cancels and refunds unless it has already shipped
+                await self._forward_cancel()
+            else:
+                # Void a speculative shipment; the cancel itself is handled once in-flight stages drain
+                if self._payment_settled is None:
+                    self._payment_settled = False
+                return True
+        await self.check_signal_result()
+        if self._graph.done("payment") and self._payment_settled is None:
+            # The order rests at "charged" while the child ships
+            self._payment_settled = True
+        if self._with_shipping():
+            await self._continue_if_history_large()
+        return False
+
+    def _resume(self, carry: dict) -> None:
+        self._start_time = datetime.fromisoformat(carry["started_at"])
+        self._runs = carry["runs"]
+        self.stage = carry["stage"]
+        self.stage_times = carry["stage_times"]
+        self.risk = carry["risk"]
+        self._payment_settled = carry["payment_settled"]
+        self.order.address = carry["address"]
+        if carry.get("shipping"):
+            self._settled_sent = True
+            self._cancel_forwarded = carry["cancel_forwarded"]
+        self._signals.restore(carry["signals"], self.order)
+        self._signal_flag = self._signals.has_pending()
+        logger.info(f"[OrderWorkflow] RESUMED — {self.order.order_id} run {self._runs + 1} at stage '{self.stage}'")
 
-        self.order.workflow_ref = self
+    async def _continue_if_history_large(self) -> None:
+        # Called by the graph between waves, with no activity or child in flight, and between stages
+        # while only the shipping child is, which keeps running and reports to the next run
+        reason = history_limit_reason()
+        if not reason:
+            return
+        if self.stage == "started":
+            # change_address waits for the first stage, so waiting on handlers here could never finish;
+            # the graph's next rest point, after "received", checks again
+            return
+        shipping = self._with_shipping()
+        if shipping:
+            # Not waited for: the graph can't take the child's result until this returns. A cancel_order
+            # waiting on the child's answer keeps this run, which ends once the child returns; until
+            # then every signal wakes the graph to check again
+            if not self._settled_sent or self._shipping_result is not None or not workflow.all_handlers_finished():
+                return
+        else:
+            await workflow.wait_condition(lambda: workflow.all_handlers_finished() or self._signals.cancel_pending())
+            if self._signals.cancel_pending():
+                return  # the cancel stops the graph and is answered in this run
+        address = self.order.address
+        carry = {
+            "started_at": self._start_time.isoformat(),
+            "runs": self._runs + 1,
+            "stage": self.stage,
+            "stage_times": self.stage_times,
+            "risk": self.risk,
+            "payment_settled": self._payment_settled,
+            "address": address if isinstance(address, dict) else asdict(address),
+            "graph": self._graph.snapshot(),
+            "signals": self._signals.snapshot(),
+            "shipping": shipping,
+            "cancel_forwarded": self._cancel_forwarded,
+        }
+        logger.info(f"[OrderWorkflow] CONTINUE AS NEW — {self.order.order_id} at stage '{self.stage}': {reason}")
+        workflow.continue_as_new(args=[
+            self.order.order_id, self._initial_address, [asdict(item) for item in self.order.items],
+            self.verify_stage, self._ingested, carry,
+        ])
 
+    async def _finish(self, result: Optional[str]) -> Optional[str]:
+        # Updates still running (an address change's activity, a cancel_order waiting on its outcome)
+        # reply before the run completes; a cancel that missed the last signal check is too late
+        if self._signals.take_cancel():
+            self._signals.settle_cancel({"status": f"[{self.order.order_id}] Cancel rejected, order already {self.stage}"})
+        await workflow.wait_condition(workflow.all_handlers_finished)
+        return result
+
+    async def _run_serial(self) -> str:
+        # The commands these orders were recorded with: each stage as a regular activity, one after
+        # another, with a DB-checked signal check after each
+        order_id = self.order.order_id
+        await workflow.sleep(0.001)
+        for activity_fn, label, args in (
+            (activity_order_received, "received", [self.order]),
+            (activity_order_validated, "validated", [self.order]),
+            (activity_manual_review, "reviewed", [self.order]),
+            (activity_payment_charged, "charged", [self.order, f"payment-{order_id}"]),
+        ):
+            if activity_fn is activity_manual_review:
+                await workflow.sleep(0.001)
+            try:
+                await workflow.execute_activity(
+                    activity_fn,
+                    args=args,
+                    start_to_close_timeout=timedelta(seconds=5 if activity_fn is activity_manual_review else 2),
+                    retry_policy=FAST_RETRY_POLICY,
+                )
+            except Exception as e:
+                logger.error(f"[OrderWorkflow] {label.upper()} ERROR {order_id} — {e}")
+                raise
+            if label != "reviewed":
+                self.advance(label)  # manual review leaves orders.state at validated
+            if result := await self.check_signal_result():
+                return result
+
+        self.advance("shipping")
         await workflow.execute_child_workflow(
             ShippingWorkflow.run,
-            self.order,
+            args=[self.order],
             id=f"shipping-{order_id}",
             task_queue="shipping-tq",
         )
-
         if result := await self.check_signal_result():
             return result
+        self.advance("shipped")
+        logger.info(f"[OrderWorkflow] COMPLETED — {order_id} (serial)")
+        return f"Order {order_id} completed"
+
+    @workflow.run
+    async def run(self, order_id: str, address: dict, items: list, verify_stage: bool = False,
+                  ingested: bool = False, carry: Optional[dict] = None) -> str:
+        self.verify_stage = verify_stage
+        self._ingested = ingested
+        self._initial_address = address
+        self.order = OrderData(
+            order_id=order_id,
+            address=Address(**address),
+            items=[Item(**item) for item in items]
+        )
+        
+        if carry:
+            self._resume(carry)
+        else:
+            self._start_time: Optional[datetime] = workflow.now()
+            self.advance("started")
+            if self._serial_path():
+                return await self._finish(await self._run_serial())
+
+        received = self._activity_stage(activity_order_received, "RECEIVED")
+        validated = self._activity_stage(activity_order_validated, "VALIDATED")
+        if ingested:
+            # BulkOrderWorkflow already wrote both stages for the whole batch
+            received = validated = self._already_done
+
+        # Validation overlaps risk scoring and review; payment needs both, shipping starts with payment
+        ship = self._rejoin_shipping if carry and carry.get("shipping") else self._ship
+        self._graph = StageGraph([
+            Stage("received", received),
+            Stage("validated", validated, after=("received",)),
+            Stage("risk", self._score_risk, after=("received",)),
+            Stage("review", self._review, after=("risk",)),
+            Stage("payment", self._activity_stage(activity_payment_charged, "PAYMENT", f"payment-{order_id}"),
+                  after=("validated", "review")),
+            Stage("shipping", ship, after=("validated", "review")),
+        ], resume=carry["graph"] if carry else None)
+
+        if not await self._graph.run(self._stage_done, self._between_stages, self._continue_if_history_large):
+            logger.info(f"[OrderWorkflow] STOPPED — {order_id}, critical path {self._graph.critical_path()}")
+            return await self._finish(await self.check_signal_result())
+
+        if self._cancel_forwarded and self._signals.cancel_handled:
+            logger.info(f"[OrderWorkflow] CANCELED BY SHIPPING — {order_id}")
+            return await self._finish(self._signals.cancel_result)
+
+        # Loop so a cancel that arrives while the last check runs is still answered
+        while self._signal_flag:
+            if result := await self.check_signal_result():
+                return await self._finish(result)
     
-        logger.info(f"[OrderWorkflow] COMPLETED — {order_id}")
+        logger.info(f"[OrderWorkflow] COMPLETED — {order_id}, critical path {self._graph.critical_path()}")
         now = workflow.now()  # deterministic "current time" in workflow
         elapsed = (now - self._start_time).total_seconds()
         logger.info(f"Order {order_id} processed in {elapsed} seconds")
-        return f"Order {order_id} completed"
+        return await self._finish(f"Order {order_id} completed")
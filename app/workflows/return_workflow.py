@@ -2,7 +2,8 @@ import logging
 from datetime import timedelta
 from temporalio import workflow
 from temporalio.common import RetryPolicy
-from app.activities.activities import (
+from app.activities.execution import execute_step
+from app.activities.interfaces import (
     activity_get_order_state,
     activity_refund_payment,
 )
@@ -23,12 +24,12 @@ class ReturnWorkflow:
         self.logger.info(f"[ReturnWorkflow] started for order {order_id}")
 
         # Check current order state
-        state_result = await workflow.execute_activity(
+        state_result = await execute_step(
             activity_get_order_state,
             args=[order_id],
             start_to_close_timeout=timedelta(seconds=2),
             retry_policy=FAST_RETRY_POLICY,
-            task_queue="order-tq"
+            task_queue="returns-tq"
         )
         current_state = state_result["state"]
         
@@ -43,12 +44,12 @@ class ReturnWorkflow:
             "amount": 0  
         }
 
-        refund_result = await workflow.execute_activity(
+        refund_result = await execute_step(
             activity_refund_payment,
             args=[simulated_order, "return"],
             start_to_close_timeout=timedelta(seconds=2),
             retry_policy=FAST_RETRY_POLICY,
-            task_queue="order-tq"
+            task_queue="returns-tq"
         )
 
         # Log the actual result instead of a fixed message
@@ -3,22 +3,18 @@ from datetime import timedelta
 from temporalio import workflow
 from temporalio.common import RetryPolicy
 from app.types.order_types import OrderData
-from app.activities.activities import (
+from app.activities.interfaces import (
     activity_package_prepared,
     activity_carrier_dispatched,
     activity_order_shipped,
     activity_get_order_state,
 )
 from app.activities.signals import SignalManager
+from app.activities.execution import execute_step
+from app.workflows.stage_graph import Stage, StageGraph
+from app.workflows.history_guard import history_limit_reason
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s"
-)
-logging.getLogger("temporalio").setLevel(logging.INFO)
 logger = logging.getLogger("shipping-workflow")
-logging.getLogger("temporalio.activity").setLevel(logging.ERROR)
-logging.getLogger("temporalio.worker._workflow_instance").setLevel(logging.ERROR)
 
 FAST_RETRY_POLICY = RetryPolicy(
     maximum_attempts=100,
@@ -30,103 +26,238 @@ FAST_RETRY_POLICY = RetryPolicy(
 @workflow.defn
 class ShippingWorkflow:
     def __init__(self):
-        self._signals = SignalManager(self, logger)
+        self._signals = SignalManager(self, logger, task_queue="shipping-tq")
         self.order: OrderData | None = None
         self._signal_flag = False
+        # Starts at charged, or at validated when started ahead of the charge; advanced after each shipping stage
+        self.stage = "charged"
+        self.stage_times: dict[str, str] = {}
+        self.verify_stage = False
+        self._payment_settled: bool | None = None
+        self._settled_address: dict | None = None
+        self._intercepted: str | None = None
+        self._graph: StageGraph | None = None
+        self._runs = 0
+        self._serial: bool | None = None
+
+    def _serial_path(self) -> bool:
+        # Shipments started before the stage graph replay the serial path; see OrderWorkflow._serial_path
+        if self._serial is None:
+            self._serial = not workflow.patched("stage-graph")
+            self._signals.serial = self._serial
+        return self._serial
 
     @workflow.signal
     async def cancel(self):
+        self._serial_path()
         self._signals.queue_cancel()
         self._signal_flag = True
 
     @workflow.signal
     async def update_address(self, new_address: dict):
+        self._serial_path()
         self._signals.queue_update_address(new_address)
         self._signal_flag = True
 
+    def advance(self, stage: str) -> None:
+        self.stage = stage
+        self.stage_times[stage] = workflow.now().isoformat()
+
+    @workflow.query
+    def status(self) -> dict:
+        return {
+            "order_id": self.order.order_id if self.order else None,
+            "stage": self.stage,
+            "stage_times": self.stage_times,
+            "pending_signals": self._signals.pending(),
+            "signals": self._signals.counts,
+            "critical_path": self._graph.critical_path() if self._graph else {},
+            "continued_as_new": self._runs,
+        }
+
     async def _check_signal_result(self) -> str | None:
         if not self._signal_flag:
             return None
         self._signal_flag = False
 
-        try:
-            state_info = await workflow.execute_activity(
-                activity_get_order_state,
-                self.order.order_id,
-                start_to_close_timeout=timedelta(seconds=5),
-                retry_policy=FAST_RETRY_POLICY,
-                task_queue="shipping-tq",
-            )
-        except Exception as e:
-            logger.error(f"[ShippingWorkflow] SIGNAL CHECK FAILED — {self.order.order_id}: {e}")
-            return f"Signal check failed for order {self.order.order_id}"
+        stage = self.stage
+        if stage == "validated" and self._payment_settled:
+            stage = "charged"  # settled, but the payment stage hasn't been marked done yet
+        if self.verify_stage or self._signals.serial:
+            try:
+                state_info = await execute_step(
+                    activity_get_order_state,
+                    args=[self.order.order_id],
+                    start_to_close_timeout=timedelta(seconds=5),
+                    retry_policy=FAST_RETRY_POLICY,
+                    task_queue="shipping-tq",
+                    local=not self._signals.serial,
+                )
+            except Exception as e:
+                logger.error(f"[ShippingWorkflow] SIGNAL CHECK FAILED — {self.order.order_id}: {e}")
+                return f"Signal check failed for order {self.order.order_id}"
 
-        if state_info.get("state") == "NOT_FOUND":
-            return f"Order {self.order.order_id} not found"
+            if state_info.get("state") == "NOT_FOUND":
+                return f"Order {self.order.order_id} not found"
+            if state_info["state"] != stage:
+                logger.warning(f"[ShippingWorkflow] STAGE MISMATCH — {self.order.order_id}: workflow '{stage}', db '{state_info['state']}'")
+                stage = state_info["state"]
 
-        result = await self._signals.process_signals(self.order, state_info["state"])
+        result = await self._signals.process_signals(self.order, stage)
         return result if result else None
 
-    @workflow.run
-    async def run(self, order: OrderData) -> str:
-        self.order = order
-        workflow.logger.info(f"[ShippingWorkflow] Task started for {order.order_id}")
+    @workflow.signal
+    async def payment_settled(self, charged: bool, new_address: dict | None = None):
+        # Sent by OrderWorkflow once the speculative start is confirmed (charged) or voided
+        self._payment_settled = charged
+        self._settled_address = new_address
 
-        try:
+    def _stage_done(self, name: str, result) -> None:
+        if name != "payment":
+            self.advance(name)
+        elif result and "charged" not in self.stage_times:
+            # Packing may already be done; record the charge without moving the stage back
+            if self.stage == "validated":
+                self.advance("charged")
+            else:
+                self.stage_times["charged"] = workflow.now().isoformat()
+
+    async def _between_stages(self) -> bool:
+        if self._payment_settled is False:
+            return True
+        if (res := await self._check_signal_result()):
+            self._intercepted = res
+            return True
+        return False
+
+    def _activity_stage(self, activity_fn, label: str):
+        async def run_stage():
             try:
-                if (res := await self._check_signal_result()):
-                    logger.info(f"[ShippingWorkflow] Signal intercepted — {res}")
-                    return res  
-              
-                await workflow.execute_activity(
-                    activity_package_prepared,
-                    args=[order],
+                return await workflow.execute_activity(
+                    activity_fn,
+                    args=[self.order],
                     start_to_close_timeout=timedelta(seconds=0.0001),
                     retry_policy=FAST_RETRY_POLICY,
                     task_queue="shipping-tq",
                 )
             except Exception as e:
-                logger.error(f"[ShippingWorkflow] PACKAGE ERROR {order.order_id} — {e}")
+                logger.error(f"[ShippingWorkflow] {label} ERROR {self.order.order_id} — {e}")
                 raise
+        return run_stage
 
-            if (res := await self._check_signal_result()):
-                logger.info(f"[ShippingWorkflow] Signal intercepted — {res}")
-                return res
+    async def _wait_for_payment(self) -> bool:
+        await workflow.wait_condition(lambda: self._payment_settled is not None)
+        if self._payment_settled and self._settled_address:
+            # Address changes the parent accepted while this ran ahead
+            self.order.address = self._settled_address
+        return self._payment_settled
+
+    def _resume(self, carry: dict) -> None:
+        self._runs = carry["runs"]
+        self.stage = carry["stage"]
+        self.stage_times = carry["stage_times"]
+        self._payment_settled = carry["payment_settled"]
+        self._signals.restore(carry["signals"], self.order)
+        self._signal_flag = self._signals.has_pending()
+        logger.info(f"[ShippingWorkflow] RESUMED — {self.order.order_id} run {self._runs + 1} at stage '{self.stage}'")
+
+    async def _continue_if_history_large(self) -> None:
+        # Between stages with nothing in flight; the parent keeps waiting on the same workflow id
+        reason = history_limit_reason()
+        if not reason:
+            return
+        await workflow.wait_condition(workflow.all_handlers_finished)
+        carry = {
+            "runs": self._runs + 1,
+            "stage": self.stage,
+            "stage_times": self.stage_times,
+            "payment_settled": self._payment_settled,
+            "graph": self._graph.snapshot(),
+            "signals": self._signals.snapshot(),
+        }
+        logger.info(f"[ShippingWorkflow] CONTINUE AS NEW — {self.order.order_id} at stage '{self.stage}': {reason}")
+        workflow.continue_as_new(args=[self.order, self.verify_stage, self._payment_settled is None, carry])
 
+    async def _report_to_parent(self, result: str) -> str:
+        # A parent that continued as new while this shipped waits for this signal, not the child result
+        parent = workflow.info().parent
+        if parent:
             try:
-                await workflow.execute_activity(
-                    activity_carrier_dispatched,
-                    args=[order],
-                    start_to_close_timeout=timedelta(seconds=0.0001),
-                    retry_policy=FAST_RETRY_POLICY,
-                    task_queue="shipping-tq",
-                )
+                await workflow.get_external_workflow_handle(parent.workflow_id).signal("shipping_done", result)
             except Exception as e:
-                logger.error(f"[ShippingWorkflow] DISPATCH ERROR {order.order_id} — {e}")
-                raise
+                logger.warning(f"[ShippingWorkflow] PARENT NOT NOTIFIED — {self.order.order_id}: {e}")
+        return result
 
+    async def _run_serial(self) -> str:
+        # The commands these shipments were recorded with: one stage after another
+        order_id = self.order.order_id
+        try:
             if (res := await self._check_signal_result()):
                 logger.info(f"[ShippingWorkflow] Signal intercepted — {res}")
                 return res
+            for name, run_stage in (
+                ("package_prepared", self._activity_stage(activity_package_prepared, "PACKAGE")),
+                ("dispatched", self._activity_stage(activity_carrier_dispatched, "DISPATCH")),
+                ("shipped", self._activity_stage(activity_order_shipped, "SHIPPED")),
+            ):
+                await run_stage()
+                self.advance(name)
+                if (res := await self._check_signal_result()):
+                    logger.info(f"[ShippingWorkflow] Signal intercepted — {res}")
+                    return res
 
-            try:
-                await workflow.execute_activity(
-                    activity_order_shipped,
-                    args=[order],
-                    start_to_close_timeout=timedelta(seconds=0.0001),
-                    retry_policy=FAST_RETRY_POLICY,
-                    task_queue="shipping-tq",
-                )
-            except Exception as e:
-                logger.error(f"[ShippingWorkflow] SHIPPED ERROR {order.order_id} — {e}")
-                raise
+            await workflow.sleep(timedelta(seconds=2))
+            logger.info(f"[ShippingWorkflow] COMPLETED — {order_id} (serial)")
+            return f"Shipping complete for order {order_id}"
+
+        except Exception as e:
+            logger.error(f"[ShippingWorkflow] FINAL FAILURE — {order_id} — {e}")
+            return f"Shipping failed for order {order_id}"
+
+    @workflow.run
+    async def run(self, order: OrderData, verify_stage: bool = False, wait_for_payment: bool = False,
+                  carry: dict | None = None) -> str:
+        self.order = order
+        self.verify_stage = verify_stage
+        if carry:
+            self._resume(carry)
+        elif self._serial_path():
+            self._payment_settled = True
+            return await self._run_serial()
+        elif wait_for_payment:
+            # Started speculatively: packing overlaps the charge, dispatch waits for it
+            self.stage = "validated"
+        else:
+            self._payment_settled = True
+            self.stage_times["charged"] = workflow.now().isoformat()
+        workflow.logger.info(f"[ShippingWorkflow] Task started for {order.order_id}")
+        return await self._report_to_parent(await self._run_graph(carry))
 
+    async def _run_graph(self, carry: dict | None) -> str:
+        order = self.order
+        self._graph = StageGraph([
+            Stage("package_prepared", self._activity_stage(activity_package_prepared, "PACKAGE")),
+            Stage("payment", self._wait_for_payment),
+            Stage("dispatched", self._activity_stage(activity_carrier_dispatched, "DISPATCH"),
+                  after=("package_prepared", "payment")),
+            Stage("shipped", self._activity_stage(activity_order_shipped, "SHIPPED"), after=("dispatched",)),
+        ], resume=carry["graph"] if carry else None)
+
+        try:
             if (res := await self._check_signal_result()):
                 logger.info(f"[ShippingWorkflow] Signal intercepted — {res}")
                 return res
 
+            await self._graph.run(self._stage_done, self._between_stages, self._continue_if_history_large)
+            if self._intercepted:
+                logger.info(f"[ShippingWorkflow] Signal intercepted — {self._intercepted}")
+                return self._intercepted
+            if self._payment_settled is False:
+                logger.info(f"[ShippingWorkflow] VOIDED — {order.order_id} after {list(self._graph.finished)}")
+                return f"Shipping canceled for order {order.order_id}"
+
             await workflow.sleep(timedelta(seconds=2))
-            logger.info(f"[ShippingWorkflow] COMPLETED — {order.order_id}")
+            logger.info(f"[ShippingWorkflow] COMPLETED — {order.order_id}, critical path {self._graph.critical_path()}")
             return f"Shipping complete for order {order.order_id}"
 
         except Exception as e:
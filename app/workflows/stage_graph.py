@@ -0,0 +1,130 @@
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable
+from temporalio import workflow
+
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    run: Callable[[], Awaitable[Any]]
+    after: tuple[str, ...] = ()
+
+
+class StageGraph:
+    """
+    Runs workflow stages as soon as every stage they come `after` has finished,
+    so independent stages overlap. Stages are started, and their completions
+    handled, in declaration order, which keeps replays deterministic.
+
+    `between()` runs after each batch of completions. Returning True stops the
+    graph: nothing new starts and in-flight stages are drained (not cancelled),
+    so the caller sees exactly which stages took effect before compensating.
+
+    `at_rest()` runs whenever no stage is in flight and more are about to start,
+    the one point where a run can continue-as-new; `snapshot()` / `resume`
+    carry the finished stages and their timings over to the next run.
+
+    `wake()` makes a waiting graph run `between()` without a completion, for
+    signal handlers that can't wait for the next stage to finish.
+    """
+
+    def __init__(self, stages: list[Stage], resume: dict | None = None):
+        names = [stage.name for stage in stages]
+        for stage in stages:
+            unknown = [dep for dep in stage.after if dep not in names or names.index(dep) >= names.index(stage.name)]
+            if unknown:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown or later stages {unknown}")
+        self.stages = stages
+        self.results: dict[str, Any] = {}
+        self.started: dict[str, Any] = {}
+        self.finished: dict[str, Any] = {}
+        self.stopped = False
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._woken = asyncio.Event()
+        if resume:
+            # Stages finished by an earlier run count as done; their results live in the workflow's own state
+            self.started = {name: datetime.fromisoformat(ts) for name, ts in resume["started"].items()}
+            self.finished = {name: datetime.fromisoformat(ts) for name, ts in resume["finished"].items()}
+            self.results = {name: None for name in self.finished}
+
+    def snapshot(self) -> dict:
+        return {
+            "started": {name: ts.isoformat() for name, ts in self.started.items() if name in self.finished},
+            "finished": {name: ts.isoformat() for name, ts in self.finished.items()},
+        }
+
+    def done(self, name: str) -> bool:
+        return name in self.finished
+
+    def in_flight(self, name: str) -> bool:
+        return name in self._tasks
+
+    def wake(self) -> None:
+        self._woken.set()
+
+    def _ready(self) -> list[Stage]:
+        return [
+            stage for stage in self.stages
+            if stage.name not in self.started and all(dep in self.finished for dep in stage.after)
+        ]
+
+    async def run(self, on_done: Callable[[str, Any], None], between: Callable[[], Awaitable[bool]],
+                  at_rest: Callable[[], Awaitable[None]] | None = None) -> bool:
+        """Return True once every stage finished, False if `between` stopped the graph."""
+        while True:
+            if not self.stopped:
+                if at_rest and not self._tasks and self._ready():
+                    await at_rest()
+                for stage in self._ready():
+                    self.started[stage.name] = workflow.now()
+                    self._tasks[stage.name] = asyncio.create_task(stage.run())
+            if not self._tasks:
+                return not self.stopped
+
+            woken = asyncio.create_task(self._woken.wait())
+            await workflow.wait([*self._tasks.values(), woken], return_when=asyncio.FIRST_COMPLETED)
+            woken.cancel()
+            self._woken.clear()
+            for stage in self.stages:
+                task = self._tasks.get(stage.name)
+                if task is None or not task.done():
+                    continue
+                del self._tasks[stage.name]
+                self.finished[stage.name] = workflow.now()
+                self.results[stage.name] = task.result()  # a failed stage fails the workflow, as before
+                on_done(stage.name, self.results[stage.name])
+
+            if not self.stopped and await between():
+                self.stopped = True
+
+    def critical_path(self) -> dict:
+        """Longest chain of dependent stages behind the last stage to finish, with per-stage timings."""
+        if not self.finished:
+            return {}
+        by_name = {stage.name: stage for stage in self.stages}
+        durations = {
+            name: round((self.finished[name] - self.started[name]).total_seconds(), 3)
+            for name in self.finished
+        }
+
+        path = []
+        name = max(self.finished, key=lambda n: self.finished[n])
+        while name is not None:
+            path.append(name)
+            deps = [dep for dep in by_name[name].after if dep in self.finished]
+            name = max(deps, key=lambda n: self.finished[n]) if deps else None
+        path.reverse()
+
+        elapsed = (max(self.finished.values()) - min(self.started.values())).total_seconds()
+        serial = sum(durations.values())
+        return {
+            "path": path,
+            "path_s": round(sum(durations[name] for name in path), 3),
+            "elapsed_s": round(elapsed, 3),
+            # What running every stage back to back would have cost, and what overlapping saved
+            "serial_s": round(serial, 3),
+            "overlap_saved_s": round(max(0.0, serial - elapsed), 3),
+            "stages": durations,
+        }
@@ -0,0 +1,108 @@
+"""
+Activity throughput with sync vs async DB sessions on the worker event loop.
+
+Each simulated activity mirrors a stub state transition: load the order, flip
+its state, add an event and commit, with a short await standing in for the
+downstream call. A ticker coroutine measures how long the loop is stalled.
+The async runs compare aiosqlite's default pool with the app's fixed
+SQLITE_ASYNC_POOL_SIZE profile.
+
+    python -m tests.bench_async_db --concurrency 100 --rounds 5
+"""
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from app.db.models import Base, Order, Event
+from app.db.session import build_async_engine
+from tests.bench_common import bench_parser, print_table
+
+
+def seed(url: str, n: int) -> None:
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add_all(Order(id=f"order-{i}", state="received", address_json={}) for i in range(n))
+        db.commit()
+    engine.dispose()
+
+
+async def sync_activity(SessionLocal, order_id: str) -> None:
+    await asyncio.sleep(0.005)
+    with SessionLocal() as db:
+        db_order = db.get(Order, order_id)
+        db_order.state = "validated"
+        db_order.updated_at = datetime.utcnow()
+        db.add(Event(order_id=order_id, type="ORDER_VALIDATED", payload_json={}, ts=datetime.utcnow()))
+        db.commit()
+
+
+async def async_activity(AsyncSessionLocal, order_id: str) -> None:
+    await asyncio.sleep(0.005)
+    async with AsyncSessionLocal() as db:
+        db_order = await db.get(Order, order_id)
+        db_order.state = "validated"
+        db_order.updated_at = datetime.utcnow()
+        db.add(Event(order_id=order_id, type="ORDER_VALIDATED", payload_json={}, ts=datetime.utcnow()))
+        await db.commit()
+
+
+async def loop_lag(stop: asyncio.Event, samples: list) -> None:
+    while not stop.is_set():
+        t = time.perf_counter()
+        await asyncio.sleep(0.001)
+        samples.append(time.perf_counter() - t - 0.001)
+
+
+async def run(activity, factory, concurrency: int, rounds: int) -> dict:
+    lag: list[float] = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(loop_lag(stop, lag))
+    start = time.perf_counter()
+    for r in range(rounds):
+        await asyncio.gather(*[activity(factory, f"order-{i}") for i in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await ticker
+    lag.sort()
+    return {
+        "activities/s": round(concurrency * rounds / elapsed, 1),
+        "elapsed s": round(elapsed, 3),
+        "loop lag p99 ms": round(lag[int(len(lag) * 0.99)] * 1000, 2) if lag else 0.0,
+        "loop lag max ms": round(lag[-1] * 1000, 2) if lag else 0.0,
+    }
+
+
+async def main(concurrency: int, rounds: int) -> None:
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(f"sqlite:///{path}", concurrency)
+
+        engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+        stats = await run(sync_activity, sessionmaker(bind=engine), concurrency, rounds)
+        rows.append(["sync SessionLocal (before)", *stats.values()])
+        engine.dispose()
+
+        for label, async_engine in (
+            ("AsyncSessionLocal, default pool", create_async_engine(f"sqlite+aiosqlite:///{path}")),
+            ("AsyncSessionLocal (after)", build_async_engine(f"sqlite:///{path}")),
+        ):
+            factory = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+            stats = await run(async_activity, factory, concurrency, rounds)
+            rows.append([label, *stats.values()])
+            await async_engine.dispose()
+
+    print_table(f"{concurrency} concurrent activities x {rounds} rounds", rows, ["Session", *stats.keys()])
+
+
+if __name__ == "__main__":
+    parser = bench_parser(__doc__)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency, args.rounds))
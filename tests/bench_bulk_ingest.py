@@ -0,0 +1,85 @@
+"""
+Ingestion throughput: per-order received/validated writes vs the bulk stubs.
+
+Runs the real stubs against a temporary SQLite database through an EventSink,
+with flaky_call switched off so only the write path is measured. The per-order
+mode calls order_received and order_validated once per order, all orders in
+flight at once (what N OrderWorkflows do). The bulk mode calls orders_received
+and orders_validated once per --batch orders. Neither mode counts the
+start_workflow RPC and workflow history per order, which the bulk endpoint also
+saves; measuring those needs a Temporal server.
+
+    python -m tests.bench_bulk_ingest --orders 5000 --batch 500
+"""
+import asyncio
+import os
+import tempfile
+import time
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app.db.event_sink import EventSink
+from app.db.init_db import init_db
+from app.db.session import build_async_engine
+from app.stubs import function_stubs
+from tests.bench_common import bench_parser, print_table
+
+ADDRESS = {"street": "1 Bench St", "city": "Boston", "state": "MA", "zip": "02118"}
+
+
+async def no_flake() -> None:
+    return None
+
+
+def make_orders(prefix: str, n: int) -> list[dict]:
+    return [{"order_id": f"{prefix}-{i}", "address": ADDRESS, "items": [{"sku": "ABC", "qty": 1}]} for i in range(n)]
+
+
+async def per_order(orders: list[dict], concurrency: int) -> None:
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(order: dict) -> None:
+        async with limit:
+            await function_stubs.order_received(order["order_id"])
+            await function_stubs.order_validated(order)
+
+    await asyncio.gather(*[one(order) for order in orders])
+
+
+async def bulk(orders: list[dict], batch: int) -> None:
+    async def one(i: int) -> None:
+        chunk = orders[i:i + batch]
+        await function_stubs.orders_received(f"bulk-{i}", chunk)
+        await function_stubs.orders_validated(f"bulk-{i}", chunk)
+
+    await asyncio.gather(*[one(i) for i in range(0, len(orders), batch)])
+
+
+async def main(n: int, batch: int, concurrency: int) -> None:
+    function_stubs.flaky_call = no_flake
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'orders.db')}"
+        init_db(url)
+        engine = build_async_engine(url)
+        factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+        for label, run in [("per-order (before)", lambda orders: per_order(orders, concurrency)),
+                           ("bulk (after)", lambda orders: bulk(orders, batch))]:
+            sink = EventSink(session_factory=factory)
+            function_stubs.event_sink = sink
+            orders = make_orders(label.split()[0], n)
+            start = time.perf_counter()
+            await run(orders)
+            elapsed = time.perf_counter() - start
+            rows.append([label, n, round(elapsed, 2), round(n / elapsed), sink.stats()["flushes"]])
+        await engine.dispose()
+
+    print_table(f"{n} orders received + validated, bulk batches of {batch}, per-order concurrency {concurrency}",
+                rows, ["Path", "orders", "seconds", "orders/s", "commits"])
+
+
+if __name__ == "__main__":
+    parser = bench_parser(__doc__)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.orders, args.batch, args.concurrency))
@@ -0,0 +1,46 @@
+"""
+Harness shared by the tests/bench_*.py scripts: their command line, result
+tables and percentiles, and a Temporal client for the ones that need a server.
+"""
+import argparse
+from contextlib import asynccontextmanager
+from tabulate import tabulate
+
+
+def bench_parser(doc: str | None, temporal: bool = False) -> argparse.ArgumentParser:
+    """Parser showing the script's docstring under --help; `temporal` adds --target."""
+    parser = argparse.ArgumentParser(description=doc, formatter_class=argparse.RawDescriptionHelpFormatter)
+    if temporal:
+        parser.add_argument("--target", help="Temporal frontend, e.g. localhost:7233; default starts a local dev server")
+    return parser
+
+
+def print_table(title: str | None, rows, headers) -> None:
+    if title:
+        print(f"\n{title}")
+    print(tabulate(rows, headers=headers, tablefmt="grid"))
+
+
+def pct(values, p: float) -> float | None:
+    """p-th percentile of `values` (seconds) in milliseconds."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000, 2)
+
+
+@asynccontextmanager
+async def temporal_client(target: str | None):
+    """Client for `target`, or for a local dev server started (and stopped) around the block."""
+    from temporalio.client import Client
+    from temporalio.testing import WorkflowEnvironment
+    from app.types.converter import data_converter
+
+    if target:
+        yield await Client.connect(target, data_converter=data_converter())
+        return
+    env = await WorkflowEnvironment.start_local(data_converter=data_converter())
+    try:
+        yield env.client
+    finally:
+        await env.shutdown()
@@ -0,0 +1,96 @@
+"""
+Replay time after a signal storm: one long run vs continue-as-new at the history limit.
+
+Runs the real OrderWorkflow/ShippingWorkflow against the fake activities from
+bench_signal_latency, with manual review stretched so a storm of --storm
+update_address signals lands while each order waits. Once the orders finish,
+the history of each workflow's latest run (what a worker restarted at that
+point would replay) is fetched and replayed. With the guard off every signal
+stays in the one run; with it on the order continues as new at the first rest
+point past --max-events, so only the events after that are replayed. Signals
+that arrive while an activity is in flight still count toward the current run
+until the next rest point.
+
+Workers and the replayer run unsandboxed so the history_guard limits set here
+are the ones the workflow code sees. Needs a Temporal server: either pass
+--target, or let the test environment download and start a local dev server.
+
+    python -m tests.bench_history_replay --orders 10 --storm 2000
+"""
+import asyncio
+import time
+import uuid
+from temporalio.client import Client
+from temporalio.worker import Replayer, UnsandboxedWorkflowRunner, Worker
+from app.types.converter import data_converter
+from app.workflows import history_guard
+from app.workflows.order_workflow import OrderWorkflow
+from app.workflows.shipping_workflow import ShippingWorkflow
+from tests.bench_common import bench_parser, pct, print_table, temporal_client
+from tests import bench_signal_latency
+from tests.bench_signal_latency import ACTIVITIES, review_started
+
+ADDRESS = {"street": "1 Bench St", "city": "Boston", "state": "MA", "zip": "02118"}
+
+
+async def run_order(client: Client, storm: int) -> str:
+    order_id = f"bench-{uuid.uuid4().hex[:8]}"
+    handle = await client.start_workflow(
+        OrderWorkflow.run,
+        args=[order_id, ADDRESS, [{"sku": "ABC", "qty": 1}]],
+        id=order_id,
+        task_queue="order-tq",
+    )
+    await review_started[order_id].wait()
+    for i in range(storm):
+        await handle.signal(OrderWorkflow.update_address, {**ADDRESS, "street": f"{i} Bench St"})
+    await handle.result()
+    return order_id
+
+
+async def replay_latest_runs(client: Client, order_ids: list[str]) -> tuple[list[int], list[float]]:
+    replayer = Replayer(workflows=[OrderWorkflow, ShippingWorkflow], workflow_runner=UnsandboxedWorkflowRunner(),
+                        data_converter=data_converter())
+    events, seconds = [], []
+    for order_id in order_ids:
+        history = await client.get_workflow_handle(order_id).fetch_history()
+        start = time.perf_counter()
+        await replayer.replay_workflow(history)
+        seconds.append(time.perf_counter() - start)
+        events.append(len(history.events))
+    return events, seconds
+
+
+async def measure(client: Client, orders: int, storm: int, max_events: int) -> list:
+    history_guard.HISTORY_MAX_EVENTS = max_events
+    async with Worker(client, task_queue="order-tq", workflows=[OrderWorkflow], activities=ACTIVITIES,
+                      workflow_runner=UnsandboxedWorkflowRunner()), \
+            Worker(client, task_queue="shipping-tq", workflows=[ShippingWorkflow], activities=ACTIVITIES,
+                   workflow_runner=UnsandboxedWorkflowRunner()):
+        order_ids = await asyncio.gather(*[run_order(client, storm) for _ in range(orders)])
+    # Replay with the same limits the runs were recorded under, or the continue-as-new point would differ
+    events, seconds = await replay_latest_runs(client, order_ids)
+    return [max(events), pct(seconds, 0.5), pct(seconds, 0.95)]
+
+
+async def main(target: str | None, orders: int, storm: int, max_events: int, review_seconds: float) -> None:
+    async with temporal_client(target) as client:
+        bench_signal_latency.REVIEW_SECONDS = review_seconds
+        history_guard.HISTORY_MAX_BYTES = 1 << 40
+        rows = [
+            ["guard off (before)", *await measure(client, orders, storm, 1 << 40)],
+            [f"guard at {max_events} events (after)", *await measure(client, orders, storm, max_events)],
+        ]
+
+    print_table(f"{orders} orders, {storm} update_address signals each during manual review",
+                rows, ["Run", "latest run events (max)", "replay p50 ms", "replay p95 ms"])
+
+
+if __name__ == "__main__":
+    parser = bench_parser(__doc__, temporal=True)
+    parser.add_argument("--orders", type=int, default=10)
+    parser.add_argument("--storm", type=int, default=2000)
+    parser.add_argument("--max-events", type=int, default=500)
+    parser.add_argument("--review-seconds", type=float, default=5.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.target, args.orders, args.storm, args.max_events, args.review_seconds))
@@ -0,0 +1,87 @@
+"""
+Cancel-to-completion latency with the DB-only steps as regular vs local activities.
+
+Runs the real OrderWorkflow against the fake activities from
+bench_signal_latency, plus fake cancel/refund steps that sleep for --db-ms.
+A cancel is sent while each order sits in manual review; latency is measured
+from the signal to the workflow result. The local mode runs
+activity_cancel_order (and the rest of LOCAL_ACTIVITY_STEPS) inside the
+workflow worker instead of round-tripping through order-tq.
+
+The workflow runs unsandboxed so the step set can be switched between runs.
+Needs a Temporal server: pass --target or let the test environment start one.
+
+    python -m tests.bench_local_activities --orders 50
+"""
+import asyncio
+import time
+import uuid
+from temporalio.client import Client
+from temporalio.worker import UnsandboxedWorkflowRunner, Worker
+from app.activities import execution
+from app.workflows.order_workflow import OrderWorkflow
+from app.workflows.shipping_workflow import ShippingWorkflow
+from tests.bench_common import bench_parser, pct, print_table, temporal_client
+from tests import bench_signal_latency
+from tests.bench_signal_latency import ACTIVITIES, fake, review_started
+
+DB_SECONDS = 0.002
+
+
+@fake("activity_cancel_order")
+async def cancel_order(order: dict) -> str:
+    await asyncio.sleep(DB_SECONDS)
+    return f"Order {order['order_id']} marked as canceled"
+
+
+@fake("activity_refund_payment")
+async def refund_payment(order: dict, reason: str) -> str:
+    await asyncio.sleep(DB_SECONDS)
+    return f"Refund issued for order {order['order_id']}"
+
+
+async def run_order(client: Client, latencies: list) -> None:
+    order_id = f"bench-{uuid.uuid4().hex[:8]}"
+    address = {"street": "1 Bench St", "city": "Boston", "state": "MA", "zip": "02118"}
+    handle = await client.start_workflow(
+        OrderWorkflow.run,
+        args=[order_id, address, [{"sku": "ABC", "qty": 1}]],
+        id=order_id,
+        task_queue="order-tq",
+    )
+    await review_started[order_id].wait()
+    sent = time.perf_counter()
+    await handle.signal(OrderWorkflow.cancel)
+    await handle.result()
+    latencies.append(time.perf_counter() - sent)
+
+
+async def main(target: str | None, orders: int) -> None:
+    async with temporal_client(target) as client:
+        # Cancel lands just after review, so keep the review short
+        bench_signal_latency.REVIEW_SECONDS = 0.1
+        activities = [*ACTIVITIES, cancel_order, refund_payment]
+        local_steps = set(execution.LOCAL_ACTIVITY_STEPS)
+        rows = []
+        async with Worker(client, task_queue="order-tq", workflows=[OrderWorkflow], activities=activities,
+                          workflow_runner=UnsandboxedWorkflowRunner()), \
+                Worker(client, task_queue="shipping-tq", workflows=[ShippingWorkflow], activities=activities,
+                       workflow_runner=UnsandboxedWorkflowRunner()):
+            for label, steps in [("regular activities (before)", set()), ("local activities (after)", local_steps)]:
+                execution.LOCAL_ACTIVITY_STEPS = steps
+                latencies: list[float] = []
+                await asyncio.gather(*[run_order(client, latencies) for _ in range(orders)])
+                rows.append([label, len(latencies), pct(latencies, 0.5), pct(latencies, 0.95), pct(latencies, 0.99)])
+        execution.LOCAL_ACTIVITY_STEPS = local_steps
+
+    print_table(f"{orders} orders canceled during manual review, {DB_SECONDS * 1000:.0f}ms simulated DB step",
+                rows, ["Mode", "orders", "cancel->done p50 ms", "p95 ms", "p99 ms"])
+
+
+if __name__ == "__main__":
+    parser = bench_parser(__doc__, temporal=True)
+    parser.add_argument("--orders", type=int, default=50)
+    parser.add_argument("--db-ms", type=float, default=2.0)
+    args = parser.parse_args()
+    DB_SECONDS = args.db_ms / 1000
+    asyncio.run(main(args.target, args.orders))
@@ -0,0 +1,84 @@
+"""
+Order id allocation cost inside /start-order at growing table sizes.
+
+"before" is the old generate_order_id (SELECT COUNT(*) per request); "after"
+are the SequenceIdAllocator (block leases) and KSortableIdAllocator modes.
+The Temporal start_workflow RPC is the same in every mode and is left out.
+
+    python -m tests.bench_order_ids --sizes 10000,1000000,10000000 --requests 500
+"""
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app.db.init_db import init_db
+from app.db.id_allocator import KSortableIdAllocator, SequenceIdAllocator
+from app.db.models import Order
+from app.db.session import build_async_engine
+from tests.bench_common import bench_parser, print_table
+
+
+def seed(path: str, n: int) -> None:
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO orders (id, state, address_json) VALUES (?, 'shipped', '{}')",
+        ((f"order-{i}",) for i in range(1, n + 1)),
+    )
+    conn.commit()
+    conn.close()
+
+
+async def measure(next_id, requests: int) -> tuple[float, float]:
+    latencies = []
+    for _ in range(requests):
+        t = time.perf_counter()
+        await next_id()
+        latencies.append(time.perf_counter() - t)
+    latencies.sort()
+    return sum(latencies) / len(latencies) * 1000, latencies[int(len(latencies) * 0.99)] * 1000
+
+
+async def bench_size(n: int, requests: int) -> list:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        url = f"sqlite:///{path}"
+        init_db(url, revision="0003")
+        seed(path, n)
+        init_db(url)
+
+        engine = build_async_engine(url)
+        factory = async_sessionmaker(bind=engine)
+
+        async def count_id():
+            async with factory() as db:
+                count = await db.scalar(select(func.count()).select_from(Order))
+            return f"order-{count + 1}"
+
+        rows = []
+        for label, next_id in [
+            ("COUNT(*) (before)", count_id),
+            ("sequence, block 100", SequenceIdAllocator(block_size=100, session_factory=factory).next_id),
+            ("ksortable", KSortableIdAllocator().next_id),
+        ]:
+            mean, p99 = await measure(next_id, requests)
+            rows.append([f"{n:,}", label, round(mean, 4), round(p99, 4)])
+        await engine.dispose()
+        return rows
+
+
+async def main(sizes: list[int], requests: int) -> None:
+    rows = []
+    for n in sizes:
+        rows.extend(await bench_size(n, requests))
+    print_table(None, rows, ["Existing orders", "Allocator", "mean ms", "p99 ms"])
+
+
+if __name__ == "__main__":
+    parser = bench_parser(__doc__)
+    parser.add_argument("--sizes", default="10000,1000000,10000000")
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main([int(s) for s in args.sizes.split(",")], args.requests))
@@ -0,0 +1,101 @@
+"""
+Payload size and encode/decode cost per order, by data converter.
+
+An order's lifecycle sends the order through Temporal about eight times: the
+OrderWorkflow input, received, validated, the charge, the ShippingWorkflow
+input and the three shipping stages. Those argument lists are encoded with
+each converter for orders of increasing size. The bench reports the bytes
+stored in history and the median encode and decode time per step, codec
+included. No Temporal server is needed.
+
+    python -m tests.bench_payload_codec --runs 200
+"""
+import asyncio
+import statistics
+import time
+from dataclasses import asdict
+from temporalio.converter import DataConverter
+from app.types import converter
+from app.types.converter import CompressionCodec, OrderPayloadConverter
+from app.types.order_types import Address, Item, OrderData
+from tests.bench_common import bench_parser, print_table
+
+
+def make_order(items: int) -> OrderData:
+    return OrderData(f"order-{items}", Address("123 Main St", "Boston", "MA", "02118"),
+                     [Item(f"WIDGET-{i:05d}", i % 5 + 1) for i in range(items)])
+
+
+def lifecycle(order: OrderData) -> list[tuple[list, list]]:
+    """(args, type hints) for each step that carries the order."""
+    as_dict = asdict(order)
+    return [
+        ([order.order_id, as_dict["address"], as_dict["items"]], [str, dict, list]),  # OrderWorkflow.run
+        ([order], [OrderData]),  # activity_order_received
+        ([as_dict], [dict]),  # activity_order_validated
+        ([as_dict, "pay-1"], [dict, str]),  # activity_payment_charged
+        ([order, False, True], [OrderData, bool, bool]),  # ShippingWorkflow.run
+        ([order], [OrderData]),  # activity_package_prepared
+        ([order], [OrderData]),  # activity_carrier_dispatched
+        ([order], [OrderData]),  # activity_order_shipped
+    ]
+
+
+def converters() -> dict[str, DataConverter]:
+    def build(encoding: str, compression: str) -> DataConverter:
+        converter.PAYLOAD_ENCODING = encoding
+        return DataConverter(payload_converter_class=OrderPayloadConverter,
+                             payload_codec=CompressionCodec(compression=compression))
+
+    built = {
+        "json (SDK default)": DataConverter.default,
+        "msgpack": build("msgpack", "none"),
+        "msgpack+zlib": build("msgpack", "zlib"),
+    }
+    if converter.zstandard is not None:
+        built["msgpack+zstd"] = build("msgpack", "zstd")
+    converter.PAYLOAD_ENCODING = "msgpack"
+    return built
+
+
+async def measure(data_converter: DataConverter, order: OrderData, runs: int) -> tuple[int, float, float]:
+    steps = lifecycle(order)
+    size = 0
+    encoded = []
+    for args, _ in steps:
+        payloads = await data_converter.encode(args)
+        size += sum(p.ByteSize() for p in payloads)
+        encoded.append(payloads)
+    encode_us, decode_us = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        for args, _ in steps:
+            await data_converter.encode(args)
+        encode_us.append((time.perf_counter() - start) / len(steps) * 1e6)
+        start = time.perf_counter()
+        for payloads, (_, hints) in zip(encoded, steps):
+            await data_converter.decode(payloads, hints)
+        decode_us.append((time.perf_counter() - start) / len(steps) * 1e6)
+    return size, statistics.median(encode_us), statistics.median(decode_us)
+
+
+async def main(runs: int, sizes: list[int]) -> None:
+    rows = []
+    for items in sizes:
+        order = make_order(items)
+        baseline = None
+        for name, data_converter in converters().items():
+            size, encode_us, decode_us = await measure(data_converter, order, runs)
+            baseline = baseline or size
+            rows.append([items, name, size, f"{size / baseline:.0%}", round(encode_us, 1), round(decode_us, 1)])
+    print_table(f"Payload bytes per order lifecycle ({len(lifecycle(make_order(1)))} steps) "
+                f"and per-step encode/decode time (median of {runs})",
+                rows, ["Items", "Converter", "bytes/order", "vs JSON", "encode µs", "decode µs"])
+
+
+if __name__ == "__main__":
+    parser = bench_parser(__doc__)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--sizes", default="1,10,100,1000", help="comma-separated item counts")
+    args = parser.parse_args()
+    asyncio.run(main(args.runs, [int(n) for n in args.sizes.split(",")]))
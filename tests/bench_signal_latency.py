@@ -0,0 +1,143 @@
+"""
+Signal-to-effect latency: workflow-tracked stage vs a DB round trip per signal check.
+
+Runs the real OrderWorkflow/ShippingWorkflow against fake activities that only
+record timestamps. While each order sits in manual review, a burst of
+update_address signals is sent; the burst is coalesced and only its last
+address is applied at the next signal check. "check overhead" is the gap between manual review finishing and the
+first address update running, which is where the old activity_get_order_state
+round trip sat. verify_stage=True restores that round trip for comparison.
+
+Needs a Temporal server: either pass --target, or let the test environment
+download and start a local dev server.
+
+    python -m tests.bench_signal_latency --orders 20 --burst 10
+"""
+import asyncio
+import time
+import uuid
+from collections import defaultdict
+from temporalio import activity
+from temporalio.client import Client
+from temporalio.worker import Worker
+from app.workflows.order_workflow import OrderWorkflow
+from app.workflows.shipping_workflow import ShippingWorkflow
+from tests.bench_common import bench_parser, pct, print_table, temporal_client
+
+REVIEW_SECONDS = 0.5
+
+review_started: dict[str, asyncio.Event] = defaultdict(asyncio.Event)
+review_done: dict[str, float] = {}
+effects: dict[str, list[float]] = defaultdict(list)
+state_checks = {"count": 0}
+
+
+def fake(name: str):
+    def register(fn):
+        return activity.defn(name=name)(fn)
+    return register
+
+
+@fake("activity_order_received")
+async def order_received(order) -> dict:
+    return {"order_id": order.order_id, "items": []}
+
+
+@fake("activity_order_validated")
+async def order_validated(order) -> None:
+    return None
+
+
+@fake("activity_manual_review")
+async def manual_review(order) -> None:
+    review_started[order["order_id"]].set()
+    await asyncio.sleep(REVIEW_SECONDS)
+    review_done[order["order_id"]] = time.perf_counter()
+
+
+@fake("activity_risk_score")
+async def risk_score(features: dict) -> dict:
+    # Every order goes to review so the signals land while it waits
+    return {"score": 1.0, "review": True}
+
+
+@fake("activity_payment_charged")
+async def payment_charged(order, payment_id: str) -> dict:
+    return {"status": "charged", "amount": 1}
+
+
+@fake("activity_package_prepared")
+async def package_prepared(order) -> str:
+    return "Package ready"
+
+
+@fake("activity_carrier_dispatched")
+async def carrier_dispatched(order) -> str:
+    return "Dispatched"
+
+
+@fake("activity_order_shipped")
+async def order_shipped(order) -> str:
+    return "Shipped"
+
+
+@fake("activity_update_address")
+async def update_address(order, new_address: dict) -> str:
+    effects[order["order_id"]].append(time.perf_counter())
+    return "updated"
+
+
+@fake("activity_get_order_state")
+async def get_order_state(order_id: str) -> dict:
+    state_checks["count"] += 1
+    return {"state": "validated"}
+
+
+ACTIVITIES = [order_received, order_validated, manual_review, risk_score, payment_charged, package_prepared,
+              carrier_dispatched, order_shipped, update_address, get_order_state]
+
+
+async def run_order(client: Client, verify_stage: bool, burst: int, latencies: list, overheads: list) -> None:
+    order_id = f"bench-{uuid.uuid4().hex[:8]}"
+    address = {"street": "1 Bench St", "city": "Boston", "state": "MA", "zip": "02118"}
+    handle = await client.start_workflow(
+        OrderWorkflow.run,
+        args=[order_id, address, [{"sku": "ABC", "qty": 1}], verify_stage],
+        id=order_id,
+        task_queue="order-tq",
+    )
+    await review_started[order_id].wait()
+    sent = time.perf_counter()
+    await asyncio.gather(*[handle.signal(OrderWorkflow.update_address, {**address, "zip": str(i)}) for i in range(burst)])
+    await handle.result()
+
+    latencies.extend(t - sent for t in effects[order_id])
+    if effects[order_id]:
+        overheads.append(effects[order_id][0] - review_done[order_id])
+
+
+async def main(target: str | None, orders: int, burst: int) -> None:
+    async with temporal_client(target) as client:
+        rows = []
+        async with Worker(client, task_queue="order-tq", workflows=[OrderWorkflow], activities=ACTIVITIES), \
+                Worker(client, task_queue="shipping-tq", workflows=[ShippingWorkflow], activities=ACTIVITIES):
+            for label, verify_stage in [("DB lookup per check (before)", True), ("workflow stage (after)", False)]:
+                latencies: list[float] = []
+                overheads: list[float] = []
+                state_checks["count"] = 0
+                await asyncio.gather(*[run_order(client, verify_stage, burst, latencies, overheads) for _ in range(orders)])
+                rows.append([label, len(latencies), state_checks["count"],
+                             pct(overheads, 0.5), pct(overheads, 0.95),
+                             pct(latencies, 0.5), pct(latencies, 0.95)])
+
+    print_table(f"{orders} orders x bursts of {burst} update_address signals during a {REVIEW_SECONDS}s manual review",
+                rows, ["Stage source", "signals applied", "state lookups", "check overhead p50 ms",
+                       "check overhead p95 ms", "signal->effect p50 ms", "signal->effect p95 ms"])
+
+
+if __name__ == "__main__":
+    parser = bench_parser(__doc__, temporal=True)
+    parser.add_argument("--orders", type=int, default=20)
+    parser.add_argument("--burst", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.target, args.orders, args.burst))
@@ -0,0 +1,81 @@
+"""
+/update-address round trips: describe() + signal() vs a single workflow Update.
+
+Runs the real OrderWorkflow against the fake activities from
+bench_signal_latency. While each order sits in manual review, the client
+changes its address once each way. "response" is what the API caller waits
+for; "outcome known" is when the caller can tell the address was applied.
+The signal path returns after two RPCs without knowing (the effect is taken
+from the fake activity's timestamp); the Update returns once the handler has
+applied the change, or at once when the validator rejects it.
+
+Needs a Temporal server: either pass --target, or let the test environment
+download and start a local dev server.
+
+    python -m tests.bench_update_latency --orders 50
+"""
+import asyncio
+import time
+import uuid
+from temporalio.client import Client, WorkflowUpdateFailedError
+from temporalio.worker import Worker
+from app.workflows.order_workflow import OrderWorkflow
+from app.workflows.shipping_workflow import ShippingWorkflow
+from tests.bench_common import bench_parser, pct, print_table, temporal_client
+from tests.bench_signal_latency import ACTIVITIES, effects, review_started
+
+ADDRESS = {"street": "1 Bench St", "city": "Boston", "state": "MA", "zip": "02118"}
+
+
+async def run_order(client: Client, results: dict) -> None:
+    order_id = f"bench-{uuid.uuid4().hex[:8]}"
+    handle = await client.start_workflow(
+        OrderWorkflow.run,
+        args=[order_id, ADDRESS, [{"sku": "ABC", "qty": 1}]],
+        id=order_id,
+        task_queue="order-tq",
+    )
+    await review_started[order_id].wait()
+
+    # Before: existence check, then fire-and-forget signal
+    sent = time.perf_counter()
+    await handle.describe()
+    await handle.signal(OrderWorkflow.update_address, {**ADDRESS, "zip": "1"})
+    results["signal_response"].append(time.perf_counter() - sent)
+    while not effects[order_id]:
+        await asyncio.sleep(0.005)
+    results["signal_outcome"].append(effects[order_id][0] - sent)
+
+    # After: one Update that returns the applied outcome
+    sent = time.perf_counter()
+    try:
+        await handle.execute_update(OrderWorkflow.change_address, {**ADDRESS, "zip": "2"})
+    except WorkflowUpdateFailedError:
+        results["rejected"] += 1
+    results["update_response"].append(time.perf_counter() - sent)
+    await handle.result()
+
+
+async def main(target: str | None, orders: int) -> None:
+    async with temporal_client(target) as client:
+        results = {"signal_response": [], "signal_outcome": [], "update_response": [], "rejected": 0}
+        async with Worker(client, task_queue="order-tq", workflows=[OrderWorkflow], activities=ACTIVITIES), \
+                Worker(client, task_queue="shipping-tq", workflows=[ShippingWorkflow], activities=ACTIVITIES):
+            await asyncio.gather(*[run_order(client, results) for _ in range(orders)])
+
+    rows = [
+        ["describe + signal (before)", 2, pct(results["signal_response"], 0.5), pct(results["signal_response"], 0.95),
+         pct(results["signal_outcome"], 0.5), pct(results["signal_outcome"], 0.95)],
+        ["Update (after)", 1, pct(results["update_response"], 0.5), pct(results["update_response"], 0.95),
+         pct(results["update_response"], 0.5), pct(results["update_response"], 0.95)],
+    ]
+    print_table(f"{orders} orders, one address change each way during manual review "
+                f"({results['rejected']} updates rejected)",
+                rows, ["Path", "RPCs", "response p50 ms", "response p95 ms", "outcome known p50 ms", "outcome known p95 ms"])
+
+
+if __name__ == "__main__":
+    parser = bench_parser(__doc__, temporal=True)
+    parser.add_argument("--orders", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.target, args.orders))
@@ -0,0 +1,71 @@
+"""
+Worker startup time and memory footprint.
+
+Each worker module is imported in a fresh interpreter and its queue's activities
+are loaded the way build_worker() loads them. Elapsed time, peak RSS and the
+number of loaded modules are reported after the import and after the load.
+Running it against an older tree gives the before/after comparison. No
+Temporal server is needed.
+
+    python -m tests.bench_worker_footprint --repeats 5
+"""
+import json
+import statistics
+import subprocess
+import sys
+from tests.bench_common import bench_parser, print_table
+
+STARTUP = """
+import importlib, json, resource, sys, time
+start = time.perf_counter()
+module = importlib.import_module(sys.argv[1])
+imported = time.perf_counter()
+imported_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+imported_modules = len(sys.modules)
+try:
+    from app.workers.registry import load_activities
+    registered = len(load_activities(module.TASK_QUEUE))
+except ImportError:
+    registered = None
+print(json.dumps({
+    "import_s": imported - start,
+    "total_s": time.perf_counter() - start,
+    "import_rss_mb": imported_rss,
+    "import_modules": imported_modules,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "modules": len(sys.modules),
+    "numpy": "numpy" in sys.modules,
+    "activities": registered,
+}))
+"""
+
+WORKERS = ["app.workers.order_worker", "app.workers.shipping_worker", "app.workers.returns_worker"]
+
+
+def measure(module: str, repeats: int) -> list:
+    samples = [
+        json.loads(subprocess.run(
+            [sys.executable, "-c", STARTUP, module], capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1])
+        for _ in range(repeats)
+    ]
+    return [module.rsplit(".", 1)[1],
+            round(statistics.median(s["import_s"] for s in samples) * 1000),
+            round(statistics.median(s["total_s"] for s in samples) * 1000),
+            round(statistics.median(s["import_rss_mb"] for s in samples), 1),
+            round(statistics.median(s["rss_mb"] for s in samples), 1),
+            samples[0]["import_modules"], samples[0]["modules"], samples[0]["numpy"], samples[0]["activities"]]
+
+
+def main(repeats: int) -> None:
+    print_table(f"Worker startup in a fresh interpreter (median of {repeats})",
+                [measure(module, repeats) for module in WORKERS],
+                ["Worker", "import ms", "ready ms", "import RSS MB", "ready RSS MB",
+                 "import modules", "ready modules", "numpy", "activities"])
+
+
+if __name__ == "__main__":
+    parser = bench_parser(__doc__)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    main(args.repeats)
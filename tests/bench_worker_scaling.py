@@ -0,0 +1,107 @@
+"""
+Worker throughput as the supervisor scales one task queue from 1 to N processes.
+
+For each process count, WorkerSupervisor starts that many worker processes on
+a bench queue (this module is their worker module), then --workflows
+workflows are started at once and timed to completion. Each workflow runs
+--steps activities that burn --cpu-ms of CPU on the worker's event loop, the
+way hedged stubs and risk scoring do, so a single process tops out at one
+core. The processes are started with "spawn" because the bench's own Temporal
+client is already running in the parent.
+
+Needs a Temporal server: either pass --target, or let the test environment
+download and start a local dev server.
+
+    python -m tests.bench_worker_scaling --max-processes 4 --workflows 400
+"""
+import asyncio
+import hashlib
+import os
+import time
+import uuid
+from datetime import timedelta
+from temporalio import activity, workflow
+from temporalio.client import Client
+from temporalio.worker import UnsandboxedWorkflowRunner, Worker
+from tests.bench_common import bench_parser, print_table, temporal_client
+
+TASK_QUEUE = "bench-scale-tq"
+WORKER_NAME = "bench-scale-worker"
+CPU_MS = float(os.getenv("BENCH_CPU_MS", "5"))
+
+
+def status_extra() -> None:
+    return None
+
+
+@activity.defn
+async def burn_cpu(step: int) -> int:
+    # Blocks the worker's loop on purpose, like CPU-bound work in an async activity
+    deadline = time.perf_counter() + CPU_MS / 1000
+    rounds = 0
+    while time.perf_counter() < deadline:
+        hashlib.sha256(str(rounds).encode()).digest()
+        rounds += 1
+    return rounds
+
+
+@workflow.defn
+class ScaleBenchWorkflow:
+    @workflow.run
+    async def run(self, steps: int) -> int:
+        total = 0
+        for step in range(steps):
+            total += await workflow.execute_activity(burn_cpu, step, start_to_close_timeout=timedelta(seconds=30))
+        return total
+
+
+def build_worker(client: Client, **options) -> Worker:
+    return Worker(client, task_queue=TASK_QUEUE, workflows=[ScaleBenchWorkflow], activities=[burn_cpu],
+                  workflow_runner=UnsandboxedWorkflowRunner(), max_concurrent_activities=100, **options)
+
+
+async def drive(client: Client, workflows: int, steps: int) -> float:
+    start = time.perf_counter()
+    handles = await asyncio.gather(*[
+        client.start_workflow(ScaleBenchWorkflow.run, steps, id=f"scale-{uuid.uuid4().hex[:10]}", task_queue=TASK_QUEUE)
+        for _ in range(workflows)
+    ])
+    await asyncio.gather(*[handle.result() for handle in handles])
+    return time.perf_counter() - start
+
+
+async def main(target: str | None, max_processes: int, workflows: int, steps: int) -> None:
+    async with temporal_client(target) as client:
+        # Children read these when the supervisor module and this module are imported in them
+        os.environ["TEMPORAL_ADDRESS"] = client.service_client.config.target_host
+        os.environ["BENCH_CPU_MS"] = str(CPU_MS)
+
+        from app.workers.supervisor import WorkerSupervisor
+
+        rows, baseline = [], None
+        for n in range(1, max_processes + 1):
+            supervisor = WorkerSupervisor({TASK_QUEUE: n}, modules={TASK_QUEUE: "tests.bench_worker_scaling"},
+                                          start_method="spawn", drain_seconds=5)
+            supervisor.start()
+            try:
+                await drive(client, min(workflows, 20), 1)  # warm up: every process connected and polling
+                elapsed = await drive(client, workflows, steps)
+            finally:
+                await asyncio.to_thread(supervisor.stop)
+            rate = workflows / elapsed
+            baseline = baseline or rate
+            rows.append([n, round(elapsed, 2), round(rate), round(workflows * steps / elapsed), f"{rate / baseline:.2f}x"])
+
+    print_table(f"{workflows} workflows x {steps} activities of {CPU_MS}ms CPU, {os.cpu_count()} cores",
+                rows, ["processes", "seconds", "workflows/s", "activities/s", "speedup"])
+
+
+if __name__ == "__main__":
+    parser = bench_parser(__doc__, temporal=True)
+    parser.add_argument("--max-processes", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--workflows", type=int, default=400)
+    parser.add_argument("--steps", type=int, default=3)
+    parser.add_argument("--cpu-ms", type=float, default=CPU_MS)
+    args = parser.parse_args()
+    CPU_MS = args.cpu_ms
+    asyncio.run(main(args.target, args.max_processes, args.workflows, args.steps))
@@ -0,0 +1,107 @@
+"""
+Workflow sandbox cost: per-run instance creation and worker cold start.
+
+Every workflow run a worker picks up (and every replay after the run is evicted
+from the cache) gets a fresh sandbox, which re-imports the workflow module and
+everything it imports that isn't passed through. runner.prepare_workflow() does
+exactly that work, so it is timed here per workflow class, as CPU and wall time,
+with the default restrictions and with app.workers.sandbox's passthrough list.
+
+Cold start runs each worker module's import plus workflow validation (what
+Worker() does before polling) in a fresh interpreter and reports the time and
+how many modules were loaded. No Temporal server is needed.
+
+    python -m tests.bench_workflow_sandbox --runs 50 --cold 5
+"""
+import asyncio
+import json
+import statistics
+import subprocess
+import sys
+import time
+from temporalio.worker.workflow_sandbox import SandboxedWorkflowRunner
+from tests.bench_common import bench_parser, print_table
+
+COLD_START = """
+import asyncio, json, sys, time
+start = time.perf_counter()
+import importlib
+from temporalio.worker.workflow_sandbox import SandboxedWorkflowRunner
+module = importlib.import_module(sys.argv[1])
+imported = time.perf_counter()
+if sys.argv[2] == "passthrough":
+    from app.workers.sandbox import workflow_runner
+    runner = workflow_runner()
+else:
+    runner = SandboxedWorkflowRunner()
+async def validate():
+    import app.workflows
+    for workflow_class in json.loads(sys.argv[3]):
+        runner.prepare_workflow(getattr(app.workflows, workflow_class).__temporal_workflow_definition)
+asyncio.run(validate())
+print(json.dumps({"import_s": imported - start, "total_s": time.perf_counter() - start, "modules": len(sys.modules)}))
+"""
+
+WORKERS = {
+    "app.workers.order_worker": ["OrderWorkflow", "BulkOrderWorkflow"],
+    "app.workers.shipping_worker": ["ShippingWorkflow"],
+    "app.workers.returns_worker": ["ReturnWorkflow"],
+}
+
+
+def runners() -> dict:
+    from app.workers.sandbox import workflow_runner
+    return {"default": SandboxedWorkflowRunner(), "passthrough": workflow_runner()}
+
+
+async def per_run(runs: int) -> list:
+    # Instances attach to the running loop, as they do inside the worker
+    import app.workflows
+    rows = []
+    for workflow_class in ["OrderWorkflow", "ShippingWorkflow", "ReturnWorkflow", "BulkOrderWorkflow"]:
+        defn = getattr(app.workflows, workflow_class).__temporal_workflow_definition
+        row = [workflow_class]
+        for runner in runners().values():
+            runner.prepare_workflow(defn)  # warm the host-side imports
+            cpu, wall = [], []
+            for _ in range(runs):
+                c, w = time.process_time(), time.perf_counter()
+                runner.prepare_workflow(defn)
+                cpu.append(time.process_time() - c)
+                wall.append(time.perf_counter() - w)
+            row += [round(statistics.median(cpu) * 1000, 2), round(statistics.median(wall) * 1000, 2)]
+        rows.append(row)
+    return rows
+
+
+def cold_start(repeats: int) -> list:
+    rows = []
+    for module, workflow_classes in WORKERS.items():
+        for mode in runners():
+            samples = [
+                json.loads(subprocess.run(
+                    [sys.executable, "-c", COLD_START, module, mode, json.dumps(workflow_classes)],
+                    capture_output=True, text=True, check=True,
+                ).stdout.strip().splitlines()[-1])
+                for _ in range(repeats)
+            ]
+            rows.append([module.rsplit(".", 1)[1], mode,
+                         round(statistics.median(s["import_s"] for s in samples) * 1000),
+                         round(statistics.median(s["total_s"] for s in samples) * 1000),
+                         samples[0]["modules"]])
+    return rows
+
+
+def main(runs: int, repeats: int) -> None:
+    print_table(f"Sandboxed instance creation per workflow run (median of {runs})", asyncio.run(per_run(runs)),
+                ["Workflow", "default CPU ms", "default wall ms", "passthrough CPU ms", "passthrough wall ms"])
+    print_table(f"Worker cold start: import + workflow validation in a fresh interpreter (median of {repeats})",
+                cold_start(repeats), ["Worker", "runner", "import ms", "ready ms", "modules loaded"])
+
+
+if __name__ == "__main__":
+    parser = bench_parser(__doc__)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--cold", type=int, default=5)
+    args = parser.parse_args()
+    main(args.runs, args.cold)
@@ -0,0 +1,11 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def order_cache_channel(tmp_path, monkeypatch):
+    # Keep test commits, and any worker processes a test starts, off the real ./.hedge_status channel
+    path = str(tmp_path / "order-invalidations.log")
+    monkeypatch.setenv("ORDER_CACHE_CHANNEL", path)
+    from app.db import order_cache
+    monkeypatch.setattr(order_cache.order_cache, "channel", order_cache.InvalidationChannel(path))
+    return path
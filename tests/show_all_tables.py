@@ -1,53 +1,31 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from app.db.models import Order, Payment, Event
-from tabulate import tabulate
+"""
+Stream tables out of the configured database (DATABASE_URL) as NDJSON or CSV.
 
-engine = create_engine("sqlite:///orders.db")
-Session = sessionmaker(bind=engine)
-session = Session()
+    python -m tests.show_all_tables
+    python -m tests.show_all_tables --table events --format csv --since 2024-01-01
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+from app.db.export import EXPORT_FORMATS, EXPORT_TABLES
 
-def show_table(title, rows, headers):
-    print(f"\n🔹 {title}")
-    print(tabulate(rows, headers=headers, tablefmt="grid"))
 
-def show_orders():
-    orders = session.query(Order).all()
-    rows = [(
-        o.id,
-        o.state,
-        o.address_json,
-        o.created_at.isoformat() if o.created_at else None,
-        o.updated_at.isoformat() if o.updated_at else None
-    ) for o in orders]
-    headers = ["Order ID", "State", "Address", "Created At", "Updated At"]
-    show_table("Orders", rows, headers)
+async def main(args) -> None:
+    exporter, _ = EXPORT_FORMATS[args.format]
+    for table in args.table or list(EXPORT_TABLES):
+        print(f"\n🔹 {table}", file=sys.stderr)
+        async for chunk in exporter(table, order_id_from=args.order_id_from, order_id_to=args.order_id_to,
+                                    since=args.since, until=args.until):
+            sys.stdout.write(chunk)
 
-def show_payments():
-    payments = session.query(Payment).all()
-    rows = [(
-        p.payment_id,
-        p.order_id,
-        p.status,
-        p.amount,
-        p.created_at.isoformat() if p.created_at else None
-    ) for p in payments]
-    headers = ["Payment ID", "Order ID", "Status", "Amount", "Created At"]
-    show_table("Payments", rows, headers)
-
-def show_events():
-    events = session.query(Event).all()
-    rows = [(
-        e.id,
-        e.order_id,
-        e.type,
-        e.payload_json,
-        e.ts.isoformat() if e.ts else None
-    ) for e in events]
-    headers = ["Event ID", "Order ID", "Type", "Payload", "Timestamp"]
-    show_table("Events", rows, headers)
 
 if __name__ == "__main__":
-    show_payments()
-    show_events()
-    show_orders()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--table", action="append", choices=list(EXPORT_TABLES))
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="ndjson")
+    parser.add_argument("--order-id-from")
+    parser.add_argument("--order-id-to")
+    parser.add_argument("--since", type=datetime.fromisoformat)
+    parser.add_argument("--until", type=datetime.fromisoformat)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,41 @@
+import inspect
+import json
+import subprocess
+import sys
+import pytest
+from temporalio import activity
+from app.activities import activities, interfaces
+from app.workers.sandbox import workflow_runner
+from app.workflows import BulkOrderWorkflow, OrderWorkflow, ReturnWorkflow, ShippingWorkflow
+
+
+def activity_defs(module) -> dict:
+    return {
+        name: fn for name, fn in vars(module).items()
+        if callable(fn) and activity._Definition.from_callable(fn) is not None and fn.__module__ == module.__name__
+    }
+
+
+def test_interfaces_match_the_implementations():
+    implemented, declared = activity_defs(activities), activity_defs(interfaces)
+    assert set(declared) == set(implemented)
+    for name, fn in declared.items():
+        assert activity._Definition.from_callable(fn).name == activity._Definition.from_callable(implemented[name]).name
+        assert inspect.signature(fn) == inspect.signature(implemented[name]), name
+
+
+def test_workflow_modules_import_no_stubs_or_database():
+    loaded = subprocess.run(
+        [sys.executable, "-c", "import json, sys, app.workflows; print(json.dumps(sorted(sys.modules)))"],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    modules = json.loads(loaded.strip().splitlines()[-1])
+    heavy = [m for m in modules if m.split(".")[0] in ("sqlalchemy", "numpy") or m.startswith(("app.stubs", "app.db"))]
+    assert heavy == [] and "app.activities.activities" not in modules
+
+
+@pytest.mark.asyncio
+async def test_workflows_validate_under_the_worker_sandbox():
+    runner = workflow_runner()
+    for workflow_class in (OrderWorkflow, ShippingWorkflow, ReturnWorkflow, BulkOrderWorkflow):
+        runner.prepare_workflow(workflow_class.__temporal_workflow_definition)
@@ -0,0 +1,76 @@
+import json
+import logging
+import subprocess
+import sys
+import pytest
+from datetime import datetime
+from temporalio import workflow
+from app.activities import activities, execution, interfaces
+from app.activities.signals import SignalManager
+from app.types.order_types import Address, Item, OrderData
+from app.workers.registry import QUEUE_ACTIVITIES, load_activities
+from app.workflows.return_workflow import ReturnWorkflow
+from app.workflows.shipping_workflow import ShippingWorkflow
+
+
+@pytest.fixture
+def routed(monkeypatch):
+    calls = []
+
+    async def execute_activity(fn, *args, task_queue=None, **kwargs):
+        calls.append((fn.__name__, task_queue))
+        return {"state": "shipped"}
+
+    # Route every step through the task queue so the queue each one targets is visible
+    monkeypatch.setattr(execution, "LOCAL_ACTIVITY_STEPS", set())
+    monkeypatch.setattr(workflow, "execute_activity", execute_activity)
+    monkeypatch.setattr(workflow, "now", lambda: datetime(2024, 1, 1))
+    return calls
+
+
+def test_registry_loads_the_implementations():
+    for queue, names in QUEUE_ACTIVITIES.items():
+        loaded = load_activities(queue)
+        assert [fn.__name__ for fn in loaded] == names
+        assert all(fn.__module__ == activities.__name__ for fn in loaded)
+    served = {name for names in QUEUE_ACTIVITIES.values() for name in names}
+    # activity_fetch_order has no caller in workflow code
+    declared = {name for name in vars(interfaces) if name.startswith("activity_")}
+    assert served == declared - {"activity_fetch_order"}
+
+
+@pytest.mark.parametrize("worker", ["order_worker", "shipping_worker", "returns_worker"])
+def test_importing_a_worker_leaves_activities_unloaded(worker):
+    # Activities and the status sources behind status_extra() load with build_worker()/main(), not on import
+    loaded = subprocess.run(
+        [sys.executable, "-c", f"import json, sys, app.workers.{worker}; print(json.dumps(sorted(sys.modules)))"],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    modules = json.loads(loaded.strip().splitlines()[-1])
+    heavy = [m for m in modules if m.split(".")[0] in ("sqlalchemy", "numpy") or m.startswith(("app.stubs", "app.db"))]
+    assert heavy == [] and "app.activities.activities" not in modules
+
+
+@pytest.mark.asyncio
+async def test_return_workflow_stays_on_returns_queue(routed):
+    await ReturnWorkflow().run("order-1")
+    assert routed == [("activity_get_order_state", "returns-tq"), ("activity_refund_payment", "returns-tq")]
+    assert all(name in QUEUE_ACTIVITIES[queue] for name, queue in routed)
+
+
+@pytest.mark.asyncio
+async def test_shipping_signals_stay_on_shipping_queue(routed):
+    wf = ShippingWorkflow()
+    wf.order = OrderData("order-1", Address("1 Main St", "Boston", "MA", "02118"), [Item("ABC", 1)])
+    await wf._signals._handle_address_update(wf.order, {"street": "2 Main St"}, "charged")
+    await wf._signals._handle_cancel(wf.order, "charged")
+    assert [name for name, _ in routed] == ["activity_update_address", "activity_cancel_order", "activity_refund_payment"]
+    assert all(queue == "shipping-tq" and name in QUEUE_ACTIVITIES[queue] for name, queue in routed)
+
+
+@pytest.mark.asyncio
+async def test_signal_manager_defaults_to_order_queue(routed):
+    signals = SignalManager(None, logging.getLogger("test"))
+    order = OrderData("order-1", Address("1 Main St", "Boston", "MA", "02118"), [Item("ABC", 1)])
+    await signals._handle_address_update(order, {"street": "2 Main St"}, "validated")
+    assert routed == [("activity_update_address", "order-tq")]
@@ -3,13 +3,14 @@ import logging
 import random
 from datetime import datetime
 from temporalio.client import Client
+from app.types.converter import data_converter
 from app.workflows.order_workflow import OrderWorkflow, OrderData, Address, Item
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("test")
 
 async def run():
-    client = await Client.connect("localhost:7233")
+    client = await Client.connect("localhost:7233", data_converter=data_converter())
     order_id = f"test-order-{int(datetime.utcnow().timestamp())}"
     logger.info(f"Starting workflow with ID: {order_id}")
 
@@ -0,0 +1,129 @@
+import json
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from temporalio import workflow
+from app import main
+from app.db.event_sink import EventSink
+from app.db.init_db import init_db
+from app.db.models import Event, Order
+from app.db.session import build_async_engine
+from app.stubs import function_stubs
+from app.workflows.bulk_order_workflow import BulkOrderWorkflow
+
+ADDRESS = {"street": "1 Main St", "city": "Boston", "state": "MA", "zip": "02118"}
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'orders.db'}"
+    init_db(url)
+    engine = build_async_engine(url)
+    factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def no_flake():
+        return None
+
+    monkeypatch.setattr(function_stubs, "event_sink", EventSink(session_factory=factory, flush_ms=1))
+    monkeypatch.setattr(function_stubs, "flaky_call", no_flake)
+    yield factory
+    await engine.dispose()
+
+
+def make_orders(n: int, empty: set = frozenset()) -> list[dict]:
+    return [{"order_id": f"order-{i}", "address": ADDRESS, "items": [] if i in empty else [{"sku": "ABC", "qty": 1}]}
+            for i in range(n)]
+
+
+@pytest.mark.asyncio
+async def test_batch_is_received_and_validated_in_bulk_and_idempotent(session_factory):
+    orders = make_orders(5, empty={3})
+
+    assert await function_stubs.orders_received("bulk-1", orders) == [o["order_id"] for o in orders]
+    result = await function_stubs.orders_validated("bulk-1", orders)
+    assert result == {"validated": ["order-0", "order-1", "order-2", "order-4"], "invalid": ["order-3"]}
+
+    # A retried attempt gets the stored result and writes nothing twice
+    assert await function_stubs.orders_received("bulk-1", orders) == [o["order_id"] for o in orders]
+    assert await function_stubs.orders_validated("bulk-1", orders) == result
+
+    async with session_factory() as db:
+        states = dict((await db.execute(select(Order.id, Order.state))).all())
+        events = await db.scalar(select(func.count()).select_from(Event))
+    assert states["order-0"] == "validated" and states["order-3"] == "canceled"
+    assert events == 10
+
+
+@pytest.mark.asyncio
+async def test_orders_already_in_the_table_are_not_received_again(session_factory, monkeypatch):
+    await function_stubs.orders_received("bulk-1", make_orders(2))
+    assert await function_stubs.orders_received("bulk-2", make_orders(4)) == ["order-2", "order-3"]
+
+    # The workflow reports the ones left out
+    async def execute_activity(fn, *, args, **kwargs):
+        if fn.__name__ == "activity_orders_received":
+            return await function_stubs.orders_received(*args)
+        return {"validated": [], "invalid": []}
+
+    monkeypatch.setattr(workflow, "execute_activity", execute_activity)
+    result = await BulkOrderWorkflow().run("bulk-3", make_orders(5))
+    assert result["skipped_order_ids"] == ["order-0", "order-1", "order-2", "order-3"]
+    assert result["received"] == 1 and result["skipped"] == 4
+
+
+class FakeHandle:
+    def __init__(self, orders, existing):
+        self.orders = orders
+        self.existing = existing
+
+    async def result(self):
+        return {"invalid_order_ids": [],
+                "skipped_order_ids": [o["order_id"] for o in self.orders if o["order_id"] in self.existing]}
+
+
+class FakeClient:
+    def __init__(self, existing=frozenset()):
+        self.started = []
+        self.existing = existing
+
+    async def start_workflow(self, workflow, *, id, task_queue, args):
+        self.started.append((id, args[1]))
+        return FakeHandle(args[1], self.existing)
+
+
+class CountingIds:
+    def __init__(self):
+        self.value = 0
+
+    async def next_id(self) -> str:
+        self.value += 1
+        return f"order-{self.value}"
+
+
+@pytest.mark.asyncio
+async def test_stream_is_batched_into_bulk_workflows(monkeypatch):
+    monkeypatch.setattr(main, "order_ids", CountingIds())
+    lines = [json.dumps({"address": ADDRESS, "items": [{"sku": "ABC", "qty": i}]}) for i in range(1, 6)]
+    lines.insert(2, '{"address": "nowhere"}')
+    body = ("\n".join(lines) + "\n").encode()
+
+    async def chunks():
+        # Chunk boundaries fall mid-line
+        for i in range(0, len(body), 37):
+            yield body[i:i + 37]
+
+    client = FakeClient(existing={"order-2", "order-5"})
+    result = await main.start_orders_from_stream(client, chunks(), batch_size=2)
+
+    assert result["orders"] == 5
+    assert [b["orders"] for b in result["batches"]] == [2, 2, 1]
+    assert result["rejected"][0]["line"] == 3
+    assert [order["items"][0]["qty"] for _, orders in client.started for order in orders] == [1, 2, 3, 4, 5]
+    assert client.started[0][0] == "bulk-order-1"
+    assert result["skipped_order_ids"] == ["order-2", "order-5"]
+    assert [b["skipped_order_ids"] for b in result["batches"]] == [["order-2"], [], ["order-5"]]
+
+    # Without waiting the response comes back once the batches are started, so no ids are known yet
+    result = await main.start_orders_from_stream(FakeClient(), chunks(), batch_size=2, wait=False)
+    assert result["orders"] == 5 and "skipped_order_ids" not in result
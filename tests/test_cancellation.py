@@ -1,12 +1,13 @@
 import asyncio
 import random
 from temporalio.client import Client
+from app.types.converter import data_converter
 from app.workflows.order_workflow import OrderWorkflow, OrderData, Address, Item
 
 async def main():
     try:
         print("Connecting to Temporal...")
-        client = await Client.connect("localhost:7233")
+        client = await Client.connect("localhost:7233", data_converter=data_converter())
 
         # Construct dataclass inputs
         address = Address(
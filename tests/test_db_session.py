@@ -0,0 +1,34 @@
+import pytest
+from app.db.session import (
+    DB_MAX_OVERFLOW, DB_POOL_SIZE, SQLITE_ASYNC_POOL_SIZE, build_async_engine, build_engine, to_async_url, to_sync_url,
+)
+
+
+@pytest.mark.parametrize("url, sync_url, async_url", [
+    ("sqlite:///./orders.db", "sqlite+pysqlite:///./orders.db", "sqlite+aiosqlite:///./orders.db"),
+    ("sqlite+pysqlite:///./orders.db", "sqlite+pysqlite:///./orders.db", "sqlite+aiosqlite:///./orders.db"),
+    ("sqlite+aiosqlite:///:memory:", "sqlite+pysqlite:///:memory:", "sqlite+aiosqlite:///:memory:"),
+    ("postgresql://u:secret@db:5432/orders", "postgresql+psycopg2://u:secret@db:5432/orders",
+     "postgresql+asyncpg://u:secret@db:5432/orders"),
+    ("postgres://u:secret@db/orders", "postgresql+psycopg2://u:secret@db/orders", "postgresql+asyncpg://u:secret@db/orders"),
+    ("postgresql+psycopg://u:secret@db/orders", "postgresql+psycopg2://u:secret@db/orders",
+     "postgresql+asyncpg://u:secret@db/orders"),
+    ("postgresql+asyncpg://u:secret@db/orders", "postgresql+psycopg2://u:secret@db/orders",
+     "postgresql+asyncpg://u:secret@db/orders"),
+])
+def test_urls_get_the_driver_each_engine_needs(url, sync_url, async_url):
+    assert to_sync_url(url) == sync_url
+    assert to_async_url(url) == async_url
+
+
+def test_engines_build_from_any_url_form():
+    for url in ("sqlite+pysqlite:///:memory:", "sqlite+aiosqlite:///:memory:", "postgres://u:secret@db/orders"):
+        assert build_engine(url).dialect.is_async is False
+        assert build_async_engine(url).dialect.is_async is True
+
+
+def test_aiosqlite_gets_a_small_fixed_pool(tmp_path):
+    url = f"sqlite:///{tmp_path / 'orders.db'}"
+    sync_pool, async_pool = build_engine(url).pool, build_async_engine(url).pool
+    assert async_pool.size() == SQLITE_ASYNC_POOL_SIZE and async_pool._max_overflow == 0
+    assert sync_pool.size() == DB_POOL_SIZE and sync_pool._max_overflow == DB_MAX_OVERFLOW
@@ -0,0 +1,100 @@
+import asyncio
+import contextvars
+import pytest
+import pytest_asyncio
+from datetime import datetime
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app.db.event_sink import EventSink
+from app.db.init_db import init_db
+from app.db.models import Event, Order
+from app.db.session import build_async_engine
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    url = f"sqlite:///{tmp_path / 'orders.db'}"
+    init_db(url)
+    engine = build_async_engine(url)
+    yield async_sessionmaker(bind=engine, expire_on_commit=False)
+    await engine.dispose()
+
+
+async def count_events(session_factory) -> int:
+    async with session_factory() as db:
+        return await db.scalar(select(func.count()).select_from(Event))
+
+
+@pytest.mark.asyncio
+async def test_concurrent_events_are_group_committed_and_acked(session_factory):
+    sink = EventSink(session_factory=session_factory, flush_ms=20, max_batch=50)
+
+    await asyncio.gather(*[sink.log(f"order-{i}", "ORDER_RECEIVED") for i in range(200)])
+
+    # Every caller returned only after its row was committed
+    assert await count_events(session_factory) == 200
+    stats = sink.stats()
+    assert stats["units"] == 200
+    assert stats["flushes"] < 200
+    assert stats["batch_size_max"] <= 50
+
+
+@pytest.mark.asyncio
+async def test_failing_unit_only_fails_its_caller(session_factory):
+    sink = EventSink(session_factory=session_factory, flush_ms=20)
+
+    async def bad_unit(db):
+        db.add(Event(order_id="order-bad", type="BAD", payload_json={}, ts=datetime.utcnow()))
+        raise ValueError("Order not found")
+
+    results = await asyncio.gather(
+        sink.log("order-1", "ORDER_RECEIVED"),
+        sink.submit(bad_unit),
+        sink.log("order-2", "ORDER_RECEIVED"),
+        return_exceptions=True,
+    )
+
+    assert isinstance(results[1], ValueError)
+    assert results[0] is None and results[2] is None
+    assert await count_events(session_factory) == 2
+    assert sink.stats()["fallbacks"] == 1
+
+
+@pytest.mark.asyncio
+async def test_units_run_in_submitter_context_and_return_results(session_factory):
+    sink = EventSink(session_factory=session_factory, flush_ms=20)
+
+    async def submit(i):
+        request_id.set(f"req-{i}")
+
+        async def unit(db):
+            db.add(Order(id=f"order-{i}", state="received"))
+            return request_id.get()
+
+        return await sink.submit(unit)
+
+    assert await asyncio.gather(*[submit(i) for i in range(10)]) == [f"req-{i}" for i in range(10)]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_flush_task_fails_every_waiting_caller(session_factory):
+    sink = EventSink(session_factory=session_factory, flush_ms=0, max_batch=1)
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def slow_unit(db):
+        started.set()
+        await release.wait()
+
+    in_flush = asyncio.create_task(sink.submit(slow_unit))
+    await started.wait()
+    queued = [asyncio.create_task(sink.log(f"order-{i}", "ORDER_RECEIVED")) for i in range(3)]
+    await asyncio.sleep(0)
+    sink._task.cancel()
+
+    results = await asyncio.wait_for(asyncio.gather(in_flush, *queued, return_exceptions=True), 1)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    # The next submit starts a fresh flush task
+    await sink.log("order-9", "ORDER_RECEIVED")
+    assert await count_events(session_factory) == 1
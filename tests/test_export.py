@@ -0,0 +1,66 @@
+import csv
+import io
+import json
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app.db.export import export_csv, export_ndjson, iter_rows
+from app.db.init_db import init_db
+from app.db.models import Event, Order
+from app.db.session import build_async_engine
+
+START = datetime(2024, 1, 1)
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    url = f"sqlite:///{tmp_path / 'orders.db'}"
+    init_db(url)
+    engine = build_async_engine(url)
+    factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+    async with factory() as db:
+        db.add_all(Order(id=f"order-{i:03d}", state="received", address_json={"zip": str(i)},
+                         created_at=START + timedelta(minutes=i), updated_at=START) for i in range(250))
+        db.add_all(Event(order_id=f"order-{i % 50:03d}", type="ORDER_RECEIVED", payload_json={"n": i},
+                         ts=START + timedelta(seconds=i)) for i in range(250))
+        await db.commit()
+    yield factory
+    await engine.dispose()
+
+
+async def collect(table, session_factory, **filters):
+    return [row async for row in iter_rows(table, session_factory=session_factory, **filters)]
+
+
+@pytest.mark.asyncio
+async def test_keyset_pages_cover_table_once_in_key_order(session_factory):
+    rows = await collect("events", session_factory, page_size=7)
+
+    assert [r["id"] for r in rows] == list(range(1, 251))
+    assert rows[0]["payload_json"] == {"n": 0}
+    assert rows[0]["ts"] == START.isoformat()
+
+
+@pytest.mark.asyncio
+async def test_order_id_and_time_filters(session_factory):
+    rows = await collect("orders", session_factory, order_id_from="order-010", order_id_to="order-019", page_size=3)
+    assert [r["id"] for r in rows] == [f"order-{i:03d}" for i in range(10, 20)]
+
+    rows = await collect("events", session_factory, order_id_from="order-005", order_id_to="order-005",
+                         since=START + timedelta(seconds=100), until=START + timedelta(seconds=200))
+    assert [r["payload_json"]["n"] for r in rows] == [105, 155]
+
+
+@pytest.mark.asyncio
+async def test_ndjson_and_csv_formats(session_factory):
+    chunks = [c async for c in export_ndjson("orders", page_size=100, session_factory=session_factory)]
+    assert len(chunks) == 3
+    lines = "".join(chunks).splitlines()
+    assert len(lines) == 250
+    assert json.loads(lines[0])["address_json"] == {"zip": "0"}
+
+    text = "".join([c async for c in export_csv("orders", page_size=100, session_factory=session_factory)])
+    records = list(csv.DictReader(io.StringIO(text)))
+    assert len(records) == 250
+    assert json.loads(records[1]["address_json"]) == {"zip": "1"}
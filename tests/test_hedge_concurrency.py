@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import random
+import pytest
+from app.activities.hedge_state import (
+    HedgeBudget,
+    HedgePolicy,
+    LatencyHistogram,
+    current_hedge_id,
+    current_hedge_group,
+    elect_hedge_winner,
+    run_with_hedges,
+)
+
+logger = logging.getLogger("test")
+
+
+async def fake_stub(call_id: str, winners: dict) -> str:
+    hedge_id = current_hedge_id()
+    await asyncio.sleep(random.uniform(0, 0.02))
+    if not await elect_hedge_winner(hedge_id, call_id, logger):
+        return ""
+    winners.setdefault(call_id, []).append(hedge_id)
+    await asyncio.sleep(random.uniform(0, 0.005))
+    return f"{call_id}:{hedge_id}"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_hedged_calls_elect_one_winner_each():
+    winners: dict[str, list[int]] = {}
+    budget = HedgeBudget(ratio=10, burst=10_000)
+    call_ids = [f"order-{i}" for i in range(300)]
+
+    results = await asyncio.gather(*[
+        run_with_hedges(fake_stub, call_id, winners, policy=HedgePolicy(hedge_delay=0), budget=budget)
+        for call_id in call_ids
+    ])
+
+    assert sorted(winners) == sorted(call_ids)
+    for call_id, result in zip(call_ids, results):
+        assert len(winners[call_id]) == 1
+        assert result == f"{call_id}:{winners[call_id][0]}"
+
+
+@pytest.mark.asyncio
+async def test_elect_outside_hedge_group_always_wins():
+    assert current_hedge_id() is None
+    assert await elect_hedge_winner(None, "order-x", logger)
+
+
+async def timed_stub(latencies: list, launched: list) -> str:
+    hedge_id = current_hedge_id()
+    launched.append(current_hedge_group().launched)
+    await asyncio.sleep(latencies[hedge_id])
+    if not await elect_hedge_winner(hedge_id, "order-t", logger):
+        return ""
+    return f"hedge-{hedge_id}"
+
+
+@pytest.mark.asyncio
+async def test_fast_primary_launches_no_extra_hedges():
+    launched = []
+    policy = HedgePolicy(max_hedges=7, hedge_delay=0.2)
+    result = await run_with_hedges(timed_stub, [0.01] * 7, launched, policy=policy, budget=HedgeBudget())
+    assert result == "hedge-0"
+    assert launched == [1]
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_after_delay():
+    launched = []
+    policy = HedgePolicy(max_hedges=3, hedge_delay=0.02)
+    budget = HedgeBudget(ratio=10)
+    result = await run_with_hedges(timed_stub, [10, 10, 0.001], launched, policy=policy, budget=budget)
+    assert result == "hedge-2"
+    assert len(launched) == 3
+
+
+@pytest.mark.asyncio
+async def test_empty_budget_runs_unhedged():
+    launched = []
+    budget = HedgeBudget(ratio=0, burst=0, min_per_second=0)
+    policy = HedgePolicy(max_hedges=3, hedge_delay=0.01)
+    result = await run_with_hedges(timed_stub, [0.05, 0.001, 0.001], launched, policy=policy, budget=budget)
+    assert result == "hedge-0"
+    assert len(launched) == 1
+    snapshot = budget.snapshot()
+    assert snapshot["primary_calls"] == 1
+    assert snapshot["extra_hedges"] == 0
+    assert snapshot["denied_hedges"] == 1
+
+
+def test_budget_bounds_extra_hedges_to_ratio_of_primaries():
+    budget = HedgeBudget(ratio=0.1, burst=5, min_per_second=0)
+    budget.tokens = 0
+    granted = 0
+    for _ in range(100):
+        budget.record_primary()
+        granted += budget.try_acquire()
+    assert 9 <= granted <= 10
+
+
+@pytest.mark.asyncio
+async def test_sustained_slow_primaries_stay_within_hedge_ratio():
+    # Light traffic against a slow downstream: every call wants all its hedges, and the bucket alone would grant them
+    budget = HedgeBudget(ratio=0.1, burst=20, min_per_second=100)
+    policy = HedgePolicy(max_hedges=4, hedge_delay=0.001)
+    for _ in range(50):
+        await run_with_hedges(timed_stub, [0.01, 0.01, 0.01, 0.01], [], policy=policy, budget=budget)
+        snapshot = budget.snapshot()
+        assert snapshot["extra_hedges"] <= 0.1 * snapshot["primary_calls"] + 1
+    assert snapshot["primary_calls"] == 50
+    assert 1 <= snapshot["extra_hedges"] <= 5
+    assert snapshot["denied_hedges"] > 0
+
+
+def test_latency_histogram_percentiles():
+    hist = LatencyHistogram(window=100)
+    for _ in range(90):
+        hist.observe(0.005)
+    for _ in range(10):
+        hist.observe(0.5)
+    assert hist.percentile(50) < 0.01
+    assert hist.percentile(95) >= 0.5
+
+    # Old samples roll out of the window
+    for _ in range(100):
+        hist.observe(0.005)
+    assert hist.percentile(95) < 0.01
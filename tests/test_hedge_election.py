@@ -0,0 +1,62 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from app.db.models import Base, HedgeElection
+from app.activities.hedge_state import claim_election, current_hedge_group, run_with_hedges
+
+
+@pytest_asyncio.fixture
+async def sessions(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'orders.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    # Two factories on one file stand in for two worker processes
+    yield async_sessionmaker(bind=engine), async_sessionmaker(bind=engine)
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_first_commit_wins_and_later_claims_see_its_result(sessions):
+    worker_a, worker_b = sessions
+
+    async with worker_a() as db:
+        assert await claim_election(db, "order-1", "payment_charged", {"amount": 10}) == (True, {"amount": 10})
+        await db.commit()
+
+    async with worker_b() as db:
+        won, result = await claim_election(db, "order-1", "payment_charged", {"amount": 99})
+        assert not won
+        assert result == {"amount": 10}
+        await db.rollback()
+
+    async with worker_a() as db:
+        assert await db.scalar(select(func.count()).select_from(HedgeElection)) == 1
+
+
+@pytest.mark.asyncio
+async def test_rolled_back_claim_does_not_block_retry(sessions):
+    worker_a, worker_b = sessions
+
+    async with worker_a() as db:
+        assert (await claim_election(db, "order-1", "order_shipped", "Shipped"))[0]
+        await db.rollback()
+
+    async with worker_b() as db:
+        assert await claim_election(db, "order-1", "order_shipped", "Shipped") == (True, "Shipped")
+        await db.commit()
+
+
+@pytest.mark.asyncio
+async def test_attempt_scopes_elect_independently(sessions):
+    worker_a, _ = sessions
+
+    async def stub(amount):
+        async with worker_a() as db:
+            won, result = await claim_election(db, "order-1", "payment_charged", {"amount": amount})
+            await db.commit()
+        return {**result, "scope": current_hedge_group().attempt_scope}
+
+    assert await run_with_hedges(stub, 1, attempt_scope="run-a") == {"amount": 1, "scope": "run-a"}
+    assert await run_with_hedges(stub, 2, attempt_scope="run-a") == {"amount": 1, "scope": "run-a"}
+    assert await run_with_hedges(stub, 3, attempt_scope="run-b") == {"amount": 3, "scope": "run-b"}
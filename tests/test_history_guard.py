@@ -0,0 +1,126 @@
+import pytest
+from datetime import datetime
+from types import SimpleNamespace
+from temporalio import workflow
+from app.types.order_types import Address, Item, OrderData
+from app.workflows import history_guard
+from app.workflows.order_workflow import OrderWorkflow
+from app.workflows.stage_graph import Stage, StageGraph
+
+
+class Continued(Exception):
+    def __init__(self, args):
+        self.args_ = args
+
+
+@pytest.fixture
+def history(monkeypatch):
+    usage = {"events": 10, "bytes": 1000, "suggested": False}
+    info = SimpleNamespace(
+        get_current_history_length=lambda: usage["events"],
+        get_current_history_size=lambda: usage["bytes"],
+        is_continue_as_new_suggested=lambda: usage["suggested"],
+    )
+
+    async def wait_condition(fn, **kwargs):
+        assert fn()
+
+    def continue_as_new(*, args):
+        raise Continued(args)
+
+    monkeypatch.setattr(workflow, "info", lambda: info)
+    monkeypatch.setattr(workflow, "now", lambda: datetime(2024, 1, 1))
+    monkeypatch.setattr(workflow, "wait_condition", wait_condition)
+    monkeypatch.setattr(workflow, "all_handlers_finished", lambda: True)
+    monkeypatch.setattr(workflow, "continue_as_new", continue_as_new)
+    monkeypatch.setattr(workflow, "patched", lambda patch_id: True)
+    return usage
+
+
+def test_limit_reason_covers_events_bytes_and_server_hint(history):
+    assert history_guard.history_limit_reason(max_events=100, max_bytes=10_000) is None
+    history["events"] = 100
+    assert "events" in history_guard.history_limit_reason(max_events=100, max_bytes=10_000)
+    history.update(events=10, bytes=10_000)
+    assert "bytes" in history_guard.history_limit_reason(max_events=100, max_bytes=10_000)
+    history.update(bytes=0, suggested=True)
+    assert history_guard.history_limit_reason(max_events=100, max_bytes=10_000) == "suggested by server"
+
+
+async def noop():
+    return None
+
+
+async def never_stop() -> bool:
+    return False
+
+
+async def stop_before_payment(graph) -> bool:
+    return graph.done("validated")
+
+
+def order_graph(resume=None) -> StageGraph:
+    return StageGraph([
+        Stage("received", noop),
+        Stage("validated", noop, after=("received",)),
+        Stage("payment", noop, after=("validated",)),
+    ], resume=resume)
+
+
+@pytest.mark.asyncio
+async def test_order_continues_as_new_with_stage_and_pending_signals(history):
+    wf = OrderWorkflow()
+    wf.order = OrderData("order-1", Address("1 Main St", "Boston", "MA", "02118"), [Item("ABC", 1)])
+    wf._initial_address = {"street": "1 Main St", "city": "Boston", "state": "MA", "zip": "02118"}
+    wf._start_time = datetime(2024, 1, 1)
+    wf.advance("validated")
+    wf.risk = {"score": 0.1, "review": False}
+    wf._graph = order_graph()
+    await wf._graph.run(lambda name, result: None, lambda: stop_before_payment(wf._graph))
+    for i in range(3):
+        await wf.update_address({"street": f"{i} Main St"})
+
+    await wf._continue_if_history_large()  # under the limit: nothing happens
+    history["events"] = history_guard.HISTORY_MAX_EVENTS
+    with pytest.raises(Continued) as continued:
+        await wf._continue_if_history_large()
+
+    args = continued.value.args_
+    carry = args[-1]
+    assert args[0] == "order-1" and carry["stage"] == "validated" and carry["runs"] == 1
+    assert carry["signals"]["queue"] == [["update_address", {"street": "2 Main St"}]]
+
+    resumed = OrderWorkflow()
+    resumed.order = OrderData("order-1", Address(**args[1]), [Item(**item) for item in args[2]])
+    resumed._resume(carry)
+    assert resumed.stage == "validated" and resumed.risk == wf.risk
+    assert resumed._signals.pending() == ["update_address"] and resumed._signal_flag
+    assert resumed.status()["continued_as_new"] == 1
+
+    graph = order_graph(resume=carry["graph"])
+    assert graph.done("received") and graph.done("validated") and not graph.done("payment")
+
+
+@pytest.mark.asyncio
+async def test_graph_rests_only_with_nothing_in_flight(history):
+    rests = []
+
+    async def at_rest():
+        rests.append(sorted(graph.finished))
+
+    graph = order_graph()
+    assert await graph.run(lambda name, result: None, never_stop, at_rest)
+    assert rests == [[], ["received"], ["received", "validated"]]
+
+
+@pytest.mark.asyncio
+async def test_no_continue_as_new_before_the_first_stage(history, monkeypatch):
+    wf = OrderWorkflow()
+    wf.order = OrderData("order-1", Address("1 Main St", "Boston", "MA", "02118"), [Item("ABC", 1)])
+    wf.advance("started")
+    # A change_address Update is parked until the stage leaves "started"
+    monkeypatch.setattr(workflow, "all_handlers_finished", lambda: False)
+    history["events"] = history_guard.HISTORY_MAX_EVENTS
+
+    await wf._continue_if_history_large()  # returns instead of waiting on the parked handler
+    assert wf.stage == "started"
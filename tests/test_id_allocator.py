@@ -0,0 +1,51 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app.db.init_db import init_db
+from app.db.id_allocator import KSortableIdAllocator, SequenceIdAllocator
+from app.db.session import build_async_engine
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    url = f"sqlite:///{tmp_path / 'orders.db'}"
+    init_db(url, revision="0003")
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO orders (id, state) VALUES ('order-41', 'shipped'), ('Test-1234', 'shipped')"))
+    engine.dispose()
+    init_db(url)
+
+    async_engine = build_async_engine(url)
+    yield async_sessionmaker(bind=async_engine)
+    await async_engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_sequence_continues_after_existing_orders(session_factory):
+    allocator = SequenceIdAllocator(block_size=10, session_factory=session_factory)
+    assert await allocator.next_id() == "order-42"
+    assert await allocator.next_id() == "order-43"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_allocators_never_collide(session_factory):
+    # Two allocators stand in for two API processes leasing from one table
+    a = SequenceIdAllocator(block_size=7, session_factory=session_factory)
+    b = SequenceIdAllocator(block_size=7, session_factory=session_factory)
+
+    ids = await asyncio.gather(*[(a if i % 2 else b).next_id() for i in range(500)])
+
+    assert len(set(ids)) == 500
+
+
+@pytest.mark.asyncio
+async def test_ksortable_ids_are_unique_and_time_ordered():
+    allocator = KSortableIdAllocator()
+    ids = [await allocator.next_id() for _ in range(1000)]
+
+    assert len(set(ids)) == 1000
+    assert ids == sorted(ids)
+    assert all(len(i) == len("order-") + 26 for i in ids)
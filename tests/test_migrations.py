@@ -0,0 +1,32 @@
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, inspect, text
+from app.db.init_db import init_db
+from app.db.models import Base
+
+
+def test_migrations_match_models(tmp_path):
+    url = f"sqlite:///{tmp_path / 'orders.db'}"
+    init_db(url)
+
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        assert compare_metadata(MigrationContext.configure(conn), Base.metadata) == []
+    engine.dispose()
+
+
+def test_pre_migration_database_is_stamped_and_upgraded(tmp_path):
+    url = f"sqlite:///{tmp_path / 'orders.db'}"
+    engine = create_engine(url)
+    # Schema as the old Base.metadata.create_all built it, without indexes
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE orders (id VARCHAR PRIMARY KEY, state VARCHAR, address_json JSON, created_at DATETIME, updated_at DATETIME)"))
+        conn.execute(text("CREATE TABLE payments (payment_id VARCHAR PRIMARY KEY, order_id VARCHAR REFERENCES orders (id), status VARCHAR, amount FLOAT, created_at DATETIME)"))
+        conn.execute(text("CREATE TABLE events (id INTEGER PRIMARY KEY, order_id VARCHAR, type VARCHAR, payload_json JSON, ts DATETIME)"))
+
+    init_db(url)
+
+    indexes = {ix["name"] for ix in inspect(engine).get_indexes("events")}
+    assert "ix_events_order_id_ts" in indexes
+    assert inspect(engine).has_table("hedge_elections")
+    engine.dispose()
@@ -0,0 +1,141 @@
+import asyncio
+import os
+import subprocess
+import sys
+import pytest
+import pytest_asyncio
+from datetime import datetime
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app.db import order_cache as order_cache_module
+from app.db.init_db import init_db
+from app.db.models import Order
+from app.db.order_cache import InvalidationChannel, OrderStateCache
+from app.db.session import AppSession, build_async_engine
+
+
+@pytest.fixture
+def channel_path(tmp_path):
+    return str(tmp_path / "invalidations.log")
+
+
+@pytest.fixture
+def cache(channel_path, monkeypatch):
+    # Route the commit hooks at a private cache and channel
+    cache = OrderStateCache(channel=InvalidationChannel(channel_path), poll_interval=0)
+    monkeypatch.setattr(order_cache_module, "order_cache", cache)
+    return cache
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    url = f"sqlite:///{tmp_path / 'orders.db'}"
+    init_db(url)
+    engine = build_async_engine(url)
+    yield async_sessionmaker(bind=engine, expire_on_commit=False, sync_session_class=AppSession)
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_commits_write_through_and_rollbacks_do_not(cache, session_factory):
+    async with session_factory() as db:
+        db.add(Order(id="order-1", state="received", address_json={}, updated_at=datetime.utcnow()))
+        await db.commit()
+    assert cache.get("order-1") == {"state": "received"}
+
+    async with session_factory() as db:
+        (await db.get(Order, "order-1")).state = "validated"
+        await db.flush()
+        await db.rollback()
+    assert cache.get("order-1") == {"state": "received"}
+
+    async with session_factory() as db:
+        (await db.get(Order, "order-1")).state = "validated"
+        await db.commit()
+    assert cache.get("order-1") == {"state": "validated"}
+    assert cache.stats()["hit_rate"] == 1.0
+
+
+@pytest.mark.asyncio
+async def test_other_sessions_leave_the_cache_alone(cache, channel_path, tmp_path):
+    url = f"sqlite:///{tmp_path / 'scratch.db'}"
+    init_db(url)
+    engine = build_async_engine(url)
+    async with async_sessionmaker(bind=engine)() as db:
+        db.add(Order(id="order-1", state="received", address_json={}, updated_at=datetime.utcnow()))
+        await db.commit()
+    await engine.dispose()
+    await asyncio.sleep(0.05)
+    assert cache.get("order-1") is None
+    assert cache.stats()["local_updates"] == 0
+    assert not os.path.exists(channel_path)
+
+
+def test_read_started_before_a_write_is_not_cached(cache):
+    assert cache.get("order-1") is None
+    generation = cache.generation("order-1")
+
+    cache.apply_commit({"order-1": {"state": "canceled"}})
+    cache.put("order-1", {"state": "received"}, generation)
+
+    assert cache.get("order-1") == {"state": "canceled"}
+
+
+def test_other_process_commit_invalidates(cache, channel_path):
+    cache.get("order-1")
+    cache.put("order-1", {"state": "received"})
+
+    subprocess.run([sys.executable, "-c",
+                    f"from app.db.order_cache import InvalidationChannel; InvalidationChannel({channel_path!r}).publish(['order-1'])"],
+                   check=True)
+
+    assert cache.get("order-1") is None
+    stats = cache.stats()
+    assert stats["remote_invalidations"] == 1
+    assert stats["remote_lag_ms_p95"] is not None
+
+
+def test_truncated_channel_clears_everything(cache, channel_path):
+    cache.get("order-1")
+    cache.apply_commit({"order-1": {"state": "received"}, "order-2": {"state": "received"}})
+    assert cache.get("order-1") == {"state": "received"}
+    open(channel_path, "w").close()
+
+    assert cache.get("order-2") is None
+    assert cache.stats()["resets"] == 1
+
+
+def test_lru_and_ttl(channel_path):
+    cache = OrderStateCache(max_size=2, ttl=0, channel=InvalidationChannel(channel_path))
+    for i in range(3):
+        cache.put(f"order-{i}", {"state": "received"})
+    assert cache.stats()["size"] == 2
+    assert cache.get("order-0") is None
+
+    cache.ttl = -1
+    assert cache.get("order-2") is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_unreadable_lines_reset_instead_of_raising(cache, channel_path):
+    cache.get("order-1")
+    cache.put("order-1", {"state": "received"})
+    with open(channel_path, "a") as f:
+        # A torn line from a read racing a truncation, then a good one from another process
+        f.write("3.5e 123\nnot-a-time 1 order-1\n1.0 1 order-2\n")
+
+    assert cache.get("order-1") is None
+    assert cache.stats()["resets"] == 1
+    assert cache.stats()["remote_invalidations"] == 1
+
+
+@pytest.mark.asyncio
+async def test_commits_on_the_loop_publish_once_off_the_loop(cache, channel_path, monkeypatch):
+    published = []
+    monkeypatch.setattr(cache.channel, "publish", lambda order_ids: published.append(sorted(order_ids)))
+
+    cache.apply_commit({"order-1": {"state": "received"}})
+    cache.apply_commit({"order-2": {"state": "received"}})
+    assert published == [] and cache.get("order-1") == {"state": "received"}
+
+    await asyncio.sleep(0.05)
+    assert published == [["order-1", "order-2"]]
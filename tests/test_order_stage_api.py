@@ -0,0 +1,99 @@
+import pytest
+from temporalio.client import WorkflowExecutionStatus, WorkflowQueryRejectedError, WorkflowUpdateFailedError
+from temporalio.exceptions import ApplicationError
+from app import main
+
+
+class FakeHandle:
+    def __init__(self, statuses, workflow_id):
+        self.statuses = statuses
+        self.workflow_id = workflow_id
+
+    async def query(self, query, **kwargs):
+        status = self.statuses.get(self.workflow_id)
+        if status is None:
+            raise WorkflowQueryRejectedError(WorkflowExecutionStatus.COMPLETED)
+        return dict(status)
+
+    async def execute_update(self, update, *args):
+        outcome = self.statuses.get(self.workflow_id)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return {"applied": True, "status": f"{update.__name__} applied"}
+
+
+class FakeClient:
+    def __init__(self, statuses):
+        self.statuses = statuses
+
+    def get_workflow_handle(self, workflow_id):
+        return FakeHandle(self.statuses, workflow_id)
+
+
+@pytest.fixture
+def db_reads(monkeypatch):
+    reads = []
+
+    async def get_order_state(order_id):
+        reads.append(order_id)
+        return {"state": "shipped"}
+
+    monkeypatch.setattr(main, "activity_get_order_state", get_order_state)
+    return reads
+
+
+@pytest.mark.asyncio
+async def test_running_orders_are_served_by_query(monkeypatch, db_reads):
+    monkeypatch.setattr(main.app.state, "client", FakeClient({
+        "order-1": {"stage": "validated", "stage_times": {}, "pending_signals": ["cancel"], "shipping_workflow_id": None},
+        "order-2": {"stage": "shipping", "stage_times": {}, "pending_signals": [], "shipping_workflow_id": "shipping-order-2"},
+        "shipping-order-2": {"stage": "dispatched", "stage_times": {}, "pending_signals": []},
+    }))
+
+    first = await main.read_order_stage("order-1")
+    assert (first["stage"], first["source"], first["pending_signals"]) == ("validated", "workflow", ["cancel"])
+
+    second = await main.read_order_stage("order-2")
+    assert second["stage"] == "dispatched"
+    assert second["shipping"]["stage"] == "dispatched"
+    assert db_reads == []
+
+
+@pytest.mark.asyncio
+async def test_speculative_shipping_child_does_not_rewind_the_stage(monkeypatch, db_reads):
+    # The child was started at "validated" and is still waiting for payment_settled
+    monkeypatch.setattr(main.app.state, "client", FakeClient({
+        "order-1": {"stage": "charged", "stage_times": {}, "pending_signals": [], "shipping_workflow_id": "shipping-order-1"},
+        "shipping-order-1": {"stage": "validated", "stage_times": {}, "pending_signals": []},
+    }))
+
+    result = await main.read_order_stage("order-1")
+    assert result["stage"] == "charged"
+    assert result["shipping"]["stage"] == "validated"
+
+
+@pytest.mark.asyncio
+async def test_closed_orders_and_batch_fall_back_to_db(monkeypatch, db_reads):
+    monkeypatch.setattr(main.app.state, "client", FakeClient({
+        "order-1": {"stage": "received", "stage_times": {}, "pending_signals": [], "shipping_workflow_id": None},
+    }))
+
+    result = await main.get_stages(["order-1", "order-9"])
+
+    assert [(o["order_id"], o["stage"], o["source"]) for o in result["orders"]] == [
+        ("order-1", "received", "workflow"),
+        ("order-9", "shipped", "db"),
+    ]
+    assert db_reads == ["order-9"]
+
+
+@pytest.mark.asyncio
+async def test_cancel_and_update_return_the_workflow_outcome(monkeypatch):
+    monkeypatch.setattr(main.app.state, "client", FakeClient({
+        "order-1": {},
+        "order-2": WorkflowUpdateFailedError(ApplicationError("Cancel rejected, order already shipping")),
+    }))
+
+    assert await main.cancel_order("order-1") == {"applied": True, "status": "cancel_order applied"}
+    rejected = await main.cancel_order("order-2")
+    assert rejected == {"applied": False, "status": "[order-2] Cancel rejected, order already shipping"}
@@ -0,0 +1,250 @@
+import asyncio
+import logging
+import pytest
+from datetime import datetime
+from types import SimpleNamespace
+from temporalio import workflow
+from temporalio.exceptions import ApplicationError
+from app.workflows import history_guard
+from app.workflows.order_workflow import OrderWorkflow
+from app.workflows.shipping_workflow import ShippingWorkflow
+
+ADDRESS = {"street": "1 Main St", "city": "Boston", "state": "MA", "zip": "02118"}
+ITEMS = [{"sku": "ABC", "qty": 1}]
+
+
+class Continued(Exception):
+    def __init__(self, args):
+        self.args_ = args
+
+
+class ExternalHandle:
+    def __init__(self, target):
+        self.target = target
+
+    async def signal(self, signal, arg=None, *, args=()):
+        name = signal if isinstance(signal, str) else signal.__name__
+        await getattr(self.target(), name)(*([arg] if arg is not None else args))
+
+
+class ChildHandle(ExternalHandle):
+    def __init__(self, child: ShippingWorkflow, task: asyncio.Task):
+        super().__init__(lambda: child)
+        self.task = task
+
+    def __await__(self):
+        return self.task.__await__()
+
+
+class Runtime:
+    """Stands in for the workflow runtime: records the commands a run issues, with the shipping child run for real."""
+
+    def __init__(self):
+        self.commands: list[str] = []
+        self.patched = True
+        self.results = {
+            "activity_risk_score": {"score": 0.1, "review": False},
+            "activity_payment_charged": {"status": "charged", "amount": 10},
+            "activity_get_order_state": {"state": "validated"},
+        }
+        self.delays: dict[str, float] = {}
+        self.child: ShippingWorkflow | None = None
+        # The order run the child reports to, once the test gives the child a parent
+        self.parent: OrderWorkflow | None = None
+        self.history = {"events": 10, "bytes": 1000}
+        self.info = SimpleNamespace(
+            get_current_history_length=lambda: self.history["events"],
+            get_current_history_size=lambda: self.history["bytes"],
+            is_continue_as_new_suggested=lambda: False,
+            parent=None,
+        )
+
+    async def activity(self, kind: str, fn, args=(), **kwargs):
+        self.commands.append(f"{kind}:{fn.__name__}")
+        await asyncio.sleep(self.delays.get(fn.__name__, 0))
+        return self.results.get(fn.__name__, f"{fn.__name__} done")
+
+    async def execute_activity(self, fn, *args, **kwargs):
+        return await self.activity("activity", fn, **kwargs)
+
+    async def execute_local_activity(self, fn, *args, **kwargs):
+        return await self.activity("local", fn, **kwargs)
+
+    async def start_child_workflow(self, run, args=(), **kwargs):
+        self.commands.append("start_child:ShippingWorkflow")
+        self.child = ShippingWorkflow()
+        return ChildHandle(self.child, asyncio.create_task(self.child.run(*args)))
+
+    async def execute_child_workflow(self, run, args=(), **kwargs):
+        self.commands.append("child:ShippingWorkflow")
+        self.child = ShippingWorkflow()
+        return await self.child.run(*args)
+
+    async def sleep(self, seconds):
+        self.commands.append("timer")
+        await asyncio.sleep(0)
+
+    async def wait_condition(self, fn, **kwargs):
+        while not fn():
+            await asyncio.sleep(0.001)
+
+    def continue_as_new(self, *, args):
+        self.commands.append("continue_as_new")
+        raise Continued(args)
+
+
+@pytest.fixture
+def runtime(monkeypatch):
+    rt = Runtime()
+    monkeypatch.setattr(workflow, "execute_activity", rt.execute_activity)
+    monkeypatch.setattr(workflow, "execute_local_activity", rt.execute_local_activity)
+    monkeypatch.setattr(workflow, "start_child_workflow", rt.start_child_workflow)
+    monkeypatch.setattr(workflow, "execute_child_workflow", rt.execute_child_workflow)
+    monkeypatch.setattr(workflow, "sleep", rt.sleep)
+    monkeypatch.setattr(workflow, "wait_condition", rt.wait_condition)
+    monkeypatch.setattr(workflow, "wait", asyncio.wait)
+    monkeypatch.setattr(workflow, "patched", lambda patch_id: rt.patched)
+    monkeypatch.setattr(workflow, "now", lambda: datetime(2024, 1, 1))
+    monkeypatch.setattr(workflow, "info", lambda: rt.info)
+    monkeypatch.setattr(workflow, "continue_as_new", rt.continue_as_new)
+    monkeypatch.setattr(workflow, "get_external_workflow_handle", lambda workflow_id: ExternalHandle(lambda: rt.parent))
+    monkeypatch.setattr(workflow, "get_external_workflow_handle_for",
+                        lambda run, workflow_id: ExternalHandle(lambda: rt.child))
+    monkeypatch.setattr(workflow, "all_handlers_finished", lambda: True)
+    monkeypatch.setattr(workflow, "logger", logging.getLogger("test"))
+    return rt
+
+
+@pytest.mark.asyncio
+async def test_histories_from_before_the_stage_graph_replay_serially(runtime):
+    runtime.patched = False
+    wf = OrderWorkflow()
+    run = asyncio.create_task(wf.run("order-1", ADDRESS, ITEMS))
+    await wf.update_address({**ADDRESS, "street": "2 Main St"})
+    await wf.update_address({**ADDRESS, "street": "3 Main St"})
+
+    assert await run == "Order order-1 completed"
+    # The pre-graph command sequence: regular activities, a DB read per signal check, every update applied
+    assert runtime.commands == [
+        "timer",
+        "activity:activity_order_received",
+        "activity:activity_get_order_state",
+        "activity:activity_update_address",
+        "activity:activity_update_address",
+        "activity:activity_order_validated",
+        "timer",
+        "activity:activity_manual_review",
+        "activity:activity_payment_charged",
+        "child:ShippingWorkflow",
+        "activity:activity_package_prepared",
+        "activity:activity_carrier_dispatched",
+        "activity:activity_order_shipped",
+        "timer",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_new_orders_run_the_stage_graph(runtime):
+    wf = OrderWorkflow()
+    assert await wf.run("order-1", ADDRESS, ITEMS) == "Order order-1 completed"
+    assert "start_child:ShippingWorkflow" in runtime.commands
+    assert "local:activity_risk_score" in runtime.commands
+    assert "activity:activity_manual_review" not in runtime.commands
+    assert wf.stage == "shipped"
+
+
+async def shipping_handed_off(wf: OrderWorkflow) -> None:
+    while not wf._with_shipping():
+        await asyncio.sleep(0.001)
+
+
+@pytest.mark.asyncio
+async def test_cancel_while_the_child_ships_is_refunded_by_the_child(runtime):
+    runtime.delays["activity_carrier_dispatched"] = 0.05
+    wf = OrderWorkflow()
+    run = asyncio.create_task(wf.run("order-1", ADDRESS, ITEMS))
+    await shipping_handed_off(wf)
+    # Paid and with shipping: the order rests at charged, so a cancel is still accepted
+    assert wf.stage == "charged"
+    wf.validate_cancel_order()
+
+    outcome = await wf.cancel_order()
+    assert outcome == {"applied": True, "status": "Order order-1 canceled after payment. Refund issued."}
+    assert await run == "Order order-1 canceled after payment. Refund issued."
+    assert wf.stage == "refunded" and runtime.child.stage == "refunded"
+    # The child cancelled and refunded once; the parent's own refund compensation was dropped
+    assert runtime.commands.count("local:activity_cancel_order") == 1
+    assert runtime.commands.count("local:activity_refund_payment") == 1
+    assert "activity:activity_order_shipped" not in runtime.commands
+
+
+@pytest.mark.asyncio
+async def test_address_changes_are_rejected_once_the_child_ships(runtime):
+    runtime.delays["activity_carrier_dispatched"] = 0.05
+    wf = OrderWorkflow()
+    run = asyncio.create_task(wf.run("order-1", ADDRESS, ITEMS))
+    await shipping_handed_off(wf)
+
+    with pytest.raises(ApplicationError, match="already shipping"):
+        wf.validate_change_address({**ADDRESS, "street": "2 Main St"})
+    assert wf.status()["shipping_workflow_id"] == "shipping-order-1"
+    assert await run == "Order order-1 completed"
+    assert wf.stage == "shipped"
+
+
+@pytest.mark.asyncio
+async def test_cancel_pending_as_payment_lands_voids_the_shipment(runtime):
+    runtime.delays["activity_payment_charged"] = 0.02
+    wf = OrderWorkflow()
+    run = asyncio.create_task(wf.run("order-1", ADDRESS, ITEMS))
+    while "activity:activity_payment_charged" not in runtime.commands:
+        await asyncio.sleep(0.001)
+    await wf.cancel()
+
+    assert await run == "Order order-1 canceled after payment. Refund issued."
+    assert wf.stage == "refunded"
+    assert runtime.child._payment_settled is False
+    assert "activity:activity_carrier_dispatched" not in runtime.commands
+    assert runtime.commands.count("local:activity_refund_payment") == 1
+
+
+@pytest.mark.asyncio
+async def test_history_crossing_the_limit_while_the_child_ships_continues_as_new(runtime):
+    runtime.delays["activity_carrier_dispatched"] = 0.05
+    runtime.info.parent = SimpleNamespace(workflow_id="order-1")
+    wf = runtime.parent = OrderWorkflow()
+    run = asyncio.create_task(wf.run("order-1", ADDRESS, ITEMS))
+    await shipping_handed_off(wf)
+    while not wf._settled_sent:
+        await asyncio.sleep(0.001)
+
+    # A signal storm with only the child in flight: the signal itself wakes the graph to check
+    runtime.history["events"] = history_guard.HISTORY_MAX_EVENTS
+    await wf.update_address({**ADDRESS, "street": "2 Main St"})
+    with pytest.raises(Continued) as continued:
+        await run
+    runtime.history["events"] = 10
+    args = continued.value.args_
+    assert args[-1]["shipping"] and args[-1]["stage"] == "charged"
+
+    # The child kept shipping and reports to the next run
+    resumed = runtime.parent = OrderWorkflow()
+    assert await resumed.run(*args) == "Order order-1 completed"
+    assert resumed.stage == "shipped" and resumed.status()["continued_as_new"] == 1
+    assert runtime.commands.count("start_child:ShippingWorkflow") == 1
+    assert runtime.commands.count("activity:activity_order_shipped") == 1
+
+
+@pytest.mark.asyncio
+async def test_run_completes_only_once_update_handlers_have_replied(runtime, monkeypatch):
+    handlers = {"running": 1}
+    monkeypatch.setattr(workflow, "all_handlers_finished", lambda: handlers["running"] == 0)
+    wf = OrderWorkflow()
+    run = asyncio.create_task(wf.run("order-1", ADDRESS, ITEMS))
+    while wf.stage != "shipped":
+        await asyncio.sleep(0.001)
+
+    await asyncio.sleep(0.01)
+    assert not run.done()
+    handlers["running"] = 0
+    assert await run == "Order order-1 completed"
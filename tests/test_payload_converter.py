@@ -0,0 +1,58 @@
+import json
+import pytest
+from dataclasses import asdict
+from datetime import datetime
+from temporalio.converter import DataConverter
+from app.types import converter
+from app.types.converter import CompressionCodec, data_converter
+from app.types.order_types import Address, Item, OrderData
+
+
+def make_order(items: int) -> OrderData:
+    return OrderData("order-1", Address("1 Main St", "Boston", "MA", "02118"),
+                     [Item(f"SKU-{i:05d}", i % 7 + 1) for i in range(items)])
+
+
+@pytest.mark.asyncio
+async def test_activity_arguments_round_trip():
+    order = make_order(3)
+    values = [order, asdict(order), "pay-1", True, None, {"at": datetime(2024, 1, 1)}]
+    payloads = await data_converter().encode(values)
+
+    assert [p.metadata["encoding"] for p in payloads[:4]] == [b"binary/msgpack"] * 4
+    assert payloads[4].metadata["encoding"] == b"binary/null"
+    decoded = await data_converter().decode(payloads, [OrderData, dict, str, bool, type(None), dict])
+    assert decoded == [order, asdict(order), "pay-1", True, None, {"at": "2024-01-01T00:00:00"}]
+
+    json_payload = (await DataConverter.default.encode([order]))[0]
+    assert payloads[0].ByteSize() < json_payload.ByteSize()
+
+
+@pytest.mark.asyncio
+async def test_large_payloads_are_compressed():
+    order = make_order(200)
+    payload = (await data_converter().encode([order]))[0]
+    assert payload.metadata["encoding"] == b"binary/zlib"
+    assert payload.ByteSize() < len(json.dumps(asdict(order))) / 4
+    assert await data_converter().decode([payload], [OrderData]) == [order]
+
+    small = (await data_converter().encode([make_order(1)]))[0]
+    assert small.metadata["encoding"] == b"binary/msgpack"
+
+
+@pytest.mark.asyncio
+async def test_old_payloads_still_decode_after_switching_off(monkeypatch):
+    order = make_order(200)
+    json_payloads = await DataConverter.default.encode([order])
+    compressed = await data_converter().encode([order])
+
+    monkeypatch.setattr(converter, "PAYLOAD_ENCODING", "json")
+    monkeypatch.setattr(converter, "PAYLOAD_COMPRESSION", "none")
+    plain = data_converter()
+    assert (await plain.encode([order]))[0].metadata["encoding"] == b"json/plain"
+    assert await plain.decode(json_payloads + compressed, [OrderData, OrderData]) == [order, order]
+
+
+def test_unknown_compression_is_rejected():
+    with pytest.raises(ValueError):
+        CompressionCodec(compression="lz4")
@@ -0,0 +1,30 @@
+import asyncio
+import numpy as np
+import pytest
+from app.activities.risk import RiskScorer, score_matrix
+from app.activities.risk_features import FEATURES, order_features
+from app.types.order_types import Item
+
+
+def test_plain_orders_skip_review_and_risky_ones_do_not():
+    plain = order_features([Item("ABC", 1)])
+    bulk = order_features([{"sku": "ABC", "qty": 40}])
+    moved = order_features([Item("ABC", 1)], address_changes=3)
+
+    scores = score_matrix(np.array([[f[name] for name in FEATURES] for f in (plain, bulk, moved)]))
+    assert scores[0] < 0.5 < scores[1]
+    assert scores[2] > 0.5
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_are_scored_in_micro_batches():
+    scorer = RiskScorer(flush_ms=20, max_batch=100, review_seconds=2.0)
+    features = [order_features([Item("ABC", 40 if i % 10 == 0 else 1)]) for i in range(300)]
+
+    results = await asyncio.gather(*[scorer.score(f) for f in features])
+
+    assert sum(r["review"] for r in results) == 30
+    stats = scorer.stats()
+    assert stats["batches"] < 300
+    assert stats["skipped_review_share"] == 0.9
+    assert stats["latency_saved_s"] == 540.0
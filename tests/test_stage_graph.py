@@ -0,0 +1,140 @@
+import asyncio
+import time
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from temporalio import workflow
+from app.db.event_sink import EventSink
+from app.db.init_db import init_db
+from app.db.models import Order
+from app.db.session import build_async_engine
+from app.stubs import function_stubs
+from app.workflows.order_workflow import OrderWorkflow
+from app.workflows.stage_graph import Stage, StageGraph
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    start = time.monotonic()
+    monkeypatch.setattr(workflow, "now", lambda: datetime(2024, 1, 1) + timedelta(seconds=time.monotonic() - start))
+    monkeypatch.setattr(workflow, "wait", asyncio.wait)
+    monkeypatch.setattr(workflow, "patched", lambda patch_id: True)
+
+
+def sleeper(log: list, name: str, seconds: float):
+    async def run():
+        log.append(f"start:{name}")
+        await asyncio.sleep(seconds)
+        log.append(f"end:{name}")
+        return name
+    return run
+
+
+async def nothing_between() -> bool:
+    return False
+
+
+@pytest.mark.asyncio
+async def test_independent_stages_overlap_and_critical_path_follows_slowest_chain(clock):
+    log, done = [], []
+    graph = StageGraph([
+        Stage("received", sleeper(log, "received", 0.01)),
+        Stage("validated", sleeper(log, "validated", 0.05), after=("received",)),
+        Stage("review", sleeper(log, "review", 0.15), after=("received",)),
+        Stage("payment", sleeper(log, "payment", 0.01), after=("validated", "review")),
+    ])
+
+    assert await graph.run(lambda name, result: done.append(name), nothing_between)
+
+    # validated and review both start as soon as received is done
+    assert log[:4] == ["start:received", "end:received", "start:validated", "start:review"]
+    assert done == ["received", "validated", "review", "payment"]
+
+    report = graph.critical_path()
+    assert report["path"] == ["received", "review", "payment"]
+    assert report["elapsed_s"] < report["serial_s"]
+    assert report["overlap_saved_s"] == pytest.approx(0.05, abs=0.03)
+
+
+@pytest.mark.asyncio
+async def test_stop_drains_running_stages_without_starting_new_ones(clock):
+    log = []
+    stop = {"now": False}
+
+    async def between() -> bool:
+        return stop["now"]
+
+    graph = StageGraph([
+        Stage("received", sleeper(log, "received", 0.01)),
+        Stage("validated", sleeper(log, "validated", 0.02), after=("received",)),
+        Stage("review", sleeper(log, "review", 0.05), after=("received",)),
+        Stage("payment", sleeper(log, "payment", 0.01), after=("validated", "review")),
+    ])
+
+    def on_done(name, result):
+        if name == "validated":
+            stop["now"] = True
+
+    assert not await graph.run(on_done, between)
+    # review was in flight when the graph stopped, so it finished; payment never started
+    assert "end:review" in log
+    assert "start:payment" not in log
+    assert graph.done("review") and not graph.done("payment")
+
+
+def test_stages_must_depend_on_earlier_stages():
+    async def noop():
+        return None
+
+    with pytest.raises(ValueError):
+        StageGraph([Stage("payment", noop, after=("review",)), Stage("review", noop)])
+
+
+@pytest.mark.asyncio
+async def test_cancel_voids_speculative_shipment_before_payment_settles(clock):
+    wf = OrderWorkflow()
+    wf._graph = StageGraph([])
+    await wf.cancel()
+
+    assert await wf._between_stages()
+    assert wf._payment_settled is False
+    # The cancel stays queued for the check that runs after the drain
+    assert wf._signals.pending() == ["cancel"]
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'orders.db'}"
+    init_db(url)
+    engine = build_async_engine(url)
+    factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def no_flake():
+        return None
+
+    monkeypatch.setattr(function_stubs, "event_sink", EventSink(session_factory=factory, flush_ms=1))
+    monkeypatch.setattr(function_stubs, "flaky_call", no_flake)
+    yield factory
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_charge_landing_after_speculative_packing_keeps_the_order_state(session_factory):
+    order = {"order_id": "order-1", "address": {}, "items": []}
+    async with session_factory() as db:
+        db.add(Order(id="order-1", state="validated", address_json={}))
+        await db.commit()
+
+    # Packing overlaps the charge and finishes first
+    await function_stubs.package_prepared(order)
+    await function_stubs.payment_charged(order, "payment-order-1")
+    async with session_factory() as db:
+        assert (await db.get(Order, "order-1")).state == "package_prepared"
+
+    async with session_factory() as db:
+        db.add(Order(id="order-2", state="validated", address_json={}))
+        await db.commit()
+    await function_stubs.payment_charged({**order, "order_id": "order-2"}, "payment-order-2")
+    async with session_factory() as db:
+        assert (await db.get(Order, "order-2")).state == "charged"
@@ -0,0 +1,56 @@
+import os
+import signal
+import sys
+import time
+import pytest
+from app.workers.supervisor import WorkerSupervisor, parse_process_counts
+
+MODULES = {"order-tq": "order", "shipping-tq": "shipping"}
+
+
+def crash_once_then_drain(module_path: str, index: int, parent_pid: int, drain_seconds: float) -> None:
+    # Stand-in for a worker process: the first order-tq child crashes, every child drains on SIGTERM
+    marks = os.environ["SUPERVISOR_TEST_DIR"]
+    crashed = os.path.join(marks, "crashed")
+    if module_path == "order" and index == 0 and not os.path.exists(crashed):
+        open(crashed, "w").close()
+        sys.exit(1)
+
+    def drain(signum, frame):
+        open(os.path.join(marks, f"{module_path}-{index}-{os.getpid()}.drained"), "w").close()
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, drain)
+    open(os.path.join(marks, f"{module_path}-{index}-{os.getpid()}.ready"), "w").close()
+    while True:
+        time.sleep(0.05)
+
+
+def test_parse_process_counts():
+    assert parse_process_counts("") == {"order-tq": 1, "shipping-tq": 1, "returns-tq": 1}
+    assert parse_process_counts("order-tq=4, returns-tq=0") == {"order-tq": 4, "shipping-tq": 1, "returns-tq": 0}
+    with pytest.raises(ValueError):
+        parse_process_counts("payments-tq=2")
+    with pytest.raises(ValueError):
+        parse_process_counts("order-tq=-1")
+
+
+def test_restarts_crashed_child_and_drains_on_stop(tmp_path, monkeypatch):
+    monkeypatch.setenv("SUPERVISOR_TEST_DIR", str(tmp_path))
+    supervisor = WorkerSupervisor({"order-tq": 2, "shipping-tq": 1}, modules=MODULES,
+                                  target=crash_once_then_drain, drain_seconds=2, restart_backoff=0.05)
+    supervisor.start()
+    try:
+        deadline = time.monotonic() + 10
+        while supervisor.restarts < 1 and time.monotonic() < deadline:
+            supervisor.poll(0.05)
+        assert supervisor.restarts == 1
+        assert [s["crashes"] for s in supervisor.status()] == [1, 0, 0]
+        while len(list(tmp_path.glob("*.ready"))) < 3 and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        supervisor.stop()
+
+    assert not any(s["alive"] for s in supervisor.status())
+    drained = sorted(p.name.rsplit("-", 1)[0] for p in tmp_path.glob("*.drained"))
+    assert drained == ["order-0", "order-1", "shipping-0"]
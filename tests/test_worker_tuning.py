@@ -0,0 +1,76 @@
+import asyncio
+import json
+import logging
+import pytest
+from types import SimpleNamespace
+from app.workers.tuning import AdjustableSlotSupplier, QueueTuning, SlotAutoTuner, load_tuning
+
+
+def test_defaults_keep_previous_limits_and_overrides_layer(tmp_path):
+    assert load_tuning("shipping-tq", env={}).workflow_slots == 10
+    assert load_tuning("order-tq", env={}).activity_slots == 100
+
+    path = tmp_path / "tuning.json"
+    path.write_text(json.dumps({"order-tq": {"activity_slots": 200, "activity_pollers": 8}}))
+    tuning = load_tuning("order-tq", env={"ORDER_TQ_ACTIVITY_SLOTS": "300", "ORDER_TQ_AUTOTUNE": "true",
+                                          "ORDER_TQ_ACTIVITIES_PER_SECOND": "50"}, path=str(path))
+    assert (tuning.activity_slots, tuning.activity_pollers, tuning.autotune, tuning.activities_per_second) == \
+        (300, 8, True, 50.0)
+
+    path.write_text(json.dumps({"order-tq": {"activity_slot": 200}}))
+    with pytest.raises(ValueError):
+        load_tuning("order-tq", env={}, path=str(path))
+    with pytest.raises(ValueError):
+        load_tuning("order-tq", env={"ORDER_TQ_WORKFLOW_SLOTS": "0"})
+
+
+def test_worker_options_use_a_tuner_only_when_autotuned():
+    static = QueueTuning(workflow_slots=10).worker_options()
+    assert static["max_concurrent_workflow_tasks"] == 10 and "tuner" not in static
+    tuned = QueueTuning().worker_options(AdjustableSlotSupplier(100))
+    assert "tuner" in tuned and "max_concurrent_activities" not in tuned
+
+
+@pytest.mark.asyncio
+async def test_supplier_blocks_at_limit_until_raised():
+    supplier = AdjustableSlotSupplier(1)
+    await supplier.reserve_slot(None)
+    waiting = asyncio.create_task(supplier.reserve_slot(None))
+    await asyncio.sleep(0.01)
+    assert not waiting.done() and supplier.try_reserve_slot(None) is None
+
+    supplier.set_limit(2)
+    await asyncio.wait_for(waiting, 1)
+    supplier.release_slot(SimpleNamespace(slot_info=None))
+    assert supplier.reserved == 1
+
+
+def fill(tuner, used: int, schedule_to_start: float, lag: float) -> None:
+    for _ in range(used):
+        tuner.supplier.try_reserve_slot(None)
+        tuner.supplier.mark_slot_used(None)
+    for _ in range(used):
+        tuner.supplier.release_slot(SimpleNamespace(slot_info=object()))
+    for _ in range(20):
+        tuner.observe_schedule_to_start(schedule_to_start)
+        tuner.observe_loop_lag(lag)
+
+
+def test_tuner_grows_when_saturated_shrinks_on_lag_and_logs_each_decision(caplog):
+    tuner = SlotAutoTuner("order-tq", QueueTuning(activity_slots=40, min_activity_slots=30, max_activity_slots=60))
+    caplog.set_level(logging.INFO, logger="worker-tuning")
+
+    fill(tuner, used=40, schedule_to_start=0.5, lag=0.001)
+    assert tuner.decide()["action"] == "grow" and tuner.supplier.limit == 50
+
+    fill(tuner, used=10, schedule_to_start=0.5, lag=0.001)  # waiting, but not on slots
+    assert tuner.decide()["action"] == "hold" and tuner.supplier.limit == 50
+
+    fill(tuner, used=50, schedule_to_start=0.5, lag=0.2)  # the loop is the bottleneck
+    assert tuner.decide()["action"] == "shrink" and tuner.supplier.limit == 38
+    fill(tuner, used=38, schedule_to_start=0.5, lag=0.2)
+    decision = tuner.decide()
+    assert decision["to"] == 30 and tuner.decide()["reason"] == "idle"
+
+    assert len([r for r in caplog.records if "[Tuner] order-tq" in r.getMessage()]) == 5
+    assert [d["action"] for d in tuner.stats()["decisions"]] == ["grow", "hold", "shrink", "shrink", "hold"]
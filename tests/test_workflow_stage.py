@@ -0,0 +1,192 @@
+import asyncio
+import pytest
+from datetime import datetime
+from temporalio import workflow
+from temporalio.exceptions import ApplicationError
+from app.activities import execution
+from app.types.order_types import Address, Item, OrderData
+from app.workflows.order_workflow import OrderWorkflow
+
+
+@pytest.fixture
+def executed(monkeypatch):
+    calls = []
+
+    async def execute_activity(fn, *args, **kwargs):
+        calls.append(fn.__name__)
+        return {"state": "validated"}
+
+    async def execute_local_activity(fn, *args, **kwargs):
+        calls.append(f"local:{fn.__name__}")
+        return {"state": "validated"}
+
+    # Every module shares the one temporalio.workflow module
+    monkeypatch.setattr(workflow, "execute_activity", execute_activity)
+    monkeypatch.setattr(workflow, "execute_local_activity", execute_local_activity)
+    monkeypatch.setattr(workflow, "now", lambda: datetime(2024, 1, 1))
+    monkeypatch.setattr(workflow, "patched", lambda patch_id: True)
+    return calls
+
+
+def make_workflow(stage: str) -> OrderWorkflow:
+    wf = OrderWorkflow()
+    wf.order = OrderData("order-1", Address("1 Main St", "Boston", "MA", "02118"), [Item("ABC", 1)])
+    wf.stage = stage
+    return wf
+
+
+@pytest.mark.asyncio
+async def test_signal_check_uses_workflow_stage_without_db(executed):
+    wf = make_workflow("validated")
+    await wf.update_address({"street": "2 Main St"})
+    await wf.update_address({"street": "3 Main St"})
+
+    assert await wf.check_signal_result() is None
+    assert executed == ["local:activity_update_address"]
+    # Flag is cleared, so the next check is free
+    assert await wf.check_signal_result() is None
+    assert len(executed) == 1
+
+
+@pytest.mark.asyncio
+async def test_cancel_advances_stage(executed):
+    wf = make_workflow("charged")
+    await wf.cancel()
+
+    assert "Refund issued" in await wf.check_signal_result()
+    assert executed == ["local:activity_cancel_order", "local:activity_refund_payment"]
+    assert wf.stage == "refunded"
+    assert wf.status()["stage_times"]["refunded"] == "2024-01-01T00:00:00"
+
+
+@pytest.mark.asyncio
+async def test_verify_stage_consults_db_and_prefers_it(executed):
+    wf = make_workflow("received")
+    wf.verify_stage = True
+    await wf.cancel()
+
+    assert "canceled before payment" in await wf.check_signal_result()
+    assert executed == ["local:activity_get_order_state", "local:activity_cancel_order"]
+    assert wf.stage == "canceled"
+
+
+def test_status_query_reports_pending_signals_and_shipping_child():
+    wf = make_workflow("shipping")
+    wf._signals.queue_cancel()
+
+    status = wf.status()
+    assert status["pending_signals"] == ["cancel"]
+    assert status["shipping_workflow_id"] == "shipping-order-1"
+
+
+@pytest.mark.asyncio
+async def test_steps_outside_local_set_use_the_task_queue(executed, monkeypatch):
+    monkeypatch.setattr(execution, "LOCAL_ACTIVITY_STEPS", {"activity_cancel_order"})
+    wf = make_workflow("charged")
+    await wf.cancel()
+
+    await wf.check_signal_result()
+    assert executed == ["local:activity_cancel_order", "activity_refund_payment"]
+
+
+@pytest.mark.asyncio
+async def test_update_storm_applies_only_the_latest_address(executed):
+    wf = make_workflow("validated")
+    for i in range(50):
+        await wf.update_address({"street": f"{i} Main St"})
+
+    assert wf.status()["pending_signals"] == ["update_address"]
+    assert await wf.check_signal_result() is None
+    assert executed == ["local:activity_update_address"]
+    assert wf.order.address == {"street": "49 Main St"}
+    assert wf.status()["signals"]["coalesced"] == 49
+
+
+@pytest.mark.asyncio
+async def test_cancel_short_circuits_later_signals_and_duplicates(executed):
+    wf = make_workflow("validated")
+    await wf.update_address({"street": "2 Main St"})
+    for _ in range(5):
+        await wf.cancel()
+        await wf.update_address({"street": "3 Main St"})
+
+    assert wf.status()["pending_signals"] == ["update_address", "cancel"]
+    assert "canceled before payment" in await wf.check_signal_result()
+    assert executed == ["local:activity_update_address", "local:activity_cancel_order"]
+    assert wf.order.address == {"street": "2 Main St"}
+    assert wf.status()["signals"] == {"received": 11, "coalesced": 0, "duplicate_cancels": 4, "dropped_after_cancel": 5}
+
+    # A cancel retried after the first one was handled runs nothing
+    await wf.cancel()
+    assert await wf.check_signal_result() is None
+    assert len(executed) == 2
+
+
+@pytest.fixture
+def conditions(monkeypatch):
+    async def wait_condition(fn, **kwargs):
+        while not fn():
+            await asyncio.sleep(0)
+
+    monkeypatch.setattr(workflow, "wait_condition", wait_condition)
+
+
+@pytest.mark.asyncio
+async def test_address_update_reports_outcome_and_validator_rejects_by_stage(executed, conditions):
+    wf = make_workflow("charged")
+    wf.validate_change_address({"street": "2 Main St"})
+    assert (await wf.change_address({"street": "2 Main St"}))["applied"] is True
+    assert executed == ["local:activity_update_address"]
+
+    wf.stage = "shipping"
+    with pytest.raises(ApplicationError, match="already shipping"):
+        wf.validate_change_address({"street": "3 Main St"})
+
+
+@pytest.mark.asyncio
+async def test_cancel_update_waits_for_the_signal_check_and_is_idempotent(executed, conditions):
+    wf = make_workflow("validated")
+    wf.validate_cancel_order()
+    first = asyncio.create_task(wf.cancel_order())
+    second = asyncio.create_task(wf.cancel_order())
+    await asyncio.sleep(0)
+    assert not first.done()
+
+    # The run loop's next check handles the one queued cancel
+    assert "canceled before payment" in await wf.check_signal_result()
+    assert (await first)["applied"] is True
+    assert await second == await first
+    assert executed == ["local:activity_cancel_order"]
+
+    wf.validate_cancel_order()  # a retry after the fact is accepted and answered from the stored outcome
+    with pytest.raises(ApplicationError):
+        wf.validate_change_address({"street": "2 Main St"})
+
+
+@pytest.mark.asyncio
+async def test_rejected_cancel_does_not_block_later_signals(executed):
+    wf = make_workflow("shipping")
+    await wf.cancel()
+    rejected = await wf.check_signal_result()
+    assert "Cancel rejected" in rejected["status"]
+    assert wf._signals.cancel_result is None and executed == []
+
+    # Nothing was canceled: updates are judged by stage, queued rather than dropped, and a later cancel is no duplicate
+    with pytest.raises(ApplicationError, match="already shipping"):
+        wf.validate_change_address({"street": "3 Main St"})
+    await wf.update_address({"street": "2 Main St"})
+    await wf.cancel()
+    assert wf.status()["pending_signals"] == ["update_address", "cancel"]
+    assert wf.status()["signals"] == {"received": 3, "coalesced": 0, "duplicate_cancels": 0, "dropped_after_cancel": 0}
+
+
+@pytest.mark.asyncio
+async def test_cancel_update_returns_a_rejection(executed, conditions):
+    wf = make_workflow("started")
+    wf.validate_cancel_order()
+    pending = asyncio.create_task(wf.cancel_order())
+    await asyncio.sleep(0)
+
+    assert await wf.check_signal_result() is None
+    assert (await pending) == {"applied": False, "status": "[order-1] Cancel rejected, order in stage 'started'"}
+    assert wf._signals.cancel_handled is False